@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Generic, List, Sequence, Tuple, TypeVar
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Merges work items submitted concurrently by several threads into shared batches.
+
+    Callers block in `run()` while a background thread collects items until either
+    `max_batch` items are queued or the oldest item has waited `max_wait_ms`, then
+    calls `fn` once on the whole batch and hands each caller its slice of the results.
+    This lets several in-flight questions share one model forward pass.
+    """
+
+    def __init__(self, fn: Callable[[List[T]], Sequence[R]], max_batch: int = 64, max_wait_ms: float = 5.0) -> None:
+        """
+        Args:
+            fn (Callable[[List[T]], Sequence[R]]): Batch function, one result per item.
+            max_batch (int): Items per call of `fn`.
+            max_wait_ms (float): How long a partial batch may wait for more items.
+        """
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[T, Future]] = []
+        self._oldest = 0.0
+        self.batches = 0
+        self.items = 0
+
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def run(self, items: Sequence[T]) -> List[R]:
+        """
+        Processes items as part of shared batches and waits for their results.
+
+        Returns:
+            List[R]: Results in the order of `items`.
+        """
+        if not items:
+            return []
+        futures: List[Future] = []
+        with self._cond:
+            if not self._queue:
+                self._oldest = time.monotonic()
+            for item in items:
+                future: Future = Future()
+                self._queue.append((item, future))
+                futures.append(future)
+            self._cond.notify()
+        return [f.result() for f in futures]
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                while len(self._queue) < self.max_batch:
+                    remaining = self._oldest + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._queue[: self.max_batch]
+                self._queue = self._queue[self.max_batch :]
+                self._oldest = time.monotonic()
+
+            try:
+                results = self.fn([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+            self.batches += 1
+            self.items += len(batch)
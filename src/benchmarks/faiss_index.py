@@ -0,0 +1,120 @@
+"""
+Dense index benchmark: recall@k against the exact flat index, search latency and
+memory for each index type / Matryoshka dimension.
+
+Vectors come from the embedding cache of the current chunk store, or are synthetic
+(`--synthetic N`) to size settings for corpora larger than the one on disk. Queries
+are held-out corpus vectors with a little noise, so no model has to be loaded.
+Usage:
+
+    python -m src.benchmarks.faiss_index --types flat hnsw ivf_flat ivf_pq sq8 --dims 0 512 256
+    python -m src.benchmarks.faiss_index --synthetic 1000000 --types hnsw ivf_pq
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+
+from src.config import CHUNK_STORE_PATH, EMBEDDING_CACHE_PATH, EMBEDDING_MODEL
+from src.chunk_store import ChunkStore
+from src.embedding_cache import EmbeddingCache
+from src.index_factory import IndexSpec, build_faiss_index, truncate_vectors
+
+
+def load_corpus_vectors() -> np.ndarray:
+    store = ChunkStore(CHUNK_STORE_PATH)
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL)
+    vectors = cache.get_many([h for _, h in store.content_hashes()])
+    if not vectors:
+        raise SystemExit("Embedding cache is empty. Run --index first or use --synthetic.")
+    return np.vstack(list(vectors.values())).astype(np.float32)
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 500), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return truncate_vectors(vectors / np.linalg.norm(vectors, axis=1, keepdims=True), 0)
+
+
+def make_queries(corpus: np.ndarray, n_queries: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = corpus[rng.choice(len(corpus), min(n_queries, len(corpus)), replace=False)]
+    noisy = picked + 0.05 * rng.standard_normal(picked.shape).astype(np.float32)
+    return truncate_vectors(noisy / np.linalg.norm(noisy, axis=1, keepdims=True), 0)
+
+
+def index_bytes(index: faiss.Index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, spec: IndexSpec, k: int) -> Dict[str, Any]:
+    """Builds one configuration and measures it against the exact neighbours."""
+    start = time.perf_counter()
+    index = build_faiss_index(truncate_vectors(corpus, spec.dim), spec)
+    build_seconds = time.perf_counter() - start
+
+    truncated_queries = truncate_vectors(queries, spec.dim)
+    latencies: List[float] = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(truncated_queries):
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found[i] = ids[0]
+
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return {
+        "type": spec.index_type,
+        "dim": spec.dim or corpus.shape[1],
+        "recall_at_k": round(float(recall), 4),
+        "p50_ms": round(1000 * float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(1000 * float(np.percentile(latencies, 95)), 3),
+        "index_mb": round(index_bytes(index) / 2**20, 2),
+        "build_seconds": round(build_seconds, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="FAISS index type benchmark")
+    parser.add_argument("--types", nargs="+", default=["flat", "hnsw", "ivf_flat", "ivf_pq", "sq8"])
+    parser.add_argument("--dims", nargs="+", type=int, default=[0], help="Matryoshka dims, 0 = full")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of the cache")
+    parser.add_argument("--synthetic-dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--pq-m", type=int, default=64)
+    args = parser.parse_args()
+
+    corpus = synthetic_vectors(args.synthetic, args.synthetic_dim) if args.synthetic else load_corpus_vectors()
+    queries = make_queries(corpus, args.queries)
+    k = min(args.k, len(corpus))
+    print(f"Corpus: {corpus.shape[0]} vectors of dimension {corpus.shape[1]}, {len(queries)} queries, k={k}")
+
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for dim in args.dims:
+        for index_type in args.types:
+            spec = IndexSpec(
+                index_type=index_type, dim=dim, nprobe=args.nprobe, ef_search=args.ef_search, pq_m=args.pq_m
+            )
+            try:
+                results.append(evaluate(corpus, queries, truth, spec, k))
+            except (ValueError, RuntimeError) as e:
+                print(f"Skipping {index_type} at dim {dim}: {e}")
+
+    print(json.dumps({"vectors": int(corpus.shape[0]), "k": k, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
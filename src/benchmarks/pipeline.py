@@ -0,0 +1,373 @@
+"""
+Offline end-to-end benchmark of the pipeline hot paths.
+
+Generates a synthetic corpus of annual-report-like pages and questions with known
+answers in a scratch directory, swaps the models for the deterministic stand-ins in
+src/stand_ins.py (fake chat model with configurable latency, hashing embeddings,
+lexical reranker), then times every stage: writing chunks to the store, indexing,
+loading, planning, and per-question search / rerank / context / generation, plus a
+concurrent run. The JSON report is meant to be diffed between commits.
+
+Docling PDF conversion is not part of the benchmark (it needs real PDFs); ingestion is
+timed from converted pages onwards (company resolution and chunk store writes).
+
+    python -m src.benchmarks.pipeline --companies 20 --pages 40 --questions 60 --output bench.json
+    python -m src.benchmarks.pipeline --embeddings huggingface --reranker torch   # real models
+    python -m src.benchmarks.pipeline --boilerplate 1 [--no-dedup]              # near-duplicate chunks
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+NAME_WORDS = [
+    "Acme", "Borealis", "Cobalt", "Dunmore", "Everest", "Fjord", "Granite", "Helios", "Ionic", "Juniper",
+    "Kestrel", "Lumen", "Meridian", "Northwind", "Orion", "Pioneer", "Quartz", "Redwood", "Solace", "Tundra",
+]  # fmt: skip
+SECOND_WORDS = ["Energy", "Mining", "Capital", "Foods", "Systems", "Logistics", "Pharma", "Retail", "Telecom", "Motors"]
+SUFFIXES = ["plc", "Inc.", "AG", "Group", "Holdings", "Ltd"]
+PEOPLE = ["Alice Moreau", "Bob Okafor", "Chen Wei", "Dana Kowalski", "Erik Lund", "Farah Haddad", "Goran Petrov"]
+FILLER = (
+    "operating environment remained challenging with inflation supply chains currency movements and regulatory "
+    "developments affecting margins segment performance capital allocation sustainability governance risk "
+    "management liquidity dividends pension obligations impairment goodwill leases employees customers strategy"
+).split()
+SECTIONS = ["strategic report", "governance", "financial statements", "other information"]
+BOILERPLATE = [
+    "This report contains forward-looking statements that are subject to risks and uncertainties. Actual results "
+    "may differ materially from those expressed or implied, and the company undertakes no obligation to update "
+    "any forward-looking statement except as required by law. {company} annual report, {section}.",
+    "Alternative performance measures are used in this report to supplement measures defined under IFRS. They "
+    "are not a substitute for IFRS measures and may not be comparable with similarly titled measures used by "
+    "other companies. Reconciliations are provided in the glossary. {company}, {section}.",
+]
+
+
+def synthetic_corpus(
+    n_companies: int, n_pages: int, paragraphs: int, seed: int, boilerplate: int = 0
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Builds reports (one per company) and questions whose answers sit on known pages.
+    `boilerplate` near-identical disclaimer paragraphs (differing only in the section
+    name) are added to every page after the cover.
+
+    Returns:
+        Tuple[List[Dict], List[Dict]]: Reports {company, sha1, pages: [[paragraph, ...], ...]} and
+            questions {text, kind, company, answer, pdf_sha1, page_index}.
+    """
+    rng = random.Random(seed)
+    reports, questions = [], []
+
+    for i in range(n_companies):
+        company = (
+            f"{NAME_WORDS[i % len(NAME_WORDS)]} {SECOND_WORDS[(i // len(NAME_WORDS)) % len(SECOND_WORDS)]} "
+            f"{SUFFIXES[i % len(SUFFIXES)]}"
+        )
+        pages = [
+            [" ".join(rng.choices(FILLER, k=60)) + f" {rng.randint(10, 9999):,}" for _ in range(paragraphs)]
+            for _ in range(n_pages)
+        ]
+        for page_index in range(1, n_pages):
+            for template in BOILERPLATE[:boilerplate]:
+                pages[page_index].append(template.format(company=company, section=SECTIONS[page_index % len(SECTIONS)]))
+        pages[0] = [f"{company}\nAnnual Report and Accounts 2022", f"Welcome to the {company} annual report."]
+
+        revenue = round(rng.uniform(100, 90000), 1)
+        employees = rng.randint(200, 250000)
+        ceo = rng.choice(PEOPLE)
+        facts = [
+            ("number", f"What was the total revenue of \"{company}\" in 2022?", revenue,
+             f"Total revenue for the year amounted to {revenue:,} million, driven by volume growth."),
+            ("number", f"How many employees did \"{company}\" have at the end of 2022?", float(employees),
+             f"At year end the workforce comprised {employees:,} employees across all regions."),
+            ("name", f"Who was the CEO of \"{company}\" in 2022?", ceo,
+             f"{ceo} served as Chief Executive Officer (CEO) throughout the year."),
+        ]  # fmt: skip
+
+        sha1 = hashlib.sha1(f"{seed}-{company}".encode("utf-8")).hexdigest()
+        for kind, text, answer, paragraph in facts:
+            page_index = rng.randrange(1, n_pages) if n_pages > 1 else 0
+            pages[page_index].insert(rng.randrange(len(pages[page_index]) + 1), paragraph)
+            questions.append(
+                {
+                    "text": text,
+                    "kind": kind,
+                    "company": company,
+                    "answer": answer,
+                    "pdf_sha1": sha1,
+                    "page_index": page_index,
+                }
+            )
+        reports.append({"company": company, "sha1": sha1, "pages": pages})
+
+    return reports, questions
+
+
+def configure_environment(args: argparse.Namespace, workdir: Path) -> None:
+    """Points every path at the scratch directory and selects the stand-ins. Must run before importing src."""
+    os.environ.update(
+        {
+            "DATA_DIR": str(workdir),
+            "CHUNK_STORE_PATH": str(workdir / "chunk_store"),
+            "INDEX_PATH": str(workdir / "faiss_index"),
+            "SHARDS_PATH": str(workdir / "faiss_index" / "shards"),
+            "BM25_PATH": str(workdir / "bm25_index"),
+            "EMBEDDING_CACHE_PATH": str(workdir / "embedding_cache.sqlite"),
+            "QUESTIONS_PATH": str(workdir / "questions.json"),
+            "COMPANY_MAP_PATH": str(workdir / "company_map.json"),
+            "PLANS_PATH": str(workdir / "query_plans.json"),
+            "LLM_CACHE_PATH": str(workdir / "llm_cache.sqlite"),
+            "OUTPUT_FILE": str(workdir / "answers.json"),
+            "LLM_BACKEND": "fake",
+            "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+            "EMBEDDING_BACKEND": args.embeddings,
+            "RERANKER_BACKEND": args.reranker,
+            "FAISS_INDEX_TYPE": args.index_type,
+            "COMPANY_RESOLVER": "0" if args.no_resolver else "1",
+            "DEDUP_ENABLED": "0" if args.no_dedup else "1",
+        }
+    )
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0}
+    return {
+        "mean": round(1000 * sum(ordered) / len(ordered), 2),
+        "p50": round(1000 * ordered[len(ordered) // 2], 2),
+        "p95": round(1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 2),
+    }
+
+
+class CandidateCounter:
+    """
+    Forwards a reranker and counts, per call, the candidates it gets and how many of
+    them near-duplicate a higher-ranked candidate.
+    """
+
+    def __init__(self, target: Any, sizes: List[int], duplicates: List[int]) -> None:
+        from src.dedup import MinHasher
+
+        self._target = target
+        self._sizes = sizes
+        self._duplicates = duplicates
+        self._hasher = MinHasher()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+    def compress_documents(self, documents: Any, query: str, *args: Any, **kwargs: Any) -> Any:
+        signatures = [self._hasher.signature(doc.page_content) for doc in documents]
+        duplicates = sum(
+            any((signatures[i] == signatures[j]).mean() >= 0.9 for j in range(i)) for i in range(len(signatures))
+        )
+        self._sizes.append(len(documents))
+        self._duplicates.append(duplicates)
+        return self._target.compress_documents(documents, query, *args, **kwargs)
+
+
+class Timed:
+    """Forwards one method of a component and records how long each call took."""
+
+    def __init__(self, target: Any, method: str, sink: List[float]) -> None:
+        self._target = target
+        self._method = method
+        self._sink = sink
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if name != self._method:
+            return attr
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._sink.append(time.perf_counter() - start)
+
+        return timed
+
+
+def run(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    configure_environment(args, workdir)
+
+    from src.chunk_store import ChunkStore
+    from src.companies import CompanyMap, CompanyResolver, guess_company_from_cover
+    from src.config import CHUNK_STORE_PATH, COMPANY_MAP_PATH, QUESTIONS_PATH, COMPANY_RESOLVER
+    from src.indexing import build_vector_index
+    from src.ingestion import build_deduplicator, store_chunks
+    from src.retrieval import load_pipeline
+    from src.planning import plan_questions
+    from src.generation import build_retrieve_fn, create_rag_chain
+    from src.inference_runner import answer_question, answer_questions
+    from src.tracing import stage_summary
+
+    reports, questions = synthetic_corpus(args.companies, args.pages, args.paragraphs, args.seed, args.boilerplate)
+    questions = questions[: args.questions]
+    with open(QUESTIONS_PATH, "w") as f:
+        json.dump([{"text": q["text"], "kind": q["kind"]} for q in questions], f)
+
+    stages: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    store = ChunkStore.create(CHUNK_STORE_PATH)
+    company_map = CompanyMap(COMPANY_MAP_PATH)
+    dedup = build_deduplicator(store)
+    for report in reports:
+        company = guess_company_from_cover("\n".join(report["pages"][0])) or "Unknown"
+        company_map.set(report["sha1"], company)
+        chunks = [(paragraph, page_index) for page_index, page in enumerate(report["pages"]) for paragraph in page]
+        store_chunks(store, chunks, f"{report['sha1']}.pdf", company, dedup)
+        store.mark_file(f"{report['sha1']}.pdf", report["sha1"], len(chunks))
+        store.commit()
+    n_chunks_total = len(store)
+    store.close()
+    stages["ingest_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_vector_index(workers=1)
+    stages["index_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_vector_index(workers=1)
+    stages["reindex_unchanged_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    retriever, compressor, known_companies = load_pipeline()
+    vector_db = retriever.vector_db
+    stages["startup_seconds"] = time.perf_counter() - start
+
+    raw_questions = [{"text": q["text"], "kind": q["kind"]} for q in questions]
+    start = time.perf_counter()
+    resolver = CompanyResolver(known_companies)
+    plans = plan_questions(raw_questions, max_concurrency=args.workers, resolver=resolver if COMPANY_RESOLVER else None)
+    stages["planning_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_db.embeddings.prefetch([plan.refined_query for plan in plans.values()])
+    stages["query_embedding_seconds"] = time.perf_counter() - start
+
+    timings: Dict[str, List[float]] = {"search": [], "rerank": [], "retrieve_total": [], "total": []}
+    candidate_sizes: List[int] = []
+    candidate_duplicates: List[int] = []
+    retrieve_fn = build_retrieve_fn(
+        Timed(retriever, "invoke", timings["search"]),
+        Timed(
+            CandidateCounter(compressor, candidate_sizes, candidate_duplicates), "compress_documents", timings["rerank"]
+        ),
+        known_companies,
+        plans,
+        resolver,
+    )
+
+    def timed_retrieve(inputs: Dict[str, Any]) -> str:
+        start = time.perf_counter()
+        try:
+            return retrieve_fn(inputs)
+        finally:
+            timings["retrieve_total"].append(time.perf_counter() - start)
+
+    rag_chain = create_rag_chain(timed_retrieve)
+
+    answers = []
+    start = time.perf_counter()
+    for i, item in enumerate(raw_questions):
+        question_start = time.perf_counter()
+        answers.append(answer_question(rag_chain, i, item))
+        timings["total"].append(time.perf_counter() - question_start)
+    stages["answer_sequential_seconds"] = time.perf_counter() - start
+
+    per_question = {
+        "search": summarize(timings["search"]),
+        "rerank": summarize(timings["rerank"]),
+        "context_and_overhead": summarize(
+            [t - s - r for t, s, r in zip(timings["retrieve_total"], timings["search"], timings["rerank"])]
+        ),
+        "generate": summarize([t - r for t, r in zip(timings["total"], timings["retrieve_total"])]),
+        "total": summarize(timings["total"]),
+    }
+
+    start = time.perf_counter()
+    answer_questions(rag_chain, raw_questions, args.workers)
+    concurrent_seconds = time.perf_counter() - start
+
+    hits, correct = 0, 0
+    for question, answer in zip(questions, answers):
+        references = {(r["pdf_sha1"], r["page_index"]) for r in answer.get("references", [])}
+        hits += (question["pdf_sha1"], question["page_index"]) in references
+        value = answer.get("value")
+        if question["kind"] == "number":
+            correct += isinstance(value, (int, float)) and abs(float(value) - question["answer"]) < 1e-6
+        else:
+            correct += isinstance(value, str) and question["answer"] in value
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "workdir")},
+        "corpus": {"reports": len(reports), "chunks": n_chunks_total, "questions": len(questions)},
+        "dedup": {
+            **(dedup.stats() if dedup is not None else {}),
+            "rerank_candidates_mean": round(sum(candidate_sizes) / max(len(candidate_sizes), 1), 2),
+            "near_duplicate_candidates_mean": round(sum(candidate_duplicates) / max(len(candidate_duplicates), 1), 2),
+        },
+        "stages_seconds": {k: round(v, 3) for k, v in stages.items()},
+        "per_question_ms": per_question,
+        "concurrent": {
+            "workers": args.workers,
+            "seconds": round(concurrent_seconds, 3),
+            "questions_per_sec": round(len(questions) / concurrent_seconds, 2) if concurrent_seconds else 0.0,
+            "note": "second pass, warm caches",
+        },
+        "quality": {
+            "reference_hit_rate": round(hits / max(len(questions), 1), 4),
+            "value_accuracy": round(correct / max(len(questions), 1), 4),
+        },
+        "reranker": compressor.stats(),
+        "company_resolver": {"resolved": resolver.resolved, "unresolved": resolver.unresolved},
+        "trace": stage_summary(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=40, help="Pages per report")
+    parser.add_argument("--paragraphs", type=int, default=4, help="Chunks per page")
+    parser.add_argument("--questions", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embeddings", choices=["hashing", "huggingface"], default="hashing")
+    parser.add_argument("--reranker", choices=["lexical", "torch", "onnx"], default="lexical")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--no-resolver", action="store_true", help="Plan every question with the LLM")
+    parser.add_argument(
+        "--boilerplate", type=int, default=0, help="Near-identical disclaimer paragraphs per page (0-2)"
+    )
+    parser.add_argument("--no-dedup", action="store_true", help="Store near-duplicate chunks as separate chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", type=Path, default=None, help="Scratch directory (temporary if omitted)")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_report.json"))
+    args = parser.parse_args()
+
+    if args.workdir is not None:
+        args.workdir.mkdir(parents=True, exist_ok=True)
+        report = run(args, args.workdir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+            report = run(args, Path(tmp))
+
+    text = json.dumps(report, indent=2, default=str)
+    args.output.write_text(text)
+    print(text)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Reranker benchmark: latency and top-10 agreement of the reranker backends against
+the original one-question-at-a-time fp32 CrossEncoderReranker.
+
+Candidates are the BM25 hits of every question in QUESTIONS_PATH (scoped to the
+planned company when it is known), so the benchmark needs an ingested chunk store
+but no LLM. Usage:
+
+    python -m src.benchmarks.rerank --backends torch onnx --candidates 100 --workers 4
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.documents import Document
+from langchain_classic.retrievers.document_compressors import CrossEncoderReranker
+from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+
+from src.config import QUESTIONS_PATH, CHUNK_STORE_PATH, RERANKER_MODEL
+from src.chunk_store import ChunkStore
+from src.planning import load_plans, fallback_plan
+from src.retrieval import load_bm25_engine, get_company_match
+from src.reranking import get_reranker, chunk_key
+from src.utils import question_hash
+
+
+def load_candidates(store: ChunkStore, n_candidates: int, limit: int) -> List[Tuple[str, List[Document]]]:
+    """Builds (query, candidate documents) pairs from the questions file."""
+    with open(QUESTIONS_PATH, "r") as f:
+        questions: List[Dict[str, Any]] = json.load(f)[:limit]
+
+    engine = load_bm25_engine(store)
+    plans = load_plans()
+    known_companies = store.companies()
+
+    cases = []
+    for item in questions:
+        text = item.get("text", "")
+        plan = plans.get(question_hash(text)) or fallback_plan(text, item.get("kind", ""))
+        company = get_company_match(plan.extracted_company, known_companies)
+        hits = engine.search(plan.refined_query, k=n_candidates, partition=company)
+        docs = store.get_many([doc_id for doc_id, _ in hits])
+        if docs:
+            cases.append((plan.refined_query, docs))
+    return cases
+
+
+def top_keys(docs: List[Document], k: int = 10) -> List[str]:
+    return [chunk_key(doc) for doc in docs[:k]]
+
+
+def run_reference(cases: List[Tuple[str, List[Document]]]) -> Tuple[float, List[List[str]]]:
+    """Times the original reranker, one question after another."""
+    model = HuggingFaceCrossEncoder(model_name=RERANKER_MODEL, model_kwargs={"device": "cpu"})
+    reranker = CrossEncoderReranker(model=model, top_n=10)
+    start = time.perf_counter()
+    tops = [top_keys(list(reranker.compress_documents(docs, query))) for query, docs in cases]
+    return time.perf_counter() - start, tops
+
+
+def run_backend(backend: str, cases: List[Tuple[str, List[Document]]], workers: int) -> Dict[str, Any]:
+    """Times a batched backend with `workers` concurrent questions, cold and then warm cache."""
+    reranker = get_reranker(backend=backend, top_n=10)
+
+    def rerank_all() -> Tuple[float, List[List[str]]]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            ranked = list(pool.map(lambda case: list(reranker.compress_documents(case[1], case[0])), cases))
+        return time.perf_counter() - start, [top_keys(docs) for docs in ranked]
+
+    cold_seconds, tops = rerank_all()
+    warm_seconds, _ = rerank_all()
+    return {"cold_seconds": cold_seconds, "warm_seconds": warm_seconds, "tops": tops, **reranker.stats()}
+
+
+def agreement(reference: List[List[str]], other: List[List[str]]) -> float:
+    """Mean overlap of the top-10 sets."""
+    overlaps = [len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(reference, other)]
+    return sum(overlaps) / max(len(overlaps), 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reranker backend benchmark")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--candidates", type=int, default=100, help="Candidates reranked per question")
+    parser.add_argument("--questions", type=int, default=50, help="Max questions to use")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent questions")
+    args = parser.parse_args()
+
+    store = ChunkStore(CHUNK_STORE_PATH)
+    cases = load_candidates(store, args.candidates, args.questions)
+    n_pairs = sum(len(docs) for _, docs in cases)
+    print(f"Benchmarking on {len(cases)} questions, {n_pairs} pairs")
+
+    ref_seconds, ref_tops = run_reference(cases)
+    report: Dict[str, Any] = {
+        "questions": len(cases),
+        "pairs": n_pairs,
+        "reference": {"seconds": round(ref_seconds, 3), "ms_per_question": round(1000 * ref_seconds / len(cases), 1)},
+    }
+
+    for backend in args.backends:
+        try:
+            result = run_backend(backend, cases, args.workers)
+        except ImportError as e:
+            print(f"Skipping {backend}: {e}")
+            continue
+        tops = result.pop("tops")
+        report[backend] = {
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()},
+            "ms_per_question": round(1000 * result["cold_seconds"] / len(cases), 1),
+            "speedup": round(ref_seconds / result["cold_seconds"], 2),
+            "top10_agreement": round(agreement(ref_tops, tops), 4),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from pydantic import ConfigDict, Field
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases and splits text into word tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class SparseBM25:
+    """
+    Okapi BM25 over a precomputed sparse document-term weight matrix.
+
+    Each document row holds the final BM25 contribution of every term it contains, so
+    scoring a query is a single sparse mat-vec. Rows are additionally grouped into
+    partitions (one per company) with their own column-major sub-matrix, so a query
+    restricted to a company only touches that company's rows. Results are reported
+    as external document ids (chunk ids), not row numbers.
+    """
+
+    def __init__(
+        self,
+        weights: sparse.csr_matrix,
+        vocabulary: Dict[str, int],
+        partitions: Dict[str, np.ndarray],
+        doc_ids: np.ndarray,
+        fingerprint: str = "",
+    ) -> None:
+        self.weights = weights
+        self.vocabulary = vocabulary
+        self.partitions = partitions
+        self.doc_ids = doc_ids
+        self.fingerprint = fingerprint
+
+        self._columns = weights.tocsc()
+        self._partition_columns = {name: weights[rows].tocsc() for name, rows in partitions.items()}
+
+    @classmethod
+    def fit(
+        cls,
+        texts: Sequence[str],
+        partition_keys: Sequence[str],
+        doc_ids: Optional[Sequence[int]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        fingerprint: str = "",
+    ) -> "SparseBM25":
+        """
+        Builds the engine from raw texts.
+
+        Args:
+            texts (Sequence[str]): Document texts.
+            partition_keys (Sequence[str]): Partition (company) of each document.
+            doc_ids (Optional[Sequence[int]]): External id of each document (defaults to its position).
+            k1 (float): Term frequency saturation.
+            b (float): Length normalization.
+            fingerprint (str): Opaque identifier of the corpus, stored for staleness checks.
+
+        Returns:
+            SparseBM25: The fitted engine.
+        """
+        vocabulary: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        counts: List[int] = []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[row] = len(tokens)
+            tf: Dict[int, int] = {}
+            for token in tokens:
+                col = vocabulary.setdefault(token, len(vocabulary))
+                tf[col] = tf.get(col, 0) + 1
+            rows.extend([row] * len(tf))
+            cols.extend(tf.keys())
+            counts.extend(tf.values())
+
+        n_docs = len(texts)
+        tf_matrix = sparse.csr_matrix(
+            (np.array(counts, dtype=np.float32), (np.array(rows), np.array(cols))),
+            shape=(n_docs, len(vocabulary)),
+        )
+
+        doc_freq = np.bincount(tf_matrix.indices, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+        avgdl = float(lengths.mean()) if n_docs else 1.0
+        norm = k1 * (1 - b + b * lengths / max(avgdl, 1e-9))
+
+        tf_values = tf_matrix.data
+        row_of_value = np.repeat(np.arange(n_docs), np.diff(tf_matrix.indptr))
+        tf_matrix.data = idf[tf_matrix.indices] * tf_values * (k1 + 1) / (tf_values + norm[row_of_value])
+
+        partitions: Dict[str, List[int]] = {}
+        for row, key in enumerate(partition_keys):
+            if key:
+                partitions.setdefault(key, []).append(row)
+
+        return cls(
+            tf_matrix,
+            vocabulary,
+            {key: np.array(idx, dtype=np.int64) for key, idx in partitions.items()},
+            np.arange(n_docs, dtype=np.int64) if doc_ids is None else np.asarray(doc_ids, dtype=np.int64),
+            fingerprint=fingerprint,
+        )
+
+    def _query_vector(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        tf: Dict[int, int] = {}
+        for token in tokenize(query):
+            col = self.vocabulary.get(token)
+            if col is not None:
+                tf[col] = tf.get(col, 0) + 1
+        return np.fromiter(tf.keys(), dtype=np.int64), np.fromiter(tf.values(), dtype=np.float32)
+
+    def search(self, query: str, k: int, partition: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        Returns the k best documents for a query.
+
+        Args:
+            query (str): Raw query text.
+            k (int): Number of results.
+            partition (Optional[str]): Restrict scoring to one partition. An unknown
+                partition has no documents (like the dense side's company filter).
+
+        Returns:
+            List[Tuple[int, float]]: (document id, score) pairs, best first. Documents
+                without any query term are never returned.
+        """
+        term_ids, term_counts = self._query_vector(query)
+        if term_ids.size == 0:
+            return []
+
+        if partition:
+            if partition not in self.partitions:
+                return []
+            matrix = self._partition_columns[partition]
+            row_ids: Optional[np.ndarray] = self.partitions[partition]
+        else:
+            matrix = self._columns
+            row_ids = None
+
+        scores = np.asarray(matrix[:, term_ids] @ term_counts).ravel()
+
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        rows = row_ids[candidates] if row_ids is not None else candidates
+        return [(int(doc_id), float(scores[c])) for doc_id, c in zip(self.doc_ids[rows], candidates)]
+
+    def save(self, path: Path) -> None:
+        """Writes the engine to a directory."""
+        path.mkdir(parents=True, exist_ok=True)
+        sparse.save_npz(path / "weights.npz", self.weights)
+        np.savez(path / "partitions.npz", **{f"p{i}": rows for i, rows in enumerate(self.partitions.values())})
+        np.save(path / "doc_ids.npy", self.doc_ids)
+        with open(path / "meta.json", "w") as f:
+            json.dump(
+                {
+                    "fingerprint": self.fingerprint,
+                    "partitions": list(self.partitions.keys()),
+                    "vocabulary": self.vocabulary,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "SparseBM25":
+        """Loads an engine written by save()."""
+        with open(path / "meta.json", "r") as f:
+            meta = json.load(f)
+        weights = sparse.load_npz(path / "weights.npz").tocsr()
+        stored = np.load(path / "partitions.npz")
+        partitions = {name: stored[f"p{i}"] for i, name in enumerate(meta["partitions"])}
+        doc_ids = np.load(path / "doc_ids.npy")
+        return cls(weights, meta["vocabulary"], partitions, doc_ids, fingerprint=meta["fingerprint"])
+
+
+class PartitionedBM25Retriever(BaseRetriever):
+    """
+    LangChain retriever over a SparseBM25 engine.
+
+    `company` restricts scoring to one partition; use for_company() to get a
+    per-question copy without rebuilding anything. Hit texts are loaded from the
+    chunk store only for the returned ids.
+    """
+
+    engine: Any
+    store: Any = Field(repr=False)
+    k: int = 50
+    company: Optional[str] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def for_company(self, company: Optional[str]) -> "PartitionedBM25Retriever":
+        """Returns a shallow copy scoped to one company (or to the whole corpus for None)."""
+        return self.model_copy(update={"company": company})
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        hits = self.engine.search(query, self.k, partition=self.company)
+        return self.store.get_many([chunk_id for chunk_id, _ in hits])
@@ -0,0 +1,139 @@
+"""
+Crash-safe answer checkpoint for --run.
+
+Every finished question is appended to a JSONL file (CHECKPOINT_PATH) and fsynced
+before the next one is recorded, so a crash or an interrupted run loses at most the
+questions that were in flight. Records are keyed by question hash; when a question is
+answered again (--resume, --retry-na) the last record wins. The submission file is
+assembled from the checkpoint, not from memory.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.utils import question_hash
+
+OK, ERROR, NA = "ok", "error", "na"
+
+
+def answer_status(answer: Dict[str, Any], error: Optional[Exception] = None) -> str:
+    """Status of an answer: ERROR if the chain raised, NA for an N/A value, OK otherwise."""
+    if error is not None:
+        return ERROR
+    return NA if answer.get("value") == "N/A" else OK
+
+
+class AnswerCheckpoint:
+    """
+    Append-only JSONL store of answers, keyed by question hash.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            self._repair()
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._records[record["key"]] = record
+
+    def _repair(self) -> None:
+        """Cuts a torn last line (a crash mid-write) so the next record starts on a line of its own."""
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+                print(f"Checkpoint {self.path}: dropped an incomplete last record.")
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def archive(self) -> Optional[Path]:
+        """
+        Starts an empty checkpoint, moving the current file aside (never deleting it).
+
+        Returns:
+            Optional[Path]: Where the previous answers were moved, if there were any.
+        """
+        with self._lock:
+            self._records.clear()
+            if not self.path.exists():
+                return None
+            archived = self.path.with_name(f"{self.path.stem}.{time.strftime('%Y%m%d-%H%M%S')}{self.path.suffix}")
+            self.path.replace(archived)
+            return archived
+
+    def get(self, text: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._records.get(question_hash(text))
+
+    def record(self, text: str, answer: Dict[str, Any], status: str, error: Optional[str] = None) -> None:
+        """Appends one answer and flushes it to disk."""
+        record = {"key": question_hash(text), "status": status, "time": round(time.time(), 3), "answer": answer}
+        if error:
+            record["error"] = error
+        line = json.dumps(record, default=str, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._records[record["key"]] = record
+
+    def pending(self, questions: Iterable[Dict[str, Any]], retry: Iterable[str] = (ERROR,)) -> List[int]:
+        """
+        Positions of the questions that still need an answer.
+
+        Args:
+            questions (Iterable[Dict[str, Any]]): Raw question entries.
+            retry (Iterable[str]): Statuses that are answered again (errors by default;
+                add "na" to retry N/A answers as well).
+
+        Returns:
+            List[int]: Indices into `questions`.
+        """
+        retry = set(retry)
+        pending = []
+        for i, item in enumerate(questions):
+            record = self.get(item.get("text", ""))
+            if record is None or record["status"] in retry:
+                pending.append(i)
+        return pending
+
+    def answers(self, questions: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Answer entries in question order. Questions without a record get an N/A answer.
+        """
+        answers = []
+        for item in questions:
+            record = self.get(item.get("text", ""))
+            if record is not None:
+                answers.append(record["answer"])
+            else:
+                answers.append(
+                    {
+                        "question_text": item.get("text", ""),
+                        "kind": item.get("kind", ""),
+                        "value": "N/A",
+                        "references": [],
+                    }
+                )
+        return answers
+
+    def counts(self) -> Dict[str, int]:
+        """Number of recorded questions per status."""
+        with self._lock:
+            counts = {OK: 0, ERROR: 0, NA: 0}
+            for record in self._records.values():
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+        return counts
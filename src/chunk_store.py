@@ -0,0 +1,398 @@
+import hashlib
+import mmap
+import os
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+
+class ChunkStore:
+    """
+    Compact on-disk store for document chunks.
+
+    Chunk texts are appended to a single UTF-8 blob (`text.bin`) that readers memory-map,
+    while slim typed metadata (source, page_index, company_name, content_hash) lives in
+    SQLite (`chunks.sqlite`) keyed by an integer chunk id. Nothing is held in memory beyond
+    what a caller asks for, so startup cost does not grow with the corpus.
+
+    A `files` table records the SHA1 of every ingested PDF, so ingestion can skip
+    unchanged reports and drop the chunks of changed or removed ones. A `duplicates`
+    table records the other (source, page_index) locations of chunks whose near-identical
+    copies were not stored again (see src/dedup.py); documents list all their locations
+    in metadata['provenance'].
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Opens (or creates) a store in a directory.
+
+        Args:
+            path (Path): Store directory.
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._blob_path = self.path / "text.bin"
+        self._blob_path.touch(exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path / "chunks.sqlite"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL, "
+            "source TEXT NOT NULL, page_index INTEGER NOT NULL, company_name TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL DEFAULT '')"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (source TEXT PRIMARY KEY, file_sha1 TEXT NOT NULL, n_chunks INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates ("
+            "chunk_id INTEGER NOT NULL, source TEXT NOT NULL, page_index INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_company ON chunks(company_name)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS duplicates_chunk ON duplicates(chunk_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS duplicates_source ON duplicates(source)")
+        self._conn.commit()
+
+        self._writer = None
+        self._mm: Optional[mmap.mmap] = None
+        self._mm_size = 0
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Adds and backfills the content_hash column of stores written before it existed."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "content_hash" in columns:
+            return
+        self._conn.execute("ALTER TABLE chunks ADD COLUMN content_hash TEXT NOT NULL DEFAULT ''")
+        rows = self._conn.execute("SELECT id, offset, length FROM chunks").fetchall()
+        blob = self._blob()
+        self._conn.executemany(
+            "UPDATE chunks SET content_hash = ? WHERE id = ?",
+            [(hashlib.sha1(blob[offset : offset + length]).hexdigest(), chunk_id) for chunk_id, offset, length in rows],
+        )
+        self._conn.commit()
+
+    @classmethod
+    def create(cls, path: Path) -> "ChunkStore":
+        """Creates an empty store, deleting any previous one at `path`."""
+        if Path(path).exists():
+            shutil.rmtree(path)
+        return cls(path)
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def __getitem__(self, chunk_id: int) -> Document:
+        return self.get(chunk_id)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"path": str(self.path.resolve())}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(Path(state["path"]))
+
+    def add(self, text: str, source: str, page_index: int, company_name: str) -> int:
+        """
+        Appends a chunk. Call commit() to make it visible to other connections.
+
+        Returns:
+            int: The new chunk id.
+        """
+        data = text.encode("utf-8")
+        content_hash = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            if self._writer is None:
+                self._writer = open(self._blob_path, "ab")
+            offset = self._writer.tell()
+            self._writer.write(data)
+            cursor = self._conn.execute(
+                "INSERT INTO chunks (offset, length, source, page_index, company_name, content_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (offset, len(data), source, page_index, company_name, content_hash),
+            )
+            return int(cursor.lastrowid)
+
+    def add_duplicate(self, chunk_id: int, source: str, page_index: int) -> None:
+        """Records another location of an already stored chunk instead of storing its text again."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO duplicates (chunk_id, source, page_index) VALUES (?, ?, ?)", (chunk_id, source, page_index)
+            )
+
+    def duplicate_count(self) -> int:
+        """Number of chunk occurrences recorded as duplicates."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM duplicates").fetchone()[0]
+
+    def file_hashes(self) -> Dict[str, str]:
+        """Returns source filename -> SHA1 of the PDF it was ingested from."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT source, file_sha1 FROM files"))
+
+    def mark_file(self, source: str, file_sha1: str, n_chunks: int) -> None:
+        """Records that a PDF has been fully ingested."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (source, file_sha1, n_chunks) VALUES (?, ?, ?)",
+                (source, file_sha1, n_chunks),
+            )
+
+    def delete_source(self, source: str) -> int:
+        """
+        Removes every chunk of a source file. The text stays in the blob until compact().
+
+        A chunk that also occurs in other files is kept: one of its other locations
+        becomes its source, so its chunk id (and the indexes built on it) stay valid.
+
+        Returns:
+            int: Number of deleted chunks.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM duplicates WHERE source = ?", (source,))
+            promoted = self._conn.execute(
+                "SELECT d.rowid, d.chunk_id, d.source, d.page_index "
+                "FROM duplicates d JOIN chunks c ON c.id = d.chunk_id "
+                "WHERE c.source = ? AND d.rowid = (SELECT MIN(rowid) FROM duplicates WHERE chunk_id = d.chunk_id)",
+                (source,),
+            ).fetchall()
+            for rowid, chunk_id, new_source, page_index in promoted:
+                self._conn.execute(
+                    "UPDATE chunks SET source = ?, page_index = ? WHERE id = ?", (new_source, page_index, chunk_id)
+                )
+                self._conn.execute("DELETE FROM duplicates WHERE rowid = ?", (rowid,))
+            cursor = self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM files WHERE source = ?", (source,))
+            return cursor.rowcount
+
+    def garbage_ratio(self) -> float:
+        """Share of the text blob no longer referenced by any chunk."""
+        size = self._blob_path.stat().st_size
+        if size == 0:
+            return 0.0
+        with self._lock:
+            live = self._conn.execute("SELECT COALESCE(SUM(length), 0) FROM chunks").fetchone()[0]
+        return 1.0 - live / size
+
+    def compact(self) -> None:
+        """Rewrites the text blob without the texts of deleted chunks. Chunk ids are kept."""
+        self.commit()
+        tmp_path = self._blob_path.with_suffix(".tmp")
+        with self._lock:
+            rows = self._conn.execute("SELECT id, offset, length FROM chunks ORDER BY id").fetchall()
+            blob = self._blob()
+            updates = []
+            with open(tmp_path, "wb") as out:
+                for chunk_id, offset, length in rows:
+                    updates.append((out.tell(), chunk_id))
+                    out.write(blob[offset : offset + length])
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            os.replace(tmp_path, self._blob_path)
+            self._conn.executemany("UPDATE chunks SET offset = ? WHERE id = ?", updates)
+            self._conn.commit()
+
+    def commit(self) -> None:
+        """Flushes appended text and commits metadata."""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+            self._conn.commit()
+
+    def close(self) -> None:
+        self.commit()
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+
+    def _blob(self) -> Union[mmap.mmap, bytes]:
+        size = self._blob_path.stat().st_size
+        if size == 0:
+            return b""
+        if self._mm is None or size != self._mm_size:
+            if self._mm is not None:
+                self._mm.close()
+            with open(self._blob_path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mm_size = size
+        return self._mm
+
+    def _to_document(self, row: Tuple[Any, ...], duplicates: Sequence[Tuple[str, int]] = ()) -> Document:
+        chunk_id, offset, length, source, page_index, company_name, content_hash = row
+        with self._lock:
+            text = self._blob()[offset : offset + length].decode("utf-8")
+        return Document(
+            id=str(chunk_id),
+            page_content=text,
+            metadata={
+                "chunk_id": chunk_id,
+                "source": source,
+                "filename": source,
+                "page_index": page_index,
+                "company_name": company_name,
+                "content_hash": content_hash,
+                "provenance": [(source, page_index), *duplicates],
+            },
+        )
+
+    def get(self, chunk_id: int) -> Document:
+        """Loads one chunk. Raises KeyError for unknown ids."""
+        docs = self.get_many([chunk_id])
+        if not docs:
+            raise KeyError(chunk_id)
+        return docs[0]
+
+    def get_many(self, chunk_ids: Sequence[int]) -> List[Document]:
+        """
+        Loads several chunks with one metadata query.
+
+        Returns:
+            List[Document]: Documents in the order of `chunk_ids` (unknown ids are skipped).
+        """
+        if not chunk_ids:
+            return []
+        ids = [int(i) for i in chunk_ids]
+        rows: Dict[int, Tuple[Any, ...]] = {}
+        duplicates: Dict[int, List[Tuple[str, int]]] = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                part = ids[start : start + 500]
+                placeholders = ",".join("?" * len(part))
+                query = (
+                    "SELECT id, offset, length, source, page_index, company_name, content_hash FROM chunks "
+                    f"WHERE id IN ({placeholders})"
+                )
+                rows.update({row[0]: row for row in self._conn.execute(query, part)})
+                duplicates_query = (
+                    "SELECT chunk_id, source, page_index FROM duplicates "
+                    f"WHERE chunk_id IN ({placeholders}) ORDER BY rowid"
+                )
+                for chunk_id, source, page_index in self._conn.execute(duplicates_query, part):
+                    duplicates.setdefault(chunk_id, []).append((source, page_index))
+        return [self._to_document(rows[i], duplicates.get(i, ())) for i in ids if i in rows]
+
+    def ids(self) -> List[int]:
+        """Returns all chunk ids in ascending order."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM chunks ORDER BY id")]
+
+    def iter_texts(self) -> Iterator[Tuple[int, str, str]]:
+        """Yields (chunk_id, text, company_name) for every chunk in id order."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, offset, length, company_name FROM chunks ORDER BY id").fetchall()
+        for chunk_id, offset, length, company_name in rows:
+            with self._lock:
+                text = self._blob()[offset : offset + length].decode("utf-8")
+            yield chunk_id, text, company_name
+
+    def iter_company_texts(self, company_name: str) -> Iterator[Tuple[int, str]]:
+        """Yields (chunk_id, text) for every chunk of a company in id order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, offset, length FROM chunks WHERE company_name = ? ORDER BY id", (company_name,)
+            ).fetchall()
+        for chunk_id, offset, length in rows:
+            with self._lock:
+                text = self._blob()[offset : offset + length].decode("utf-8")
+            yield chunk_id, text
+
+    def content_hashes(self) -> List[Tuple[int, str]]:
+        """Returns (chunk_id, content_hash) for every chunk in id order."""
+        with self._lock:
+            return self._conn.execute("SELECT id, content_hash FROM chunks ORDER BY id").fetchall()
+
+    def lengths(self) -> Dict[int, int]:
+        """Returns chunk_id -> text length in bytes."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, length FROM chunks"))
+
+    def companies(self) -> List[str]:
+        """Returns the distinct, non-empty company names."""
+        with self._lock:
+            return [
+                row[0]
+                for row in self._conn.execute("SELECT DISTINCT company_name FROM chunks WHERE company_name != ''")
+            ]
+
+    def ids_by_company(self) -> Dict[str, List[int]]:
+        """Groups chunk ids by company name (chunks without a company are skipped)."""
+        grouped: Dict[str, List[int]] = {}
+        with self._lock:
+            for chunk_id, company in self._conn.execute(
+                "SELECT id, company_name FROM chunks WHERE company_name != '' ORDER BY id"
+            ):
+                grouped.setdefault(company, []).append(chunk_id)
+        return grouped
+
+    def fingerprint(self) -> str:
+        """
+        Hash of every chunk's (id, content_hash, company_name) in id order, used to detect
+        stale derived indexes. Changes when a chunk is added, removed, replaced or relabelled.
+        """
+        digest = hashlib.sha1()
+        with self._lock:
+            for chunk_id, content_hash, company_name in self._conn.execute(
+                "SELECT id, content_hash, company_name FROM chunks ORDER BY id"
+            ):
+                digest.update(f"{chunk_id}\t{content_hash}\t{company_name}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+
+class ChunkStoreDocstore(Docstore, AddableMixin):
+    """
+    FAISS docstore backed by a ChunkStore.
+
+    Docstore ids are stringified chunk ids, so the pickled FAISS index only holds the
+    position -> chunk id mapping; texts are read from the store on demand. Pickling
+    keeps only the store's absolute path, and an unpickled docstore does not open (or
+    create) the store until it is searched.
+    """
+
+    def __init__(self, store: ChunkStore) -> None:
+        self._store: Optional[ChunkStore] = store
+        self._path = store.path.resolve()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"path": str(self._path)}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._store = None
+        self._path = Path(state["path"])
+
+    @property
+    def store(self) -> ChunkStore:
+        if self._store is None:
+            if not (self._path / "chunks.sqlite").exists():
+                raise FileNotFoundError(f"Chunk store {self._path} does not exist.")
+            self._store = ChunkStore(self._path)
+        return self._store
+
+    def search(self, search: str) -> Union[str, Document]:
+        try:
+            return self.store.get(int(search))
+        except (KeyError, ValueError):
+            return f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Texts already live in the chunk store, so adding only validates the ids."""
+        for doc_id in texts:
+            int(doc_id)
+
+    def delete(self, ids: List) -> None:
+        """Chunks are removed from the ChunkStore itself, not through the index."""
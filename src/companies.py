@@ -0,0 +1,357 @@
+import json
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from rapidfuzz import fuzz, process
+
+
+LEGAL_SUFFIXES: List[str] = [
+    "plc",
+    "p.l.c.",
+    "inc",
+    "inc.",
+    "incorporated",
+    "corp",
+    "corp.",
+    "corporation",
+    "ltd",
+    "ltd.",
+    "limited",
+    "llc",
+    "l.l.c.",
+    "ag",
+    "se",
+    "sa",
+    "s.a.",
+    "nv",
+    "n.v.",
+    "asa",
+    "ab",
+    "oyj",
+    "gmbh",
+    "spa",
+    "s.p.a.",
+    "co.",
+    "company",
+    "group",
+    "holdings",
+]
+
+_COVER_STOPWORDS = {
+    "a",
+    "an",
+    "and",
+    "annual",
+    "at",
+    "by",
+    "contents",
+    "financial",
+    "for",
+    "form",
+    "in",
+    "of",
+    "on",
+    "report",
+    "statements",
+    "the",
+    "to",
+    "welcome",
+    "year",
+}
+_TOKEN_RE = re.compile(r"[A-Za-z0-9&'’.\-]+|\n")
+
+
+def _is_suffix(token: str) -> bool:
+    return token.lower() in LEGAL_SUFFIXES or token.lower().rstrip(".") in LEGAL_SUFFIXES
+
+
+def _is_name_word(token: str) -> bool:
+    return token[:1].isupper() and token.lower().strip(".") not in _COVER_STOPWORDS
+
+
+def guess_company_from_cover(cover_text: str, min_mentions: int = 2) -> Optional[str]:
+    """
+    Cheap heuristic that reads the company name from an annual report cover page.
+
+    Finds legal suffixes ("plc", "Inc.", "AG", ...) and walks back over the capitalised
+    words in front of them on the same line. The guess is only returned when it is
+    unambiguous: either it is the only candidate, or it is mentioned at least
+    `min_mentions` times and more often than any other candidate. Otherwise None is
+    returned and the caller should ask the LLM.
+
+    Args:
+        cover_text (str): Text of the first page(s) of the report.
+        min_mentions (int): Mentions needed to pick a name among several candidates.
+
+    Returns:
+        Optional[str]: The company name, or None if not confident.
+    """
+    tokens = _TOKEN_RE.findall(cover_text[:4000])
+    candidates: Counter = Counter()
+
+    for i, token in enumerate(tokens):
+        if not _is_suffix(token) or (i + 1 < len(tokens) and _is_suffix(tokens[i + 1])):
+            continue
+        start = i
+        while start > 0 and tokens[start - 1] != "\n" and _is_name_word(tokens[start - 1]):
+            start -= 1
+        name_words = tokens[start:i]
+        if not name_words or all(_is_suffix(w) for w in name_words):
+            continue
+        candidates[" ".join(tokens[start : i + 1])] += 1
+
+    if not candidates:
+        return None
+
+    ranked = candidates.most_common(2)
+    if len(ranked) == 1:
+        return ranked[0][0]
+    (best, best_count), (_, second_count) = ranked
+    if best_count >= min_mentions and best_count > second_count:
+        return best
+    return None
+
+
+class CompanyMap:
+    """
+    Persistent PDF SHA1 -> company name map, so a report is never queried twice.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data: Dict[str, str] = {}
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                self._data = json.load(f)
+
+    def get(self, pdf_sha1: str) -> Optional[str]:
+        with self._lock:
+            return self._data.get(pdf_sha1)
+
+    def set(self, pdf_sha1: str, company_name: str) -> None:
+        """Records a company and writes the map to disk."""
+        with self._lock:
+            self._data[pdf_sha1] = company_name
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self._data, f, indent=2, ensure_ascii=False)
+            tmp_path.replace(self.path)
+
+
+_NAME_TOKEN_RE = re.compile(r"[A-Za-z0-9&]+(?:['’.][A-Za-z0-9&]+)*")
+_QUOTED_RE = re.compile(r"[\"“”']([^\"“”']{2,})[\"“”']")
+_NORMALIZED_SUFFIXES = {s.replace(".", "") for s in LEGAL_SUFFIXES}
+_TICKER_STOPWORDS = {"CEO", "CFO", "COO", "USD", "EUR", "GBP", "ESG", "EPS", "IFRS", "GAAP", "EBIT", "EBITDA", "ROE"}
+_ALIAS = "__alias__"
+
+# How a question word must be written for an alias to match.
+ANY_CASE, CAPITALIZED, UPPER_CASE = 0, 1, 2
+
+
+def _name_tokens(text: str) -> List[Tuple[str, str, int, int]]:
+    """
+    Tokens as (normalized, original, start, end). "p.l.c." and "Inc." normalize to
+    "plc" and "inc"; a possessive "'s" is not part of the token.
+    """
+    tokens = []
+    for m in _NAME_TOKEN_RE.finditer(text):
+        original, end = m.group(0), m.end()
+        if len(original) > 2 and original[-2] in "'’" and original[-1] in "sS":
+            original, end = original[:-2], end - 2
+        tokens.append((re.sub(r"['’.]", "", original.lower()), original, m.start(), end))
+    return tokens
+
+
+def name_aliases(name: str) -> List[Tuple[Tuple[str, ...], int]]:
+    """
+    Aliases of a company name as (normalized tokens, case rule) pairs.
+
+    The full name, the name without a leading "the" and with trailing legal suffixes
+    stripped one by one ("Acme Holdings plc" -> "acme holdings" -> "acme"), and an
+    acronym for names of three or more words ("International Business Machines" ->
+    "ibm"). Single-word aliases only match capitalized words and acronyms only
+    upper-case ones, so "Next plc" does not match "next year".
+    """
+    words = [t[0] for t in _name_tokens(name)]
+    if words[:1] == ["the"] and len(words) > 1:
+        words = words[1:]
+    aliases: List[Tuple[Tuple[str, ...], int]] = []
+    while words:
+        aliases.append((tuple(words), CAPITALIZED if len(words) == 1 else ANY_CASE))
+        if words[-1] not in _NORMALIZED_SUFFIXES or len(words) == 1:
+            break
+        words = words[:-1]
+
+    core = aliases[-1][0] if aliases else ()
+    acronym = "".join(w[0] for w in core)
+    if len(core) >= 3 and acronym.isalpha() and acronym.upper() not in _TICKER_STOPWORDS:
+        aliases.append(((acronym,), UPPER_CASE))
+    return aliases
+
+
+def _case_matches(original: str, rule: int) -> bool:
+    if rule == UPPER_CASE:
+        return original.isupper()
+    if rule == CAPITALIZED:
+        return original[:1].isupper()
+    return True
+
+
+class CompanyResolver:
+    """
+    Deterministic company lookup over the companies in the chunk store.
+
+    Built once per run: every alias of every known company (see name_aliases) goes
+    into a token trie, and a question is scanned left to right for the longest alias
+    at each position. An alias shared by several companies is ambiguous and never
+    resolves on its own. `resolve` is confident only when the question mentions
+    exactly one company; the caller can then skip the LLM. `match` maps a name
+    extracted by the LLM onto a known company.
+    """
+
+    def __init__(self, companies: List[str], fuzzy_threshold: int = 90) -> None:
+        """
+        Args:
+            companies (List[str]): Canonical company names (as stored on the chunks).
+            fuzzy_threshold (int): Minimum token-sort ratio for a quoted name to resolve
+                when no alias matches.
+        """
+        self.companies = sorted(set(companies))
+        self.fuzzy_threshold = fuzzy_threshold
+        self._aliases: Dict[Tuple[str, ...], Set[str]] = {}
+        self._trie: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.resolved = 0
+        self.unresolved = 0
+
+        rules: Dict[Tuple[str, ...], int] = {}
+        for company in self.companies:
+            for alias, rule in name_aliases(company):
+                self._aliases.setdefault(alias, set()).add(company)
+                rules[alias] = min(rules.get(alias, rule), rule)
+
+        for alias, rule in rules.items():
+            node = self._trie
+            for token in alias:
+                node = node.setdefault(token, {})
+            node[_ALIAS] = (alias, rule)
+
+    def _lookup(self, alias: Tuple[str, ...]) -> Optional[str]:
+        companies = self._aliases.get(alias, set())
+        return next(iter(companies)) if len(companies) == 1 else None
+
+    def scan(self, text: str) -> List[Tuple[Optional[str], int, int]]:
+        """
+        Finds company mentions in free text (longest alias wins, no overlaps).
+
+        Returns:
+            List[Tuple[Optional[str], int, int]]: (company, start, end) character spans;
+                company is None for an ambiguous alias.
+        """
+        tokens = _name_tokens(text)
+        mentions: List[Tuple[Optional[str], int, int]] = []
+        i = 0
+        while i < len(tokens):
+            node, found, j = self._trie, None, i
+            while j < len(tokens) and tokens[j][0] in node:
+                node = node[tokens[j][0]]
+                j += 1
+                if _ALIAS in node and _case_matches(tokens[i][1], node[_ALIAS][1]):
+                    found = (node[_ALIAS][0], j)
+            if found is None:
+                i += 1
+                continue
+            alias, end = found
+            mentions.append((self._lookup(alias), tokens[i][2], tokens[end - 1][3]))
+            i = end
+        return mentions
+
+    def resolve(self, question: str) -> Tuple[Optional[str], Optional[Tuple[int, int]]]:
+        """
+        Resolves the company a question is about, without the LLM.
+
+        Returns:
+            Tuple[Optional[str], Optional[Tuple[int, int]]]: The company and the character
+                span of its mention, or (None, None) when not confident (no mention,
+                several companies, or an ambiguous alias).
+        """
+        mentions = self.scan(question)
+        companies = {company for company, _, _ in mentions}
+        result: Tuple[Optional[str], Optional[Tuple[int, int]]] = (None, None)
+        if len(companies) == 1 and None not in companies:
+            company, start, end = mentions[0]
+            # A partial name inside quotes ("Acme Holding plc") stands for the whole quoted name.
+            for quoted in _QUOTED_RE.finditer(question):
+                if quoted.start(1) <= start and end <= quoted.end(1):
+                    start, end = quoted.span(1)
+            result = (company, (start, end))
+        elif not mentions:
+            quoted = _QUOTED_RE.search(question)
+            if quoted:
+                match = process.extractOne(quoted.group(1), self.companies, scorer=fuzz.token_sort_ratio)
+                if match and match[1] >= self.fuzzy_threshold:
+                    result = (match[0], quoted.span(1))
+
+        with self._lock:
+            if result[0] is None:
+                self.unresolved += 1
+            else:
+                self.resolved += 1
+        return result
+
+    def mentioned_companies(self, text: str) -> List[str]:
+        """
+        Distinct known companies mentioned in a text, in order of first mention.
+        Ambiguous aliases are skipped; a quoted name without an alias hit is fuzzy-matched.
+        """
+        mentions = self.scan(text)
+        found = [(start, company) for company, start, _ in mentions if company is not None]
+        for quoted in _QUOTED_RE.finditer(text):
+            if any(quoted.start(1) <= start and end <= quoted.end(1) for _, start, end in mentions):
+                continue
+            match = process.extractOne(quoted.group(1), self.companies, scorer=fuzz.token_sort_ratio)
+            if match and match[1] >= self.fuzzy_threshold:
+                found.append((quoted.start(1), match[0]))
+        return list(dict.fromkeys(company for _, company in sorted(found)))
+
+    def strip_mentions(self, text: str) -> str:
+        """Removes every company mention from a text (for search queries)."""
+        for _, start, end in reversed(self.scan(text)):
+            text = text[:start] + text[end:]
+        return " ".join(text.replace('""', "").split())
+
+    def match(self, target_company: str) -> Optional[str]:
+        """
+        Maps a company name (e.g. extracted by the LLM) onto a known company: alias
+        lookup first, fuzzy matching (score > 60) as the fallback.
+
+        Returns:
+            Optional[str]: The canonical company name, or None if nothing matches.
+        """
+        if not target_company:
+            return None
+
+        for alias, _ in name_aliases(target_company):
+            company = self._lookup(alias)
+            if company:
+                print(f"Exact match: target_company='{company}'")
+                return company
+
+        match = process.extractOne(target_company, self.companies, scorer=fuzz.token_sort_ratio)
+        if match and match[1] > 60:
+            print(f"Fuzzy match: '{target_company}' -> '{match[0]}' (Score: {match[1]})")
+            return match[0]
+
+        print(f"Company '{target_company}' not found in database.")
+        return None
+
+    def hit_rate(self) -> float:
+        """Share of resolve() calls that were confident."""
+        with self._lock:
+            total = self.resolved + self.unresolved
+            return self.resolved / total if total else 0.0
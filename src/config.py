@@ -14,15 +14,92 @@ DATA_DIR: Path = Path(os.getenv("DATA_DIR", str(BASE_DIR / "data")))
 PDF_DIR: Path = Path(os.getenv("PDF_DIR", str(DATA_DIR / "pdfs")))
 
 
-SPLITS_PATH: Path = Path(os.getenv("SPLITS_PATH", str(DATA_DIR / "new_splits.pickle")))
+CHUNK_STORE_PATH: Path = Path(os.getenv("CHUNK_STORE_PATH", str(DATA_DIR / "chunk_store")))
 INDEX_PATH: Path = Path(os.getenv("INDEX_PATH", str(DATA_DIR / "my_faiss_index")))
+SHARDS_PATH: Path = Path(os.getenv("SHARDS_PATH", str(INDEX_PATH / "shards")))
+BM25_PATH: Path = Path(os.getenv("BM25_PATH", str(DATA_DIR / "bm25_index")))
+EMBEDDING_CACHE_PATH: Path = Path(os.getenv("EMBEDDING_CACHE_PATH", str(DATA_DIR / "embedding_cache.sqlite")))
 QUESTIONS_PATH: Path = Path(os.getenv("QUESTIONS_PATH", str(DATA_DIR / "questions.json")))
+COMPANY_MAP_PATH: Path = Path(os.getenv("COMPANY_MAP_PATH", str(DATA_DIR / "company_map.json")))
+PLANS_PATH: Path = Path(os.getenv("PLANS_PATH", str(DATA_DIR / "query_plans.json")))
 OUTPUT_FILE: Path = Path(os.getenv("OUTPUT_FILE", "sample_answer.json"))
+CHECKPOINT_PATH: Path = Path(os.getenv("CHECKPOINT_PATH", str(DATA_DIR / "answers_checkpoint.jsonl")))
 
 
 OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "gpt-oss:20b")
-EMBEDDING_MODEL: str = "Qwen/Qwen3-Embedding-0.6B"
+OLLAMA_HOST: str = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_HOSTS: list[str] = [h.strip() for h in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if h.strip()]
+OLLAMA_MAX_CONCURRENCY: int = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+OLLAMA_TIMEOUT_S: float = float(os.getenv("OLLAMA_TIMEOUT_S", "300"))
+OLLAMA_RETRIES: int = int(os.getenv("OLLAMA_RETRIES", "2"))
+OLLAMA_COOLDOWN_S: float = float(os.getenv("OLLAMA_COOLDOWN_S", "30"))
+OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_PRELOAD: bool = os.getenv("OLLAMA_PRELOAD", "1").lower() not in ("0", "false", "no")
+LLM_BACKEND: str = os.getenv("LLM_BACKEND", "ollama")
+FAKE_LLM_LATENCY_MS: float = float(os.getenv("FAKE_LLM_LATENCY_MS", "200"))
+EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "huggingface")
+EMBEDDING_MODEL: str = (
+    "Qwen/Qwen3-Embedding-0.6B" if EMBEDDING_BACKEND == "huggingface" else f"{EMBEDDING_BACKEND}-stand-in"
+)
 RERANKER_MODEL: str = "BAAI/bge-reranker-base"
+RERANKER_BACKEND: str = os.getenv("RERANKER_BACKEND", "torch")
+RERANKER_ONNX_PATH: Path = Path(os.getenv("RERANKER_ONNX_PATH", str(DATA_DIR / "reranker_onnx")))
+RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "64"))
+RERANK_BATCH_WAIT_MS: float = float(os.getenv("RERANK_BATCH_WAIT_MS", "5"))
+RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "100000"))
+RERANK_CASCADE: bool = os.getenv("RERANK_CASCADE", "1").lower() not in ("0", "false", "no")
+RERANK_MIN_CANDIDATES: int = int(os.getenv("RERANK_MIN_CANDIDATES", "15"))
+RERANK_MAX_CANDIDATES: int = int(os.getenv("RERANK_MAX_CANDIDATES", "40"))
+RERANK_CASCADE_MARGIN: float = float(os.getenv("RERANK_CASCADE_MARGIN", "0.1"))
+RERANK_KEEP_FUSED: int = int(os.getenv("RERANK_KEEP_FUSED", "5"))
+COMPANY_RESOLVER: bool = os.getenv("COMPANY_RESOLVER", "1").lower() not in ("0", "false", "no")
+CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "4000"))
+CONTEXT_MAX_CHUNKS: int = int(os.getenv("CONTEXT_MAX_CHUNKS", "10"))
+FANOUT_MAX_COMPANIES: int = int(os.getenv("FANOUT_MAX_COMPANIES", "8"))
+FANOUT_K: int = int(os.getenv("FANOUT_K", "20"))
+FANOUT_COMPANY_MAX_TOKENS: int = int(os.getenv("FANOUT_COMPANY_MAX_TOKENS", "1200"))
+FANOUT_COMPANY_MAX_CHUNKS: int = int(os.getenv("FANOUT_COMPANY_MAX_CHUNKS", "3"))
+
+
+FAISS_INDEX_TYPE: str = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_DIM: int = int(os.getenv("FAISS_DIM", "0"))
+FAISS_NLIST: int = int(os.getenv("FAISS_NLIST", "0"))
+FAISS_PQ_M: int = int(os.getenv("FAISS_PQ_M", "64"))
+FAISS_HNSW_M: int = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_SEARCH: int = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_NPROBE: int = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_TRAIN_SAMPLE: int = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))
+
+
+INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "4"))
+INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+METADATA_WORKERS: int = int(os.getenv("METADATA_WORKERS", "4"))
+DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "1").lower() not in ("0", "false", "no")
+DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+DEDUP_NUM_PERM: int = int(os.getenv("DEDUP_NUM_PERM", "128"))
+DEDUP_BANDS: int = int(os.getenv("DEDUP_BANDS", "16"))
+DEDUP_SHINGLE_SIZE: int = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))
+EMBEDDING_WORKERS: int = int(os.getenv("EMBEDDING_WORKERS", "2"))
+EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+STARTUP_WORKERS: int = int(os.getenv("STARTUP_WORKERS", "4"))
+
+
+SERVE_HOST: str = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT: int = int(os.getenv("SERVE_PORT", "8000"))
+SERVE_WORKERS: int = int(os.getenv("SERVE_WORKERS", "8"))
+SERVE_MAX_QUEUE: int = int(os.getenv("SERVE_MAX_QUEUE", "32"))
+SERVE_QUEUE_TIMEOUT_S: float = float(os.getenv("SERVE_QUEUE_TIMEOUT_S", "30"))
+
+
+LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH: Path = Path(os.getenv("LLM_CACHE_PATH", str(DATA_DIR / "llm_cache.sqlite")))
+LLM_CACHE_MAX_MB: int = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+
+TRACE_ENABLED: bool = os.getenv("TRACE_ENABLED", "1").lower() not in ("0", "false", "no")
+TRACE_PATH: Path = Path(os.getenv("TRACE_PATH", str(DATA_DIR / "traces.jsonl")))
+# Latest span durations kept per stage for the p50/p95 summary (the JSONL file keeps all of them).
+TRACE_WINDOW: int = int(os.getenv("TRACE_WINDOW", "10000"))
 
 
 TEAM_EMAIL: str | None = os.getenv("TEAM_EMAIL")
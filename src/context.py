@@ -0,0 +1,127 @@
+import os
+from typing import Any, Dict, List, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import CONTEXT_MAX_TOKENS, CONTEXT_MAX_CHUNKS, FANOUT_COMPANY_MAX_TOKENS, FANOUT_COMPANY_MAX_CHUNKS
+
+CHARS_PER_TOKEN = 4
+MIN_TRUNCATED_TOKENS = 64
+MAX_EXTRA_LOCATIONS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about 4 characters per token for English text).
+    Only used for budgeting and logging; the model's own tokenizer is not needed.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def pdf_sha1_of(doc: Document) -> str:
+    """PDFs are named by their SHA1, so the citation key is the file name without extension."""
+    return os.path.splitext(doc.metadata.get("source", "unknown"))[0]
+
+
+def page_header(pdf_sha1: str, page_index: int) -> str:
+    return f"[pdf_sha1: {pdf_sha1} | page_index: {page_index}]"
+
+
+def extra_locations(doc: Document) -> List[Tuple[str, int]]:
+    """Other pages holding the same text (near-duplicates collapsed at ingestion)."""
+    return [(os.path.splitext(source)[0], int(page)) for source, page in doc.metadata.get("provenance", [])[1:]]
+
+
+def build_context(
+    docs: Sequence[Document], max_tokens: int = CONTEXT_MAX_TOKENS, max_chunks: int = CONTEXT_MAX_CHUNKS
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Builds the compact CONTEXT block of the answer prompt.
+
+    Chunks are taken in ranking order until `max_chunks` chunks or `max_tokens`
+    (estimated) tokens are used; a chunk that does not fit is skipped, and the first
+    chunk is truncated rather than dropped. Chunks of the same page are merged under a
+    single header carrying only the fields the Answer references need (pdf_sha1,
+    page_index); inside a page they are put back in document order, and a gap
+    between non-adjacent chunks is marked with "[...]". Pages appear in the order of
+    their best-ranked chunk. Other pages where a chunk's text also occurs (see
+    src/dedup.py) are listed after the page header, up to MAX_EXTRA_LOCATIONS per page.
+
+    Args:
+        docs (Sequence[Document]): Reranked chunks, best first.
+        max_tokens (int): Token budget of the whole context.
+        max_chunks (int): Maximum number of chunks to include.
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: The context text and stats (tokens, chunks, pages).
+    """
+    pages: Dict[Tuple[str, int], List[Document]] = {}
+    extras: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+    used_tokens = 0
+    used_chunks = 0
+
+    for doc in docs:
+        if used_chunks >= max_chunks:
+            break
+        key = (pdf_sha1_of(doc), int(doc.metadata.get("page_index", 0)))
+        page_extras = extras.get(key, [])
+        new_extras = [loc for loc in dict.fromkeys(extra_locations(doc)) if loc != key and loc not in page_extras]
+        new_extras = new_extras[: MAX_EXTRA_LOCATIONS - len(page_extras)]
+        cost = estimate_tokens(doc.page_content) + (0 if key in pages else estimate_tokens(page_header(*key)) + 1)
+        cost += sum(estimate_tokens(page_header(*loc)) + 1 for loc in new_extras)
+
+        if used_tokens + cost > max_tokens:
+            remaining = max_tokens - used_tokens - (cost - estimate_tokens(doc.page_content))
+            if used_chunks > 0 or remaining < MIN_TRUNCATED_TOKENS:
+                continue
+            doc = Document(page_content=doc.page_content[: remaining * CHARS_PER_TOKEN], metadata=doc.metadata)
+            cost = max_tokens - used_tokens
+
+        pages.setdefault(key, []).append(doc)
+        extras[key] = page_extras + new_extras
+        used_tokens += cost
+        used_chunks += 1
+
+    blocks = []
+    for (pdf_sha1, page_index), page_docs in pages.items():
+        page_docs = sorted(page_docs, key=lambda d: d.metadata.get("chunk_id", 0))
+        parts = [page_docs[0].page_content]
+        for prev, doc in zip(page_docs, page_docs[1:]):
+            adjacent = doc.metadata.get("chunk_id", 0) - prev.metadata.get("chunk_id", 0) == 1
+            parts.append(("\n" if adjacent else "\n[...]\n") + doc.page_content)
+        header = page_header(pdf_sha1, page_index)
+        if extras[(pdf_sha1, page_index)]:
+            header += " also on " + " ".join(page_header(*loc) for loc in extras[(pdf_sha1, page_index)])
+        blocks.append(f"{header}\n{''.join(parts)}")
+
+    context = "\n\n".join(blocks)
+    return context, {"tokens": estimate_tokens(context), "chunks": used_chunks, "pages": len(blocks)}
+
+
+def build_company_context(
+    groups: Sequence[Tuple[str, Sequence[Document]]],
+    max_tokens: int = FANOUT_COMPANY_MAX_TOKENS,
+    max_chunks: int = FANOUT_COMPANY_MAX_CHUNKS,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Builds the CONTEXT block of a multi-company question: one build_context section
+    per company, each with its own budget, under a "=== Company: name ===" line.
+
+    Args:
+        groups (Sequence[Tuple[str, Sequence[Document]]]): (company, reranked chunks) pairs.
+        max_tokens (int): Token budget of each company's section.
+        max_chunks (int): Maximum number of chunks per company.
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: The context text and stats (tokens, chunks, pages, companies).
+    """
+    sections = []
+    chunks = pages = 0
+    for company, docs in groups:
+        text, stats = build_context(docs, max_tokens=max_tokens, max_chunks=max_chunks)
+        sections.append(f"=== Company: {company} ===\n{text or '(no relevant pages found)'}")
+        chunks += stats["chunks"]
+        pages += stats["pages"]
+
+    context = "\n\n".join(sections)
+    return context, {"tokens": estimate_tokens(context), "chunks": chunks, "pages": pages, "companies": len(groups)}
@@ -0,0 +1,183 @@
+"""
+Near-duplicate chunk detection for ingestion (MinHash + LSH).
+
+Annual reports repeat boilerplate (disclaimers, running headers, forward-looking
+statements, repeated tables). Each chunk gets a MinHash signature over its word
+shingles; signatures are split into bands and bucketed (LSH), and a chunk whose
+estimated Jaccard similarity with an earlier chunk in the same scope (company) is at
+least the threshold, and whose numbers are exactly the same, is not stored again. The
+caller records its (source, page_index) as an extra location of the earlier, canonical
+chunk instead. Requiring equal numbers keeps tables and statements that differ only in
+a few figures (e.g. the same table in two years' reports) as separate chunks.
+"""
+
+import re
+import zlib
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text: str, size: int) -> List[str]:
+    """Lowercased word n-grams of a text (the whole text if it has fewer than `size` words)."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i : i + size]) for i in range(len(words) - size + 1)]
+
+
+def numbers(text: str) -> Tuple[str, ...]:
+    """The numbers of a text in order, without thousands separators."""
+    return tuple(m.group(0).replace(",", "") for m in _NUMBER_RE.finditer(text))
+
+
+class Fingerprint(NamedTuple):
+    signature: np.ndarray
+    numbers: Tuple[str, ...]
+
+
+class MinHasher:
+    """
+    MinHash signatures with `num_perm` universal hash functions (a * x + b) mod p.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> None:
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)), dtype=np.uint64
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of MinHash signatures, one bucket table per band.
+
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity for a duplicate.
+        bands (int): LSH bands; must divide the signature length. More bands find
+            less similar candidates (which are then checked against the threshold).
+    """
+
+    def __init__(self, threshold: float, bands: int) -> None:
+        self.threshold = threshold
+        self.bands = bands
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._fingerprints: Dict[int, Fingerprint] = {}
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in np.split(signature, self.bands)]
+
+    def find(self, fingerprint: Fingerprint) -> Optional[int]:
+        """
+        Returns the id of the most similar indexed chunk above the threshold that has the
+        same numbers, if any.
+        """
+        candidates = set()
+        for buckets, key in zip(self._buckets, self._band_keys(fingerprint.signature)):
+            candidates.update(buckets.get(key, ()))
+        best, best_similarity = None, self.threshold
+        for chunk_id in sorted(candidates):
+            other = self._fingerprints[chunk_id]
+            if other.numbers != fingerprint.numbers:
+                continue
+            similarity = float(np.mean(other.signature == fingerprint.signature))
+            if similarity > best_similarity or (best is None and similarity >= best_similarity):
+                best, best_similarity = chunk_id, similarity
+        return best
+
+    def add(self, chunk_id: int, fingerprint: Fingerprint) -> None:
+        self._fingerprints[chunk_id] = fingerprint
+        for buckets, key in zip(self._buckets, self._band_keys(fingerprint.signature)):
+            buckets.setdefault(key, []).append(chunk_id)
+
+
+class ChunkDeduplicator:
+    """
+    Per-scope near-duplicate detection with running statistics.
+
+    Scopes are independent (a chunk only collapses into one of the same company).
+    `seed(scope)` is called the first time a scope is seen and yields (chunk id, text)
+    of chunks stored by an earlier ingestion run, so they are found as well.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: Optional[Callable[[str], Iterable[Tuple[int, str]]]] = None,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands}).")
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.threshold = threshold
+        self.bands = bands
+        self._seed = seed
+        self._indexes: Dict[str, NearDuplicateIndex] = {}
+        self.chunks = 0
+        self.duplicates = 0
+        self.duplicate_chars = 0
+        self.total_chars = 0
+
+    def _index(self, scope: str) -> NearDuplicateIndex:
+        if scope not in self._indexes:
+            index = NearDuplicateIndex(self.threshold, self.bands)
+            for chunk_id, text in self._seed(scope) if self._seed else ():
+                index.add(chunk_id, self.fingerprint(text))
+            self._indexes[scope] = index
+        return self._indexes[scope]
+
+    def fingerprint(self, text: str) -> Fingerprint:
+        return Fingerprint(self.hasher.signature(text), numbers(text))
+
+    def check(self, scope: str, text: str) -> Tuple[Optional[int], Fingerprint]:
+        """
+        Looks a chunk up in its scope.
+
+        Returns:
+            Tuple[Optional[int], Fingerprint]: The canonical chunk id if the text is a
+                near-duplicate (None otherwise), and its fingerprint for add().
+        """
+        fingerprint = self.fingerprint(text)
+        canonical = self._index(scope).find(fingerprint)
+        self.chunks += 1
+        self.total_chars += len(text)
+        if canonical is not None:
+            self.duplicates += 1
+            self.duplicate_chars += len(text)
+        return canonical, fingerprint
+
+    def add(self, scope: str, chunk_id: int, fingerprint: Fingerprint) -> None:
+        """Indexes a newly stored (canonical) chunk."""
+        self._index(scope).add(chunk_id, fingerprint)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "chunks": self.chunks,
+            "duplicates": self.duplicates,
+            "stored": self.chunks - self.duplicates,
+            "chunk_reduction": round(self.duplicates / self.chunks, 4) if self.chunks else 0.0,
+            "text_reduction": round(self.duplicate_chars / self.total_chars, 4) if self.total_chars else 0.0,
+        }
+
+
+def dedup_scope(company_name: str, source: str) -> str:
+    """Company of a chunk, or its file when the company is unknown (so unrelated reports never merge)."""
+    return source if company_name in ("", "Unknown") else company_name
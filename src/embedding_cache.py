@@ -0,0 +1,169 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.batching import MicroBatcher
+
+
+class EmbeddingCache:
+    """
+    Persistent map from chunk content hash to embedding vector.
+
+    Vectors are stored as raw float32 bytes in SQLite and namespaced by embedding
+    model, so switching models never returns stale vectors. Re-indexing only has
+    to embed chunks whose hash is not in the cache yet.
+    """
+
+    def __init__(self, path: Path, model_name: str) -> None:
+        """
+        Args:
+            path (Path): SQLite database file.
+            model_name (str): Embedding model the vectors belong to.
+        """
+        self.path = Path(path)
+        self.model_name = model_name
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, content_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, content_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, content_hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """
+        Looks up vectors for several hashes.
+
+        Returns:
+            Dict[str, np.ndarray]: Vectors for the hashes found in the cache.
+        """
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(content_hashes))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                part = unique[start : start + 500]
+                query = (
+                    "SELECT content_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND content_hash IN ({','.join('?' * len(part))})"
+                )
+                for content_hash, blob in self._conn.execute(query, [self.model_name, *part]):
+                    found[content_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, Sequence[float]]]) -> None:
+        """Stores (content_hash, vector) pairs and commits."""
+        rows = [
+            (self.model_name, content_hash, np.asarray(vector, dtype=np.float32).tobytes())
+            for content_hash, vector in items
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, content_hash, vector) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_name,)).fetchone()
+        return row[0]
+
+
+def normalize_query(text: str) -> str:
+    """Collapses whitespace so trivially different spellings of a query share a vector."""
+    return " ".join(text.split())
+
+
+def query_key(text: str) -> str:
+    return hashlib.sha1(normalize_query(text).encode("utf-8")).hexdigest()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Query encoder with a persistent vector cache and cross-question micro-batching.
+
+    Query vectors are stored in an EmbeddingCache under their own namespace, keyed by
+    the hash of the normalized query text, so re-runs never re-embed a query. Cache
+    misses from concurrent callers are merged by a MicroBatcher into shared forward
+    passes, and `prefetch` embeds a whole run's planned queries up front. Documents
+    are passed straight through to the wrapped model.
+
+    The wrapped model must encode queries and documents the same way (no query
+    prompt), which holds for the embeddings returned by models.get_embeddings.
+    """
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache, batch_size: int = 64, max_wait_ms: float = 5.0) -> None:
+        """
+        Args:
+            base (Embeddings): The model (possibly truncating) that produces the indexed vectors.
+            cache (EmbeddingCache): Persistent store for query vectors, namespaced per model and dimension.
+            batch_size (int): Queries per forward pass.
+            max_wait_ms (float): How long a partial batch waits for queries of other questions.
+        """
+        self.base = base
+        self.cache = cache
+        self.batch_size = batch_size
+        self._batcher = MicroBatcher(self._embed_batch, max_batch=batch_size, max_wait_ms=max_wait_ms)
+        self._lock = threading.Lock()
+        self._memory: Dict[str, np.ndarray] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Embeds several queries, serving cached ones from memory or disk.
+        """
+        keys = [query_key(text) for text in texts]
+        with self._lock:
+            found = {key: self._memory[key] for key in keys if key in self._memory}
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            found.update(self.cache.get_many(missing))
+
+        to_embed = {key: normalize_query(text) for key, text in zip(keys, texts) if key not in found}
+        if to_embed:
+            vectors = self._batcher.run(list(to_embed.values()))
+            fresh = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(to_embed, vectors)}
+            self.cache.put_many(fresh.items())
+            found.update(fresh)
+
+        with self._lock:
+            self._memory.update(found)
+            self.misses += len(to_embed)
+            self.hits += len(keys) - len(to_embed)
+        return [found[key].tolist() for key in keys]
+
+    def prefetch(self, texts: Sequence[str]) -> None:
+        """Embeds every query not cached yet, in batches of `batch_size`."""
+        unique = list(dict.fromkeys(texts))
+        before = self.misses
+        for start in range(0, len(unique), self.batch_size):
+            self.embed_queries(unique[start : start + self.batch_size])
+        print(f"Query vectors ready: {len(unique)} queries, {self.misses - before} embedded, rest cached.")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "forward_batches": self._batcher.batches,
+            "queries_embedded": self._batcher.items,
+            "queue_depth": self._batcher.queue_depth(),
+        }
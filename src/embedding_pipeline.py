@@ -0,0 +1,151 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from tqdm import tqdm
+from langchain_core.embeddings import Embeddings
+
+from src.chunk_store import ChunkStore
+from src.embedding_cache import EmbeddingCache
+from src.models import get_embeddings
+from src.utils import cleanup_memory
+
+
+_worker_embeddings: Optional[Embeddings] = None
+
+
+def embed_batch(embeddings: Embeddings, texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Embeds a batch, falling back to one text at a time if the batch fails (e.g. OOM).
+    Texts that still fail get no vector (None).
+    """
+    try:
+        return embeddings.embed_documents(texts)
+    except Exception as e:
+        print(f"Batch embedding failed ({e}), retrying one by one...")
+        cleanup_memory()
+
+    vectors: List[Optional[List[float]]] = []
+    for text in texts:
+        try:
+            vectors.append(embeddings.embed_documents([text])[0])
+        except Exception as e:
+            print(f"Skipping chunk that failed to embed: {e}")
+            vectors.append(None)
+    return vectors
+
+
+def _init_worker(num_threads: int) -> None:
+    """Pins the worker's intra-op threads and loads its own copy of the embedding model."""
+    global _worker_embeddings
+    import torch
+
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    torch.set_num_threads(num_threads)
+    _worker_embeddings = get_embeddings()
+
+
+def _embed_in_worker(texts: List[str]) -> List[Optional[List[float]]]:
+    return embed_batch(_worker_embeddings, texts)
+
+
+def embed_chunks(
+    store: ChunkStore,
+    chunk_ids: Sequence[int],
+    cache: EmbeddingCache,
+    batch_size: int = 64,
+    workers: int = 1,
+    embeddings: Optional[Embeddings] = None,
+) -> Dict[str, Any]:
+    """
+    Embeds chunks into the embedding cache with a producer/consumer pipeline.
+
+    Chunks are sorted by length so each batch holds texts of similar size (less padding).
+    The producer loads texts and feeds batches to a pool of worker processes, each with
+    its own model copy and a fixed share of the CPU threads; a writer thread commits
+    finished batches to the cache. The cache doubles as the checkpoint: an interrupted
+    run is resumed by calling this again with the chunks still missing from it.
+
+    Args:
+        store (ChunkStore): Source of chunk texts.
+        chunk_ids (Sequence[int]): Chunks to embed.
+        cache (EmbeddingCache): Destination for (content_hash, vector) pairs.
+        batch_size (int): Texts per forward pass.
+        workers (int): Number of embedding processes. 1 embeds in-process.
+        embeddings (Optional[Embeddings]): Model for the in-process path (loaded if None).
+
+    Returns:
+        Dict[str, Any]: Number of embedded/failed chunks, elapsed seconds and chunks/sec.
+    """
+    lengths = store.lengths()
+    order = sorted(chunk_ids, key=lambda c: lengths.get(c, 0))
+    batches = [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+    stats = {"embedded": 0, "failed": 0}
+    results: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max(2, workers * 2))
+    progress = tqdm(total=len(order), desc="Embedding Chunks", unit="chunk")
+
+    def write_results() -> None:
+        while True:
+            item = results.get()
+            if item is None:
+                return
+            content_hashes, vectors = item
+            done = [(h, v) for h, v in zip(content_hashes, vectors) if v is not None]
+            cache.put_many(done)
+            stats["embedded"] += len(done)
+            stats["failed"] += len(content_hashes) - len(done)
+            progress.update(len(content_hashes))
+
+    writer = threading.Thread(target=write_results, daemon=True)
+    writer.start()
+    start = time.perf_counter()
+
+    try:
+        if workers <= 1:
+            model = embeddings or get_embeddings()
+            for batch in batches:
+                docs = store.get_many(batch)
+                vectors = embed_batch(model, [doc.page_content for doc in docs])
+                results.put(([doc.metadata["content_hash"] for doc in docs], vectors))
+        else:
+            threads_per_worker = max(1, (os.cpu_count() or workers) // workers)
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(threads_per_worker,),
+            ) as pool:
+                in_flight: deque = deque()
+                for batch in batches:
+                    docs = store.get_many(batch)
+                    future = pool.submit(_embed_in_worker, [doc.page_content for doc in docs])
+                    in_flight.append(([doc.metadata["content_hash"] for doc in docs], future))
+                    while len(in_flight) >= workers * 2:
+                        content_hashes, done = in_flight.popleft()
+                        results.put((content_hashes, done.result()))
+                while in_flight:
+                    content_hashes, done = in_flight.popleft()
+                    results.put((content_hashes, done.result()))
+    finally:
+        results.put(None)
+        writer.join()
+        progress.close()
+
+    elapsed = time.perf_counter() - start
+    stats_out: Dict[str, Any] = {
+        **stats,
+        "seconds": round(elapsed, 2),
+        "chunks_per_sec": round(stats["embedded"] / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    if order:
+        print(
+            f"Embedded {stats['embedded']} chunks ({stats['failed']} failed) in {elapsed:.1f}s "
+            f"with {workers} worker(s): {stats_out['chunks_per_sec']} chunks/sec"
+        )
+    return stats_out
@@ -1,101 +1,101 @@
-from typing import Dict, Any, Callable, List
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Dict, Any, Callable, List, Optional
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 from langchain_core.documents import Document
-from langchain_classic.retrievers import EnsembleRetriever
-from langchain_core.vectorstores import VectorStore
-from langchain_core.retrievers import BaseRetriever
-from langchain_core.documents.compressors import BaseDocumentCompressor
+from langchain_core.documents import BaseDocumentCompressor
 
 from src.models import get_llm
-from src.schemas import Answer, ReformulatedQuery, SearchQuery
-from src.retrieval import get_company_match
-
-llm = get_llm()
-
-
-reformulate_query_prompt = """You are an expert in Financial Information Retrieval.
-Rewrite the user's raw question into a targeted, keyword-rich semantic query.
-1. STRIP Company Names.
-2. REMOVE Constraints (e.g. "return 'N/A'").
-3. REMOVE Temporal Noise.
-4. EXPAND Terminology (e.g. "let go" -> "redundancy, severance").
-Output ONLY the rewritten query string.
-User Input:
-"""
-reformulator = llm.with_structured_output(ReformulatedQuery)
-
-
-def reformulate_query(query: str) -> ReformulatedQuery:
-    """
-    Rewrites the raw user query to be more suitable for vector search.
-    """
-    prompt = reformulate_query_prompt + "\n" + query
-    res = reformulator.invoke(prompt)
-    return res
-
-
-query_analyzer = llm.with_structured_output(SearchQuery)
+from src.schemas import Answer, QueryPlan
+from src.hybrid import HybridRetriever
+from src.companies import CompanyResolver
+from src.config import COMPANY_RESOLVER, FANOUT_MAX_COMPANIES, FANOUT_K
+from src.planning import plan_question
+from src.utils import question_hash
+from src.context import build_context, build_company_context, estimate_tokens
+from src.tracing import span
 
 
 def build_retrieve_fn(
-    vector_db: VectorStore, bm25_retriever: BaseRetriever, compressor: BaseDocumentCompressor, known_companies: List[str]
+    retriever: HybridRetriever,
+    compressor: BaseDocumentCompressor,
+    known_companies: List[str],
+    plans: Optional[Dict[str, QueryPlan]] = None,
+    resolver: Optional[CompanyResolver] = None,
 ) -> Callable[[Dict[str, Any]], str]:
     """
-    Builds a retrieval function that encapsulates the logic for company extraction,
-    ensemble retrieval (BM25+Vector), filtering, and reranking.
+    Builds a retrieval function that encapsulates the logic for company matching,
+    hybrid retrieval (BM25+Vector, filtered by company), and reranking.
+
+    A question that names several known companies ("which of A, B and C ...") is
+    fanned out: one search and rerank per company, run in parallel, each with its own
+    context budget (see context.build_company_context), instead of one search over
+    the whole corpus.
 
     Args:
-        vector_db (VectorStore): The vector store.
-        bm25_retriever (BaseRetriever): The keyword retriever.
-        compressor (BaseDocumentCompressor): The reranker.
+        retriever (HybridRetriever): The shared hybrid retriever.
+        compressor (BaseDocumentCompressor): The reranker, usually the cascade that prunes
+            candidates before cross-encoder scoring.
         known_companies (List[str]): List of valid companies for filtering.
+        plans (Optional[Dict[str, QueryPlan]]): Precomputed query plans keyed by question hash.
+            Questions without a plan are planned on the fly (deterministically when the
+            company resolver is confident and COMPANY_RESOLVER is on).
+        resolver (Optional[CompanyResolver]): Company alias index; built from `known_companies` if omitted.
 
     Returns:
         Callable[[Dict[str, Any]], str]: A function taking input dict with 'question'
                                          and returning a serialized string of contexts.
     """
 
-    def retrieve(inputs: Dict[str, Any]) -> str:
-        user_question = inputs["question"]
-
-        analysis = query_analyzer.invoke(f"Extract company name and refine query: {user_question}")
-        target_company = analysis.extracted_company
-        best_match_name = get_company_match(target_company, known_companies)
-
-        vect_kwargs: Dict[str, Any] = {"k": 50, "fetch_k": 1000}
-        if best_match_name:
-            vect_kwargs["filter"] = {"company_name": best_match_name}
-
-        vector_retriever = vector_db.as_retriever(search_type="mmr", search_kwargs=vect_kwargs)
-
-        ensemble_retriever = EnsembleRetriever(retrievers=[bm25_retriever, vector_retriever], weights=[0.3, 0.7])
+    resolver = resolver or CompanyResolver(known_companies)
+    executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_COMPANIES, thread_name_prefix="fan-out")
 
-        refined_query = reformulate_query(user_question).reformulated_query
-        print(f"Refined Query: {refined_query}")
+    def search_and_rerank(query: str, company: Optional[str], k: Optional[int] = None) -> List[Document]:
+        with span("search", company=company) as search_span:
+            docs: List[Document] = retriever.invoke(query, company=company, k=k)
+            search_span.set(candidates=len(docs))
 
-        docs: List[Document] = ensemble_retriever.invoke(refined_query)
+        with span("rerank", candidates=len(docs)) as rerank_span:
+            compressed_docs = compressor.compress_documents(documents=docs, query=query)
+            rerank_span.set(kept=len(compressed_docs))
+        return compressed_docs
 
-        if best_match_name:
-            docs = [d for d in docs if d.metadata.get("company_name") == best_match_name]
-
-        compressed_docs = compressor.compress_documents(documents=docs, query=refined_query)
-
-        if compressed_docs:
-            compressed_docs = compressed_docs[:10]
+    def retrieve(inputs: Dict[str, Any]) -> str:
+        user_question = inputs["question"]
 
-        serialized = "\n\n".join(
-            (
-                f"--- DOCUMENT START ---\n"
-                f"Filename: {doc.metadata.get('source', 'unknown')}\n"
-                f"Page Index: {doc.metadata.get('page_index', 0)}\n"
-                f"Metadata: {doc.metadata}\n"
-                f"Content: {doc.page_content}\n"
-                f"--- DOCUMENT END ---\n"
-            )
-            for doc in compressed_docs
+        with span("retrieve"):
+            with span("plan") as plan_span:
+                plan = (plans or {}).get(question_hash(user_question))
+                plan_span.set(precomputed=plan is not None)
+                if plan is None:
+                    plan = plan_question(user_question, inputs.get("kind", ""), resolver if COMPANY_RESOLVER else None)
+
+            refined_query = plan.refined_query
+            print(f"Refined Query: {refined_query}")
+
+            companies = resolver.mentioned_companies(user_question)[:FANOUT_MAX_COMPANIES]
+            if len(companies) > 1:
+                query = resolver.strip_mentions(refined_query) or refined_query
+                with span("fan_out", companies=len(companies)):
+                    futures = [
+                        executor.submit(copy_context().run, search_and_rerank, query, company, FANOUT_K)
+                        for company in companies
+                    ]
+                    groups = [(company, future.result()) for company, future in zip(companies, futures)]
+            else:
+                docs = search_and_rerank(refined_query, resolver.match(plan.extracted_company))
+
+            with span("context") as context_span:
+                context, stats = build_company_context(groups) if len(companies) > 1 else build_context(docs)
+                prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_question) + stats["tokens"]
+                context_span.set(**stats, prompt_tokens_est=prompt_tokens)
+
+        print(
+            f"Context: {stats['chunks']} chunks on {stats['pages']} pages, "
+            f"~{stats['tokens']} tokens (prompt ~{prompt_tokens} tokens)"
         )
-        return serialized
+        return context
 
     return retrieve
 
@@ -106,7 +106,7 @@ Your task is to answer the user's question using ONLY the provided context docum
 RULES:
 1. Extract value exactly. 'kind'='number' -> float. 'kind'='boolean' -> true/false.
 2. If info is NOT in Context, return value="N/A".
-3. Populate 'references' list strictly from Context headers.
+3. Populate 'references' list strictly from the [pdf_sha1 | page_index] headers of the Context.
 4. JSON Output strictly adhering to schema.
 """
 
@@ -126,11 +126,15 @@ def create_rag_chain(retrieve_fn: Callable[[Dict[str, Any]], str]) -> Runnable:
         [("system", system_prompt), ("human", "Question: {question}\nOutput Kind: {kind}\n\nCONTEXT:\n{context}")]
     )
 
-    llm_structured = llm.with_structured_output(Answer)
+    llm_structured = get_llm().with_structured_output(Answer)
+
+    def generate(prompt_value: Any, config: RunnableConfig) -> Answer:
+        with span("generate"):
+            return llm_structured.invoke(prompt_value, config=config)
 
     chain = (
         {"context": retrieve_fn, "question": lambda x: x["question"], "kind": lambda x: x["kind"]}
         | prompt_template
-        | llm_structured
+        | RunnableLambda(generate)
     )
     return chain
@@ -0,0 +1,179 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from pydantic import ConfigDict, Field, PrivateAttr
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+from src.index_factory import search_parameters
+from src.tracing import span
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[int]], weights: Sequence[float], c: int = 60
+) -> List[Tuple[int, float]]:
+    """
+    Weighted reciprocal-rank fusion over integer ids.
+
+    Each list contributes weight / (c + rank) to the ids it contains (rank starts at 1).
+
+    Returns:
+        List[Tuple[int, float]]: (id, fused score) pairs, best first. Ties keep the
+            order of first appearance in the inputs.
+    """
+    parts = [(np.asarray(ids, dtype=np.int64), w) for ids, w in zip(ranked_lists, weights) if len(ids)]
+    if not parts:
+        return []
+    ids = np.concatenate([p for p, _ in parts])
+    contributions = np.concatenate([w / (c + np.arange(1, len(p) + 1, dtype=np.float64)) for p, w in parts])
+
+    unique, first_seen, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions)
+    order = np.lexsort((first_seen, -scores))
+    return [(int(unique[i]), float(scores[i])) for i in order]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Long-lived BM25 + dense retriever, fused with reciprocal-rank fusion over chunk ids.
+
+    Both searches run in parallel and are restricted to the question's company before
+    fusion: BM25 scores only the company's partition, and dense search uses the
+    company shard when there is one, or an id selector on the global FAISS index
+    otherwise. Only the fused ids are loaded from the chunk store. Company, k and
+    fusion weights can be set per call:
+
+        retriever.invoke(query, company="Acme plc", k=50, weights=(0.3, 0.7))
+
+    Returned documents carry their fused score in metadata['fused_score']. Searches of
+    concurrent calls (several questions, or one question fanned out over several
+    companies) share a pool of `search_workers` threads.
+    """
+
+    vector_db: Any
+    bm25: Any
+    store: Any = Field(repr=False)
+    shards: Any = None
+    k: int = 50
+    weights: Tuple[float, float] = (0.3, 0.7)
+    fetch_k: int = 200
+    use_mmr: bool = True
+    lambda_mult: float = 0.5
+    rrf_c: int = 60
+    search_workers: int = 8
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _executor: ThreadPoolExecutor = PrivateAttr()
+    _positions: Dict[str, np.ndarray] = PrivateAttr(default_factory=dict)
+    _selectors: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self.search_workers, thread_name_prefix="hybrid")
+        position_of = {int(doc_id): pos for pos, doc_id in self.vector_db.index_to_docstore_id.items()}
+        for company, chunk_ids in self.store.ids_by_company().items():
+            positions = [position_of[c] for c in chunk_ids if c in position_of]
+            self._positions[company] = np.asarray(positions, dtype=np.int64)
+
+    def _selector(self, company: str) -> Optional[Any]:
+        with self._lock:
+            if company not in self._selectors:
+                positions = self._positions.get(company)
+                self._selectors[company] = faiss.IDSelectorBatch(positions) if positions is not None else None
+            return self._selectors[company]
+
+    def dense_search(self, query: str, company: Optional[str], k: int) -> List[int]:
+        """
+        Dense (optionally MMR-diversified) search returning chunk ids, best first.
+        """
+        shard = self.shards.get(company) if self.shards is not None and company else None
+        db = shard if shard is not None else self.vector_db
+
+        params = None
+        if shard is None and company:
+            selector = self._selector(company)
+            if selector is None:
+                return []
+            params = search_parameters(db.index, selector)
+
+        query_vector = np.asarray([db.embeddings.embed_query(query)], dtype=np.float32)
+        fetch_k = min(max(self.fetch_k, k) if self.use_mmr else k, db.index.ntotal)
+        if fetch_k <= 0:
+            return []
+        _, found = db.index.search(query_vector, fetch_k, params=params)
+        positions = found[0][found[0] >= 0]
+
+        if self.use_mmr and len(positions) > k:
+            vectors = db.index.reconstruct_batch(positions)
+            picked = maximal_marginal_relevance(query_vector[0], list(vectors), lambda_mult=self.lambda_mult, k=k)
+            positions = positions[picked]
+
+        return [int(db.index_to_docstore_id[int(p)]) for p in positions[:k]]
+
+    def _bm25_search(self, query: str, company: Optional[str], k: int) -> List[Tuple[int, float]]:
+        with span("bm25") as bm25_span:
+            hits = self.bm25.search(query, k, partition=company)
+            bm25_span.set(hits=len(hits))
+        return hits
+
+    def _dense_search(self, query: str, company: Optional[str], k: int) -> List[int]:
+        with span("dense", mmr=self.use_mmr) as dense_span:
+            hits = self.dense_search(query, company, k)
+            dense_span.set(hits=len(hits))
+        return hits
+
+    def search(
+        self,
+        query: str,
+        company: Optional[str] = None,
+        k: Optional[int] = None,
+        weights: Optional[Sequence[float]] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Runs BM25 and dense search in parallel (each traced as a span) and fuses them.
+
+        Args:
+            query (str): Search query.
+            company (Optional[str]): Restrict both searches to this company.
+            k (Optional[int]): Hits taken from each search (defaults to self.k).
+            weights (Optional[Sequence[float]]): (bm25, dense) fusion weights. A search
+                with weight 0 is skipped.
+
+        Returns:
+            List[Tuple[int, float]]: (chunk id, fused score), best first.
+        """
+        k = k or self.k
+        weights = weights or self.weights
+        bm25_weight, dense_weight = weights
+        bm25_future = (
+            self._executor.submit(copy_context().run, self._bm25_search, query, company, k) if bm25_weight else None
+        )
+        dense_future = (
+            self._executor.submit(copy_context().run, self._dense_search, query, company, k) if dense_weight else None
+        )
+        bm25_ids = [chunk_id for chunk_id, _ in bm25_future.result()] if bm25_future else []
+        dense_ids = dense_future.result() if dense_future else []
+        return reciprocal_rank_fusion([bm25_ids, dense_ids], weights, c=self.rrf_c)
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        company: Optional[str] = None,
+        k: Optional[int] = None,
+        weights: Optional[Sequence[float]] = None,
+    ) -> List[Document]:
+        fused = self.search(query, company=company, k=k, weights=weights)
+        scores = dict(fused)
+        docs = self.store.get_many(list(scores))
+        for doc in docs:
+            doc.metadata["fused_score"] = scores[doc.metadata["chunk_id"]]
+        return docs
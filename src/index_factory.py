@@ -0,0 +1,194 @@
+import json
+from pathlib import Path
+from typing import List, Literal, Optional
+
+import faiss
+import numpy as np
+from pydantic import BaseModel
+from langchain_core.embeddings import Embeddings
+
+from src.config import (
+    FAISS_INDEX_TYPE,
+    FAISS_DIM,
+    FAISS_NLIST,
+    FAISS_PQ_M,
+    FAISS_HNSW_M,
+    FAISS_EF_SEARCH,
+    FAISS_NPROBE,
+    FAISS_TRAIN_SAMPLE,
+)
+
+INDEX_PARAMS_FILE = "index_params.json"
+
+
+class IndexSpec(BaseModel):
+    """
+    Describes how the dense index is built and searched. Saved next to the index so
+    that loading applies the same query-side truncation and search parameters.
+    """
+
+    index_type: Literal["flat", "hnsw", "ivf_flat", "ivf_pq", "sq8"] = "flat"
+    dim: int = 0  # Matryoshka truncation, 0 keeps the model's full dimension
+    nlist: int = 0  # IVF lists, 0 picks ~4*sqrt(n)
+    pq_m: int = 64
+    hnsw_m: int = 32
+    ef_search: int = 64
+    nprobe: int = 16
+    train_sample: int = 100_000
+
+
+def default_spec() -> IndexSpec:
+    """Index spec from the FAISS_* environment settings."""
+    return IndexSpec(
+        index_type=FAISS_INDEX_TYPE,
+        dim=FAISS_DIM,
+        nlist=FAISS_NLIST,
+        pq_m=FAISS_PQ_M,
+        hnsw_m=FAISS_HNSW_M,
+        ef_search=FAISS_EF_SEARCH,
+        nprobe=FAISS_NPROBE,
+        train_sample=FAISS_TRAIN_SAMPLE,
+    )
+
+
+def truncate_vectors(matrix: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Keeps the first `dim` components (Matryoshka truncation) and re-normalizes to unit length.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dim and dim < matrix.shape[1]:
+        matrix = matrix[:, :dim]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1.0, norms)
+    return np.ascontiguousarray(matrix, dtype=np.float32)
+
+
+class TruncatedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so its vectors are truncated to the index dimension.
+    """
+
+    def __init__(self, base: Embeddings, dim: int) -> None:
+        self.base = base
+        self.dim = dim
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return truncate_vectors(np.asarray(self.base.embed_documents(texts)), self.dim).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return truncate_vectors(np.asarray([self.base.embed_query(text)]), self.dim)[0].tolist()
+
+
+def wrap_embeddings(embeddings: Embeddings, spec: IndexSpec) -> Embeddings:
+    """Returns the query encoder matching an index spec."""
+    return TruncatedEmbeddings(embeddings, spec.dim) if spec.dim else embeddings
+
+
+# Fewest training vectors for a PQ codebook (2**4 centroids per sub-quantizer); smaller
+# corpora get a flat index, which is exact and just as fast at that size.
+MIN_PQ_TRAIN = 16
+
+
+def factory_string(spec: IndexSpec, dim: int, n_vectors: int, n_train: Optional[int] = None) -> str:
+    """
+    Translates a spec into a faiss.index_factory description.
+
+    nlist is clamped to the training-set size and the PQ code size to what the training
+    set can fit (2**nbits <= n_train, at most 8 bits), so small corpora still build.
+
+    Args:
+        spec (IndexSpec): Index type and parameters.
+        dim (int): Vector dimension.
+        n_vectors (int): Vectors in the index.
+        n_train (Optional[int]): Vectors the index is trained on (defaults to n_vectors).
+    """
+    n_train = n_vectors if n_train is None else n_train
+    nlist = spec.nlist or max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39 or 1))
+    nlist = max(1, min(nlist, n_train))
+    if spec.index_type == "flat":
+        return "Flat"
+    if spec.index_type == "hnsw":
+        return f"HNSW{spec.hnsw_m},Flat"
+    if spec.index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if spec.index_type == "ivf_pq":
+        if dim % spec.pq_m:
+            raise ValueError(f"pq_m={spec.pq_m} must divide the vector dimension {dim}.")
+        if n_train < MIN_PQ_TRAIN:
+            print(f"Warning: {n_train} training vectors are too few for ivf_pq, building a flat index instead.")
+            return "Flat"
+        nbits = min(8, int(np.log2(n_train)))
+        return f"IVF{nlist},PQ{spec.pq_m}x{nbits}"
+    if spec.index_type == "sq8":
+        return "SQ8"
+    raise ValueError(f"Unknown index type '{spec.index_type}'.")
+
+
+def apply_search_params(index: faiss.Index, spec: IndexSpec) -> None:
+    """
+    Sets nprobe / efSearch on a built or loaded index. IVF indexes also get a direct
+    map, which FAISS.max_marginal_relevance_search needs to reconstruct vectors.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = spec.nprobe
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = spec.ef_search
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """
+    Search parameters restricting a search to `selector`, keeping the index's own nprobe/efSearch.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def build_faiss_index(matrix: np.ndarray, spec: IndexSpec, seed: int = 0) -> faiss.Index:
+    """
+    Builds a FAISS index for (already truncated) vectors according to a spec.
+
+    Trainable indexes (IVF, PQ, SQ) are trained on a random sample of at most
+    `spec.train_sample` vectors before all vectors are added.
+
+    Args:
+        matrix (np.ndarray): Vectors in chunk order, shape (n, dim).
+        spec (IndexSpec): Index type and parameters.
+        seed (int): Seed for the training sample.
+
+    Returns:
+        faiss.Index: The populated index with search parameters applied.
+    """
+    n, dim = matrix.shape
+    description = factory_string(spec, dim, n, n_train=min(n, spec.train_sample))
+    index = faiss.index_factory(dim, description, faiss.METRIC_L2)
+
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = matrix if n <= spec.train_sample else matrix[rng.choice(n, spec.train_sample, replace=False)]
+        print(f"Training {description} on {len(sample)} vectors...")
+        index.train(np.ascontiguousarray(sample))
+
+    index.add(matrix)
+    apply_search_params(index, spec)
+    return index
+
+
+def save_index_spec(spec: IndexSpec, folder: Path) -> None:
+    with open(Path(folder) / INDEX_PARAMS_FILE, "w") as f:
+        json.dump(spec.model_dump(), f, indent=2)
+
+
+def load_index_spec(folder: Path) -> Optional[IndexSpec]:
+    """Returns the spec an index was built with, or None for indexes built before specs existed (flat)."""
+    path = Path(folder) / INDEX_PARAMS_FILE
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return IndexSpec(**json.load(f))
@@ -1,59 +1,197 @@
-import pickle
-import gc
-import torch
+import hashlib
+import json
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import faiss
+import numpy as np
 from tqdm import tqdm
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
 
-from src.config import SPLITS_PATH, INDEX_PATH
+from src.chunk_store import ChunkStore, ChunkStoreDocstore
+from src.config import (
+    CHUNK_STORE_PATH,
+    INDEX_PATH,
+    SHARDS_PATH,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_WORKERS,
+)
+from src.embedding_cache import EmbeddingCache
+from src.embedding_pipeline import embed_chunks
+from src.index_factory import (
+    IndexSpec,
+    default_spec,
+    truncate_vectors,
+    wrap_embeddings,
+    build_faiss_index,
+    save_index_spec,
+)
 from src.models import get_embeddings
-from src.utils import cleanup_memory
+from src.tracing import span
+
+
+def shard_dirname(company_name: str) -> str:
+    """
+    Returns a filesystem-safe, collision-free directory name for a company shard.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "_", company_name.lower()).strip("_")[:40] or "company"
+    digest = hashlib.sha1(company_name.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}_{digest}"
+
+
+def create_empty_index(embeddings: Embeddings, dim: int, store: ChunkStore) -> FAISS:
+    """
+    Creates an empty flat FAISS vector store whose docstore reads texts from the chunk store.
+    """
+    return FAISS(
+        embedding_function=embeddings,
+        index=faiss.IndexFlatL2(dim),
+        docstore=ChunkStoreDocstore(store),
+        index_to_docstore_id={},
+    )
 
 
-def build_vector_index(batch_size: int = 20) -> None:
+def add_vectors(vector_db: FAISS, chunk_ids: Sequence[int], vectors: np.ndarray) -> None:
     """
-    Loads processed splits and builds a FAISS index in batches to avoid OOM.
+    Appends vectors for the given chunk ids to a FAISS vector store.
+    """
+    start = vector_db.index.ntotal
+    vector_db.index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    vector_db.index_to_docstore_id.update({start + j: str(chunk_id) for j, chunk_id in enumerate(chunk_ids)})
+
+
+def build_company_shards(
+    chunk_ids: Sequence[int],
+    matrix: np.ndarray,
+    embeddings: Embeddings,
+    store: ChunkStore,
+    shards_path: Path = SHARDS_PATH,
+) -> Dict[str, str]:
+    """
+    Splits the indexed vectors into one exact (flat) sub-index per company.
+
+    Vectors are taken from the matrix the global index was built from, so nothing is
+    re-embedded and shards stay exact whatever the global index type is. Previous
+    shards are replaced, and a manifest mapping company names to shard directories is
+    written next to the new ones.
 
     Args:
-        batch_size (int): Number of documents to process before clearing CUDA cache.
-    """
-    print(f"Loading splits from {SPLITS_PATH}...")
-    try:
-        with open(SPLITS_PATH, "rb") as f:
-            new_splits = pickle.load(f)
-    except FileNotFoundError:
-        print("Error: Splits file not found. Run ingestion first.")
-        return
+        chunk_ids (Sequence[int]): Chunk id of each matrix row.
+        matrix (np.ndarray): Indexed (possibly truncated) vectors.
+        embeddings (Embeddings): Embedding model stored with each shard for query encoding.
+        store (ChunkStore): Chunk store providing company names and texts.
+        shards_path (Path): Directory that receives the shards and manifest.json.
 
-    print(f"Total documents to index: {len(new_splits)}")
+    Returns:
+        Dict[str, str]: Company name -> shard directory name.
+    """
+    row_of = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
 
-    embeddings = get_embeddings()
+    if shards_path.exists():
+        shutil.rmtree(shards_path)
+    shards_path.mkdir(parents=True, exist_ok=True)
+    manifest: Dict[str, Dict[str, object]] = {}
 
-    print("Initializing FAISS index with first batch...")
-    first_batch = new_splits[:batch_size]
-    vector_db = FAISS.from_documents(first_batch, embeddings)
+    for company, company_ids in tqdm(store.ids_by_company().items(), desc="Writing Company Shards"):
+        company_ids = [c for c in company_ids if c in row_of]
+        if not company_ids:
+            continue
 
-    for i in tqdm(range(batch_size, len(new_splits), batch_size), desc="Indexing Batches"):
-        try:
-            batch = new_splits[i : i + batch_size]
-            vector_db.add_documents(batch)
+        shard = create_empty_index(embeddings, matrix.shape[1], store)
+        add_vectors(shard, company_ids, matrix[[row_of[c] for c in company_ids]])
 
-            cleanup_memory()
+        dirname = shard_dirname(company)
+        shard.save_local(str(shards_path / dirname))
+        manifest[company] = {"path": dirname, "size": len(company_ids)}
 
-            if i % 500 == 0:
-                vector_db.save_local(str(INDEX_PATH))
+    with open(shards_path / "manifest.json", "w") as f:
+        json.dump({"companies": manifest}, f, indent=2)
 
-        except Exception as e:
-            print(f"Error indexing batch {i}: {e}")
+    print(f"Wrote {len(manifest)} company shards to {shards_path}.")
+    return {company: str(entry["path"]) for company, entry in manifest.items()}
 
-            vector_db.save_local(str(INDEX_PATH))
-            del vector_db
-            cleanup_memory()
 
-            vector_db = FAISS.load_local(str(INDEX_PATH), embeddings, allow_dangerous_deserialization=True)
+def build_vector_index(
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    shard_by_company: bool = True,
+    workers: int = EMBEDDING_WORKERS,
+    spec: Optional[IndexSpec] = None,
+) -> None:
+    """
+    Builds the FAISS index for every chunk of the chunk store.
 
-            for item in batch:
-                vector_db.add_documents([item])
+    Vectors are looked up in the embedding cache by chunk content hash; only chunks
+    that are new or changed are embedded (see embedding_pipeline.embed_chunks) and
+    added to the cache. The index itself is then assembled from cached vectors, so
+    chunks of removed reports disappear and unchanged ones cost nothing. The index
+    only stores vectors and chunk ids; texts stay in the chunk store.
 
-    print(f"Saving final index to {INDEX_PATH}...")
+    The index type (flat, HNSW, IVF-Flat, IVF-PQ, SQ8) and an optional Matryoshka
+    truncation of the vectors come from the spec; the spec is saved with the index so
+    loading applies the same query truncation and nprobe/efSearch.
+
+    Args:
+        batch_size (int): Number of texts per embedding forward pass.
+        shard_by_company (bool): Also write one sub-index per company (see build_company_shards).
+        workers (int): Number of embedding worker processes.
+        spec (Optional[IndexSpec]): Index type and parameters (FAISS_* settings if None).
+    """
+    spec = spec or default_spec()
+    print(f"Opening chunk store at {CHUNK_STORE_PATH}...")
+    store = ChunkStore(CHUNK_STORE_PATH)
+    chunk_hashes = store.content_hashes()
+    if not chunk_hashes:
+        print("Error: Chunk store is empty. Run ingestion first.")
+        return
+
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL)
+    vectors_by_hash = cache.get_many([h for _, h in chunk_hashes])
+
+    missing: Dict[str, int] = {}
+    for chunk_id, content_hash in chunk_hashes:
+        if content_hash not in vectors_by_hash:
+            missing.setdefault(content_hash, chunk_id)
+    to_embed = list(missing.values())
+
+    print(f"Total documents to index: {len(chunk_hashes)} ({len(to_embed)} to embed, rest cached)")
+
+    embeddings = get_embeddings()
+
+    if to_embed:
+        with span("embed", chunks=len(to_embed)):
+            embed_chunks(store, to_embed, cache, batch_size=batch_size, workers=workers, embeddings=embeddings)
+        vectors_by_hash.update(cache.get_many(list(missing.keys())))
+
+    indexed = [(chunk_id, h) for chunk_id, h in chunk_hashes if h in vectors_by_hash]
+    if not indexed:
+        print("Error: no chunk could be embedded.")
+        return
+
+    chunk_ids = [chunk_id for chunk_id, _ in indexed]
+    matrix = truncate_vectors(np.vstack([vectors_by_hash[h] for _, h in indexed]), spec.dim)
+    query_embeddings = wrap_embeddings(embeddings, spec)
+
+    print(f"Building {spec.index_type} index over {len(chunk_ids)} vectors of dimension {matrix.shape[1]}...")
+    with span("build_index", index_type=spec.index_type, vectors=len(chunk_ids)):
+        index = build_faiss_index(matrix, spec)
+    vector_db = FAISS(
+        embedding_function=query_embeddings,
+        index=index,
+        docstore=ChunkStoreDocstore(store),
+        index_to_docstore_id={position: str(chunk_id) for position, chunk_id in enumerate(chunk_ids)},
+    )
+
+    print(f"Saving final index ({vector_db.index.ntotal} vectors) to {INDEX_PATH}...")
     vector_db.save_local(str(INDEX_PATH))
+    save_index_spec(spec, INDEX_PATH)
+
+    if shard_by_company:
+        with span("shards"):
+            build_company_shards(chunk_ids, matrix, query_embeddings, store)
+
     print("Indexing complete.")
@@ -1,31 +1,183 @@
 import json
 import requests
 import sys
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional
 from tqdm import tqdm
-
-from src.config import QUESTIONS_PATH, OUTPUT_FILE, TEAM_EMAIL, SUBMISSION_NAME, SUBMISSION_URL
-from src.retrieval import load_resources, create_retriever_pipeline
+from langchain_core.runnables import Runnable
+
+from src.config import (
+    QUESTIONS_PATH,
+    OUTPUT_FILE,
+    TEAM_EMAIL,
+    SUBMISSION_NAME,
+    SUBMISSION_URL,
+    INFERENCE_WORKERS,
+    OLLAMA_PRELOAD,
+    COMPANY_RESOLVER,
+    CHECKPOINT_PATH,
+)
+from src.retrieval import load_pipeline
 from src.generation import build_retrieve_fn, create_rag_chain
+from src.planning import plan_questions
+from src.checkpoint import AnswerCheckpoint, answer_status, ERROR, NA
+from src.companies import CompanyResolver
+from src.llm_cache import print_cache_stats
+from src.models import preload_llm
+from src.embedding_cache import CachedQueryEmbeddings
+from src.tracing import span, print_trace_summary
+from src.utils import question_hash
+
+
+def answer_question(
+    rag_chain: Runnable, index: int, item: Dict[str, Any], checkpoint: Optional[AnswerCheckpoint] = None
+) -> Dict[str, Any]:
+    """
+    Runs a single question through the RAG chain.
 
+    Errors are caught and turned into an "N/A" answer so that one failing
+    question never aborts the rest of the run.
 
-def run_pipeline() -> None:
+    Args:
+        rag_chain (Runnable): The chain built by create_rag_chain.
+        index (int): Position of the question in the input file (for logging).
+        item (Dict[str, Any]): Raw question entry with 'text' and 'kind'.
+        checkpoint (Optional[AnswerCheckpoint]): If given, the answer is appended to it
+            (with status "error" when the chain raised).
+
+    Returns:
+        Dict[str, Any]: The answer entry for the submission file.
     """
-    Executes the inference pipeline.
+    q_text = item.get("text", "")
+    q_kind = item.get("kind", "")
+
+    input_data = {"question": q_text, "kind": q_kind}
+    error: Optional[Exception] = None
+
+    try:
+        with span("question", trace=question_hash(q_text)[:12], index=index, kind=q_kind):
+            result = rag_chain.invoke(input_data)
+        ans_dict = result.model_dump()
+        ans_dict["question_text"] = q_text
+        ans_dict["kind"] = q_kind
+    except Exception as e:
+        print(f"Error processing question {index}: {e}")
+        error = e
+        ans_dict = {"question_text": q_text, "kind": q_kind, "value": "N/A", "references": []}
+
+    if checkpoint is not None:
+        checkpoint.record(q_text, ans_dict, answer_status(ans_dict, error), error=repr(error) if error else None)
+    return ans_dict
+
+
+def answer_questions(
+    rag_chain: Runnable,
+    questions: List[Dict[str, Any]],
+    workers: int,
+    checkpoint: Optional[AnswerCheckpoint] = None,
+    indices: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Answers all questions, optionally overlapping several of them on a bounded thread pool.
+
+    While one question waits on Ollama, others can run retrieval and reranking, so the
+    LLM backend and the CPU are kept busy at the same time. Answers are returned in
+    input order regardless of completion order.
+
+    Args:
+        rag_chain (Runnable): The chain built by create_rag_chain.
+        questions (List[Dict[str, Any]]): Raw question entries.
+        workers (int): Number of questions processed concurrently (1 = sequential).
+        checkpoint (Optional[AnswerCheckpoint]): Records each answer as soon as it is done.
+        indices (Optional[List[int]]): Positions of `questions` in the input file, for
+            logging (defaults to 0..n-1).
+
+    Returns:
+        List[Dict[str, Any]]: Answer entries, aligned with `questions`.
+    """
+    indices = indices if indices is not None else list(range(len(questions)))
+    if workers <= 1:
+        return [
+            answer_question(rag_chain, i, item, checkpoint)
+            for i, item in zip(indices, tqdm(questions, desc="Processing Questions"))
+        ]
+
+    answers: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(answer_question, rag_chain, i, item, checkpoint): pos
+            for pos, (i, item) in enumerate(zip(indices, questions))
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc=f"Processing Questions (x{workers})"):
+            answers[futures[future]] = future.result()
+
+    return [a for a in answers if a is not None]
+
+
+def answer_pending(
+    questions: List[Dict[str, Any]], pending: List[int], checkpoint: AnswerCheckpoint, workers: int
+) -> None:
+    """
+    Loads the pipeline and answers the questions at positions `pending` into the checkpoint.
+
+    Args:
+        questions (List[Dict[str, Any]]): All raw question entries.
+        pending (List[int]): Positions of the questions to answer.
+        checkpoint (AnswerCheckpoint): Receives each answer as it finishes.
+        workers (int): Number of questions processed concurrently.
     """
+    if OLLAMA_PRELOAD:
+        preload_llm()
 
     try:
-        vector_db, documents, known_companies = load_resources()
+        retriever, compressor, known_companies = load_pipeline()
     except Exception as e:
         print(f"Critical Error loading resources: {e}")
         print("Did you run --ingest and --index?")
         sys.exit(1)
+    vector_db = retriever.vector_db
+
+    todo = [questions[i] for i in pending]
+    resolver = CompanyResolver(known_companies) if COMPANY_RESOLVER else None
+    plans = plan_questions(todo, max_concurrency=workers, resolver=resolver)
 
-    bm25, v_db, compressor = create_retriever_pipeline(vector_db, documents)
+    if isinstance(vector_db.embeddings, CachedQueryEmbeddings):
+        vector_db.embeddings.prefetch([plan.refined_query for plan in plans.values()])
 
-    retrieve_fn = build_retrieve_fn(v_db, bm25, compressor, known_companies)
+    retrieve_fn = build_retrieve_fn(retriever, compressor, known_companies, plans, resolver)
     rag_chain = create_rag_chain(retrieve_fn)
 
+    answer_questions(rag_chain, todo, workers, checkpoint=checkpoint, indices=pending)
+    print_cache_stats()
+    print(f"Reranker stats: {compressor.stats()}")
+    if resolver is not None:
+        print(
+            f"Company resolver: {resolver.resolved} resolved, {resolver.unresolved} sent to the LLM "
+            f"(hit rate {resolver.hit_rate():.0%})"
+        )
+    if isinstance(vector_db.embeddings, CachedQueryEmbeddings):
+        print(f"Query vector cache: {vector_db.embeddings.hits} hits, {vector_db.embeddings.misses} misses")
+    print_trace_summary()
+
+
+def run_pipeline(workers: int = INFERENCE_WORKERS, resume: bool = False, retry_na: bool = False) -> None:
+    """
+    Executes the inference pipeline.
+
+    The Ollama model is preloaded in the background (OLLAMA_PRELOAD) while the retrieval
+    resources load concurrently (see retrieval.load_pipeline). Each answer is appended to
+    the checkpoint (CHECKPOINT_PATH) as soon as it is done, and the submission file is
+    assembled from the checkpoint.
+
+    Args:
+        workers (int): Number of questions processed concurrently.
+        resume (bool): Keep the existing checkpoint and only answer questions that have
+            no answer yet or whose last attempt raised an error. Without it, an existing
+            checkpoint is moved aside (not deleted) and every question is answered.
+        retry_na (bool): Like resume, but also answer again the questions recorded as "N/A".
+    """
+
     print(f"Loading questions from {QUESTIONS_PATH}")
     if not QUESTIONS_PATH.exists():
         print(f"Error: {QUESTIONS_PATH} not found.")
@@ -34,23 +186,20 @@ def run_pipeline() -> None:
     with open(QUESTIONS_PATH, "r") as f:
         questions: List[Dict[str, Any]] = json.load(f)
 
-    answers_list: List[Dict[str, Any]] = []
-
-    for i, item in enumerate(tqdm(questions, desc="Processing Questions")):
-        q_text = item.get("text", "")
-        q_kind = item.get("kind", "")
+    checkpoint = AnswerCheckpoint(CHECKPOINT_PATH)
+    if resume or retry_na:
+        print(f"Checkpoint {CHECKPOINT_PATH}: {checkpoint.counts()}")
+    elif len(checkpoint):
+        archived = checkpoint.archive()
+        print(f"Starting a new run; previous answers moved to {archived} (use --resume to continue them).")
+    pending = checkpoint.pending(questions, retry=(ERROR, NA) if retry_na else (ERROR,))
+    print(f"{len(pending)} of {len(questions)} questions to answer.")
 
-        input_data = {"question": q_text, "kind": q_kind}
+    if pending:
+        answer_pending(questions, pending, checkpoint, workers)
 
-        try:
-            result = rag_chain.invoke(input_data)
-            ans_dict = result.model_dump()
-            ans_dict["question_text"] = q_text
-            ans_dict["kind"] = q_kind
-            answers_list.append(ans_dict)
-        except Exception as e:
-            print(f"Error processing question {i}: {e}")
-            answers_list.append({"question_text": q_text, "kind": q_kind, "value": "N/A", "references": []})
+    answers_list = checkpoint.answers(questions)
+    print(f"Checkpoint: {checkpoint.counts()}")
 
     submission = {"team_email": TEAM_EMAIL, "submission_name": SUBMISSION_NAME, "answers": answers_list}
 
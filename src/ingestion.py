@@ -1,21 +1,40 @@
+import hashlib
+import multiprocessing
 import os
-import pickle
-from typing import List, Optional
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 from tqdm import tqdm
 
-from langchain_core.documents import Document
-from langchain_docling import DoclingLoader
-from langchain_docling.loader import ExportType
-from docling.datamodel.pipeline_options import PdfPipelineOptions, AcceleratorOptions
-from docling.datamodel.base_models import InputFormat
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.chunking import HybridChunker
-
 from pydantic import BaseModel, Field
 
-from src.config import PDF_DIR, SPLITS_PATH, OLLAMA_MODEL
+from langchain_core.runnables import Runnable
+
+from src.chunk_store import ChunkStore
+from src.companies import CompanyMap, guess_company_from_cover
+from src.config import (
+    PDF_DIR,
+    CHUNK_STORE_PATH,
+    COMPANY_MAP_PATH,
+    OLLAMA_MODEL,
+    INGEST_WORKERS,
+    METADATA_WORKERS,
+    DEDUP_ENABLED,
+    DEDUP_THRESHOLD,
+    DEDUP_NUM_PERM,
+    DEDUP_BANDS,
+    DEDUP_SHINGLE_SIZE,
+)
+from src.dedup import ChunkDeduplicator, dedup_scope
 from src.models import get_llm
 from src.utils import cleanup_memory
+from src.llm_cache import print_cache_stats
+
+if TYPE_CHECKING:
+    # Docling pulls in torch and its layout models; it is only imported where PDFs are converted.
+    from docling.chunking import HybridChunker
+    from docling.document_converter import DocumentConverter
 
 
 class FileMetaData(BaseModel):
@@ -24,11 +43,17 @@ class FileMetaData(BaseModel):
     )
 
 
-def extract_metadata_from_doc(doc_content: str, llm_model) -> FileMetaData:
+@lru_cache(maxsize=1)
+def get_metadata_extractor() -> Runnable:
+    """Returns the structured-output runnable used for company extraction (built once)."""
+    return get_llm(model_name=OLLAMA_MODEL).with_structured_output(FileMetaData)
+
+
+def extract_metadata_from_doc(doc_content: str) -> FileMetaData:
     """
     Uses LLM to extract company name from the document snippet.
     """
-    metadata_extractor = llm_model.with_structured_output(FileMetaData)
+    metadata_extractor = get_metadata_extractor()
     snippet = doc_content[:2000]
     prompt = (
         f"Analyze the following text from an annual report cover page and extract the Company Name.\n\nTEXT:\n{snippet}"
@@ -41,88 +66,320 @@ def extract_metadata_from_doc(doc_content: str, llm_model) -> FileMetaData:
         return FileMetaData(company_name="Unknown")
 
 
-def run_ingestion() -> None:
+def file_sha1(path: str) -> str:
+    """Computes the SHA1 of a file's bytes."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_worker_loader_parts: Optional[Tuple["DocumentConverter", "HybridChunker"]] = None
+
+
+def build_converter(num_threads: int = 4) -> "DocumentConverter":
     """
-    Main function to process PDFs:
-    1. Configures Docling with OCR and Table Structure.
-    2. Loads and chunks PDFs.
-    3. Extracts Company Names via LLM.
-    4. Saves the splits to pickle.
+    Configures Docling with OCR and Table Structure.
     """
-    print("Starting Ingestion Process...")
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import AcceleratorOptions, PdfPipelineOptions
+    from docling.document_converter import DocumentConverter, PdfFormatOption
 
-    accelerator_options = AcceleratorOptions(num_threads=4)
+    accelerator_options = AcceleratorOptions(num_threads=num_threads)
     pipeline_options = PdfPipelineOptions()
     pipeline_options.accelerator_options = accelerator_options
     pipeline_options.do_ocr = True
     pipeline_options.do_table_structure = True
     pipeline_options.table_structure_options.do_cell_matching = True
 
-    chunker = HybridChunker(
+    return DocumentConverter(
+        format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)},
+    )
+
+
+def build_chunker() -> "HybridChunker":
+    from docling.chunking import HybridChunker
+
+    return HybridChunker(
         tokenizer="sentence-transformers/all-MiniLM-L6-v2",
         max_tokens=1000,
     )
 
-    converter = DocumentConverter(
-        format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)},
-    )
 
-    if not os.path.exists(PDF_DIR):
-        print(f"Error: PDF directory {PDF_DIR} does not exist.")
-        return
+def chunk_page_index(metadata: Dict[str, Any]) -> int:
+    """
+    Reads the zero-based page index of a chunk from Docling's provenance metadata.
+    """
+    try:
+        return metadata["dl_meta"]["doc_items"][0]["prov"][0]["page_no"] - 1
+    except (KeyError, IndexError, TypeError):
+        return 0
 
-    file_paths = sorted([os.path.join(PDF_DIR, f) for f in os.listdir(PDF_DIR) if f.lower().endswith(".pdf")])
 
-    print(f"Found {len(file_paths)} PDFs to process.")
+def convert_pdf(path: str, converter: "DocumentConverter", chunker: "HybridChunker") -> List[Tuple[str, int]]:
+    """
+    Converts and chunks a single PDF.
 
-    loader = DoclingLoader(
-        file_paths,
-        converter=converter,
-        chunker=chunker,
-    )
+    Returns:
+        List[Tuple[str, int]]: (chunk text, page index) pairs in document order.
+    """
+    from langchain_docling import DoclingLoader
+
+    loader = DoclingLoader([path], converter=converter, chunker=chunker)
+    return [(doc.page_content, chunk_page_index(doc.metadata)) for doc in loader.lazy_load()]
 
-    print("Lazy loading documents...")
-    docs = list(loader.lazy_load())
 
-    print(f"Generated {len(docs)} chunks. extracting metadata...")
+def _init_worker(num_threads: int) -> None:
+    """Builds one converter and chunker per worker process."""
+    global _worker_loader_parts
+    _worker_loader_parts = (build_converter(num_threads), build_chunker())
 
-    llm = get_llm(model_name=OLLAMA_MODEL)
 
-    source_to_company: dict[str, str] = {}
+def _convert_in_worker(path: str) -> List[Tuple[str, int]]:
+    converter, chunker = _worker_loader_parts
+    return convert_pdf(path, converter, chunker)
 
-    processed_docs: List[Document] = []
 
-    for doc in tqdm(docs, desc="Enriching Metadata"):
-        try:
-            dl_meta = doc.metadata.get("dl_meta", {})
-            origin = dl_meta.get("origin", {})
-            filename = origin.get("filename", "unknown")
+def iter_converted_pdfs(paths: List[str], workers: int) -> Iterator[Tuple[str, Optional[List[Tuple[str, int]]]]]:
+    """
+    Converts PDFs, yielding each one as soon as it is done.
 
+    With workers > 1 the PDFs are spread over a process pool, each process running its
+    own Docling pipeline with a share of the CPU threads. Failed PDFs yield None.
+
+    Yields:
+        Tuple[str, Optional[List[Tuple[str, int]]]]: PDF path and its chunks.
+    """
+    if workers <= 1:
+        converter, chunker = build_converter(), build_chunker()
+        for path in paths:
             try:
-                page_no = dl_meta["doc_items"][0]["prov"][0]["page_no"]
-                page_index = page_no - 1
-            except:
-                page_index = 0
+                yield path, convert_pdf(path, converter, chunker)
+            except Exception as e:
+                print(f"Conversion failed for {path}: {e}")
+                yield path, None
+        return
+
+    threads_per_worker = max(1, (os.cpu_count() or workers) // workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads_per_worker,),
+    ) as pool:
+        futures = {pool.submit(_convert_in_worker, path): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                yield path, future.result()
+            except Exception as e:
+                print(f"Conversion failed for {path}: {e}")
+                yield path, None
+
+
+def cover_page_text(chunks: List[Tuple[str, int]]) -> str:
+    """
+    Returns the text of the report's cover page (its first page with any text).
+    """
+    first_page = min(page_index for _, page_index in chunks)
+    return "\n".join(text for text, page_index in chunks if page_index == first_page)
+
 
-            doc.metadata["filename"] = filename
-            doc.metadata["source"] = filename
-            doc.metadata["page_index"] = page_index
+_stats_lock = threading.Lock()
 
-            if filename not in source_to_company:
-                meta = extract_metadata_from_doc(doc.page_content, llm)
-                source_to_company[filename] = meta.company_name
 
-            doc.metadata["company_name"] = source_to_company[filename]
+def _count(stats: Dict[str, int], source: str) -> None:
+    with _stats_lock:
+        stats[source] += 1
 
-            processed_docs.append(doc)
 
-        except Exception as e:
-            print(f"Error processing doc chunk: {e}")
+def resolve_company(cover_text: str, pdf_sha1: str, company_map: CompanyMap, stats: Dict[str, int]) -> str:
+    """
+    Determines the company of a report, cheapest source first: the persistent
+    SHA1 -> company map, then the cover-page heuristic, then the LLM.
+
+    Args:
+        cover_text (str): Cover page text of the report.
+        pdf_sha1 (str): SHA1 of the PDF file.
+        company_map (CompanyMap): Persistent map of already resolved reports.
+        stats (Dict[str, int]): Counters per source, updated in place (thread-safe, resolve_company
+            runs on METADATA_WORKERS threads).
+
+    Returns:
+        str: The company name ('Unknown' if extraction failed).
+    """
+    company_name = company_map.get(pdf_sha1)
+    if company_name is not None:
+        _count(stats, "cached")
+        return company_name
+
+    company_name = guess_company_from_cover(cover_text)
+    if company_name is not None:
+        _count(stats, "heuristic")
+    else:
+        _count(stats, "llm")
+        company_name = extract_metadata_from_doc(cover_text).company_name
+
+    if company_name != "Unknown":
+        company_map.set(pdf_sha1, company_name)
+    return company_name
+
+
+def build_deduplicator(store: ChunkStore) -> Optional[ChunkDeduplicator]:
+    """
+    Near-duplicate detector for new chunks, seeded lazily with the chunks already in the
+    store (None when DEDUP_ENABLED is off).
+    """
+    if not DEDUP_ENABLED:
+        return None
+    return ChunkDeduplicator(
+        threshold=DEDUP_THRESHOLD,
+        num_perm=DEDUP_NUM_PERM,
+        bands=DEDUP_BANDS,
+        shingle_size=DEDUP_SHINGLE_SIZE,
+        seed=store.iter_company_texts,
+    )
+
+
+def store_chunks(
+    store: ChunkStore,
+    chunks: List[Tuple[str, int]],
+    source: str,
+    company_name: str,
+    dedup: Optional[ChunkDeduplicator] = None,
+) -> int:
+    """
+    Appends a report's chunks to the store.
+
+    With a deduplicator, a chunk that is a near-duplicate (with the same numbers) of one
+    already stored for the same company is not stored again; its location is added to
+    the canonical chunk.
+
+    Returns:
+        int: Number of chunks actually stored.
+    """
+    stored = 0
+    for text, page_index in chunks:
+        if dedup is None:
+            store.add(text, source, page_index, company_name)
+            stored += 1
             continue
+        scope = dedup_scope(company_name, source)
+        canonical, fingerprint = dedup.check(scope, text)
+        if canonical is not None:
+            store.add_duplicate(canonical, source, page_index)
+        else:
+            dedup.add(scope, store.add(text, source, page_index, company_name), fingerprint)
+            stored += 1
+    return stored
+
+
+def run_ingestion(rebuild: bool = False, workers: int = INGEST_WORKERS) -> None:
+    """
+    Main function to process PDFs:
+    1. Converts and chunks new or changed PDFs with Docling (OCR + Table Structure),
+       spread over a process pool.
+    2. Resolves Company Names from the cover page concurrently across files (cached map,
+       cover-page heuristic, LLM as the last resort).
+    3. Drops chunks that near-duplicate one already stored for the same company and
+       contain the same numbers (boilerplate, repeated tables), keeping their page as an
+       extra location of the stored chunk (DEDUP_ENABLED, see src/dedup.py).
+    4. Appends each PDF's chunks with slim metadata to the chunk store as soon as it is done.
+
+    Ingestion is incremental and resumable: every finished PDF is committed together with
+    its SHA1, so PDFs already recorded in the chunk store are skipped (including after a
+    crash), changed PDFs are re-converted, and chunks of PDFs removed from PDF_DIR are deleted.
+
+    Args:
+        rebuild (bool): Discard the existing chunk store and ingest every PDF again.
+        workers (int): Number of PDF conversion processes.
+    """
+    print("Starting Ingestion Process...")
+
+    if not os.path.exists(PDF_DIR):
+        print(f"Error: PDF directory {PDF_DIR} does not exist.")
+        return
+
+    file_paths = sorted([os.path.join(PDF_DIR, f) for f in os.listdir(PDF_DIR) if f.lower().endswith(".pdf")])
+
+    store = ChunkStore.create(CHUNK_STORE_PATH) if rebuild else ChunkStore(CHUNK_STORE_PATH)
+    known_files = store.file_hashes()
+    current_files: Dict[str, str] = {os.path.basename(p): file_sha1(p) for p in file_paths}
+
+    for source in set(known_files) - set(current_files):
+        print(f"Removing chunks of deleted report {source}")
+        store.delete_source(source)
+
+    to_process = [p for p in file_paths if known_files.get(os.path.basename(p)) != current_files[os.path.basename(p)]]
+    for path in to_process:
+        store.delete_source(os.path.basename(path))
+    store.commit()
+
+    print(f"Found {len(file_paths)} PDFs, {len(to_process)} new or changed to process with {workers} worker(s).")
+    if not to_process:
+        store.close()
+        print("Ingestion complete.")
+        return
+
+    company_map = CompanyMap(COMPANY_MAP_PATH)
+    company_stats = {"cached": 0, "heuristic": 0, "llm": 0}
+    pending: Dict[Future, Tuple[str, List[Tuple[str, int]]]] = {}
+    dedup = build_deduplicator(store)
+    n_chunks = 0
+
+    def write_finished(block: bool = False) -> None:
+        nonlocal n_chunks
+        for future in [f for f in pending if block or f.done()]:
+            path, chunks = pending.pop(future)
+            filename = os.path.basename(path)
+            try:
+                company_name = future.result()
+            except Exception as e:
+                print(f"Company extraction failed for {filename}: {e}")
+                company_name = "Unknown"
+
+            n_chunks += store_chunks(store, chunks, filename, company_name, dedup)
+            store.mark_file(filename, current_files[filename], len(chunks))
+            store.commit()
+
+    with ThreadPoolExecutor(max_workers=METADATA_WORKERS) as extractor_pool:
+        for path, chunks in tqdm(
+            iter_converted_pdfs(to_process, workers), total=len(to_process), desc="Ingesting PDFs"
+        ):
+            if chunks:
+                sha1 = current_files[os.path.basename(path)]
+                future = extractor_pool.submit(
+                    resolve_company, cover_page_text(chunks), sha1, company_map, company_stats
+                )
+                pending[future] = (path, chunks)
+            elif chunks is not None:
+                # Converted but empty (e.g. scanned without text): record it so it is not converted again.
+                filename = os.path.basename(path)
+                print(f"No chunks extracted from {filename}.")
+                store.mark_file(filename, current_files[filename], 0)
+                store.commit()
+            write_finished()
+        write_finished(block=True)
+
+    print(
+        f"Company names: {company_stats['cached']} cached, {company_stats['heuristic']} from cover heuristic, "
+        f"{company_stats['llm']} via LLM."
+    )
+    print_cache_stats()
 
-    print(f"Saving {len(processed_docs)} splits to {SPLITS_PATH}...")
-    with open(SPLITS_PATH, "wb") as f:
-        pickle.dump(processed_docs, f)
+    print(f"Saved {n_chunks} chunks to {CHUNK_STORE_PATH}.")
+    if dedup is not None:
+        stats = dedup.stats()
+        print(
+            f"Near-duplicates: {stats['duplicates']} of {stats['chunks']} chunks collapsed into existing ones "
+            f"({stats['chunk_reduction']:.1%} fewer vectors and BM25 documents, {stats['text_reduction']:.1%} less "
+            f"text to embed); {store.duplicate_count()} duplicate locations in the store."
+        )
+    if store.garbage_ratio() > 0.3:
+        print("Compacting chunk store...")
+        store.compact()
+    store.close()
 
     cleanup_memory()
     print("Ingestion complete.")
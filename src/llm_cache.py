@@ -0,0 +1,139 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Persistent LangChain cache for deterministic (temperature 0) LLM calls.
+
+    Entries are keyed by a namespace (model name + generation params), the serialized
+    prompt and LangChain's llm_string, which for structured output carries the JSON schema.
+    The oldest entries are evicted once the stored payload exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: Path, namespace: Dict[str, Any], max_bytes: int) -> None:
+        """
+        Args:
+            path (Path): SQLite database file. Shared by all models.
+            namespace (Dict[str, Any]): Model name and generation params mixed into every key.
+            max_bytes (int): Upper bound for the total size of stored generations.
+        """
+        self.path = Path(path)
+        self.namespace = json.dumps(namespace, sort_keys=True, default=str)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_access ON llm_cache(last_access)")
+        self._conn.commit()
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        return hashlib.sha256("\x1f".join([self.namespace, llm_string, prompt]).encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            try:
+                generations = [loads(gen) for gen in json.loads(row[0])] if row else None
+            except Exception as e:
+                print(f"Warning: ignoring unreadable LLM cache entry: {e}")
+                generations = None
+
+            if generations is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        value = json.dumps([dumps(gen) for gen in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Removes least recently used entries until the cache fits into max_bytes."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access ASC"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit/miss counters of this cache instance."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_caches: Dict[Tuple[str, str], SQLiteLLMCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache(path: Path, namespace: Dict[str, Any], max_bytes: int) -> SQLiteLLMCache:
+    """
+    Returns the process-wide cache for a (path, namespace) pair, opening it on first use,
+    so models built per chain share one SQLite connection instead of opening their own.
+    """
+    key = (str(Path(path).resolve()), json.dumps(namespace, sort_keys=True, default=str))
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = SQLiteLLMCache(path, namespace, max_bytes)
+        return _caches[key]
+
+
+def cache_stats() -> Dict[str, int]:
+    """
+    Aggregates hit/miss counters over every LLM cache opened in this process.
+
+    Returns:
+        Dict[str, int]: Total hits and misses.
+    """
+    with _caches_lock:
+        caches = list(_caches.values())
+    hits = sum(c.hits for c in caches)
+    misses = sum(c.misses for c in caches)
+    return {"hits": hits, "misses": misses}
+
+
+def print_cache_stats() -> None:
+    """Prints a one-line summary of LLM cache usage."""
+    stats = cache_stats()
+    total = stats["hits"] + stats["misses"]
+    if total:
+        print(f"LLM cache: {stats['hits']}/{total} hits ({stats['hits'] / total:.0%}), {stats['misses']} misses.")
@@ -0,0 +1,267 @@
+"""
+Spreads LLM calls over several Ollama servers (OLLAMA_HOSTS), e.g. one per GPU.
+
+OllamaDispatcher is a ChatOllama, so structured output, the LLM cache and the
+tracing callback work unchanged; only the HTTP call is routed. Each backend has its
+own client with a pooled keep-alive connection set, and calls go to the backend
+with the fewest outstanding requests, up to a per-backend concurrency limit. A
+backend whose call fails with a connection error, a timeout or a 5xx response is put
+in cooldown and the call is retried on another one; other errors (a bad request) are
+raised as they are. The routing state and the clients are shared by every dispatcher
+over the same hosts (see get_backend_group), so all chains of a process are balanced
+together.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import Field, PrivateAttr
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_ollama import ChatOllama
+
+
+class NoBackendAvailable(Exception):
+    """Raised when no backend frees a slot within the acquire timeout."""
+
+
+class BackendPool:
+    """
+    Least-outstanding-requests routing with per-backend limits and failure cooldown.
+
+    Backends are identified by index. acquire() blocks until a backend has a free slot;
+    among those it picks the one with the fewest requests in flight (ties go to the
+    one that served fewer requests so far). Backends in cooldown are only used when
+    every candidate is in cooldown; a busy healthy backend is waited for instead.
+    """
+
+    def __init__(self, size: int, max_concurrency: int, cooldown_s: float) -> None:
+        self.max_concurrency = max_concurrency
+        self.cooldown_s = cooldown_s
+        self._cond = threading.Condition()
+        self.outstanding = [0] * size
+        self.requests = [0] * size
+        self.failures = [0] * size
+        self._down_until = [0.0] * size
+
+    def acquire(self, exclude: Set[int], timeout: float) -> int:
+        """
+        Reserves a slot on a backend not in `exclude` (all backends if every one is excluded).
+
+        Raises:
+            NoBackendAvailable: If no slot frees up within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            candidates = [i for i in range(len(self.outstanding)) if i not in exclude] or list(
+                range(len(self.outstanding))
+            )
+            while True:
+                now = time.monotonic()
+                healthy = [i for i in candidates if self._down_until[i] <= now]
+                pick = [i for i in (healthy or candidates) if self.outstanding[i] < self.max_concurrency]
+                if pick:
+                    chosen = min(pick, key=lambda i: (self.outstanding[i], self.requests[i]))
+                    self.outstanding[chosen] += 1
+                    self.requests[chosen] += 1
+                    return chosen
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise NoBackendAvailable(f"no free backend slot within {timeout:.0f}s")
+                self._cond.wait(remaining)
+
+    def release(self, index: int, failed: bool = False) -> None:
+        with self._cond:
+            self.outstanding[index] -= 1
+            if failed:
+                self.failures[index] += 1
+                self._down_until[index] = time.monotonic() + self.cooldown_s
+            else:
+                self._down_until[index] = 0.0
+            self._cond.notify()
+
+
+class BackendGroup:
+    """
+    Routing state and HTTP clients for a list of Ollama hosts.
+
+    Each host gets one sync and one async client with a pooled keep-alive connection set
+    of `max_concurrency` connections.
+    """
+
+    def __init__(self, hosts: List[str], max_concurrency: int, request_timeout: float, cooldown_s: float) -> None:
+        import httpx
+        from ollama import AsyncClient, Client
+
+        self.hosts = list(hosts)
+        self.pool = BackendPool(len(self.hosts), max_concurrency, cooldown_s)
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        self.clients = [Client(host=host, timeout=request_timeout, limits=limits) for host in self.hosts]
+        self.async_clients = [AsyncClient(host=host, timeout=request_timeout, limits=limits) for host in self.hosts]
+
+
+_groups: Dict[Tuple[Any, ...], BackendGroup] = {}
+_groups_lock = threading.Lock()
+
+
+def get_backend_group(
+    hosts: List[str], max_concurrency: int, request_timeout: float, cooldown_s: float
+) -> BackendGroup:
+    """
+    Returns the process-wide BackendGroup for a host list and its limits, creating it on
+    first use, so every dispatcher over the same servers shares routing and connections.
+    """
+    key = (tuple(hosts), max_concurrency, request_timeout, cooldown_s)
+    with _groups_lock:
+        if key not in _groups:
+            _groups[key] = BackendGroup(hosts, max_concurrency, request_timeout, cooldown_s)
+        return _groups[key]
+
+
+def is_backend_failure(error: Exception) -> bool:
+    """Whether an error is the backend's fault (connection, timeout, 5xx) rather than the request's."""
+    import httpx
+    from ollama import ResponseError
+
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (ConnectionError, httpx.TransportError))
+
+
+class OllamaDispatcher(ChatOllama):
+    """
+    ChatOllama that sends each call to one of `hosts`.
+
+    Args (in addition to ChatOllama's):
+        hosts (List[str]): Base URLs of the Ollama servers.
+        max_concurrency (int): Requests in flight per backend.
+        request_timeout (float): HTTP timeout of one call, and the longest wait for a free slot.
+        retries (int): Extra attempts on other backends after a failed call.
+        cooldown_s (float): How long a failed backend is avoided.
+    """
+
+    hosts: List[str] = Field(default_factory=list)
+    max_concurrency: int = 4
+    request_timeout: float = 300.0
+    retries: int = 2
+    cooldown_s: float = 30.0
+
+    _backends: List[ChatOllama] = PrivateAttr(default_factory=list)
+    _pool: BackendPool = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        if not self.hosts:
+            raise ValueError("OllamaDispatcher needs at least one host.")
+        group = get_backend_group(self.hosts, self.max_concurrency, self.request_timeout, self.cooldown_s)
+        # Backends share the generation settings; cache and callbacks stay on the dispatcher.
+        routing = {"base_url", "client_kwargs", "sync_client_kwargs", "async_client_kwargs", "cache", "callbacks"}
+        settings = {k: v for k, v in self.model_dump().items() if k in ChatOllama.model_fields and k not in routing}
+        self._backends = []
+        for i, host in enumerate(self.hosts):
+            backend = ChatOllama(**{**settings, "base_url": host})
+            backend._client, backend._async_client = group.clients[i], group.async_clients[i]
+            self._backends.append(backend)
+        self._pool = group.pool
+
+    def _failed(self, index: int, error: Exception, tried: Set[int]) -> None:
+        """Releases a failed call's slot; re-raises unless the backend is to blame."""
+        if not is_backend_failure(error):
+            self._pool.release(index)
+            raise error
+        self._pool.release(index, failed=True)
+        print(f"Ollama backend {self.hosts[index]} failed ({type(error).__name__}: {error}), trying another.")
+        tried.add(index)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tried: Set[int] = set()
+        last_error: Optional[Exception] = None
+        for _ in range(self.retries + 1):
+            index = self._pool.acquire(tried, timeout=self.request_timeout)
+            try:
+                result = self._backends[index]._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                self._failed(index, e, tried)
+                last_error = e
+                continue
+            self._pool.release(index)
+            return result
+        raise last_error
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tried: Set[int] = set()
+        last_error: Optional[Exception] = None
+        for _ in range(self.retries + 1):
+            index = await asyncio.to_thread(self._pool.acquire, tried, self.request_timeout)
+            try:
+                result = await self._backends[index]._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                self._failed(index, e, tried)
+                last_error = e
+                continue
+            self._pool.release(index)
+            return result
+        raise last_error
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        """Streams from one backend; a stream that already produced output is not retried."""
+        index = self._pool.acquire(set(), timeout=self.request_timeout)
+        failed = False
+        try:
+            yield from self._backends[index]._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except Exception as e:
+            failed = is_backend_failure(e)
+            raise
+        finally:
+            self._pool.release(index, failed=failed)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """Async counterpart of _stream."""
+        index = await asyncio.to_thread(self._pool.acquire, set(), self.request_timeout)
+        failed = False
+        try:
+            async for chunk in self._backends[index]._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+        except Exception as e:
+            failed = is_backend_failure(e)
+            raise
+        finally:
+            self._pool.release(index, failed=failed)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Requests, failures and in-flight calls per backend (of every dispatcher over these hosts)."""
+        return {
+            host: {
+                "requests": self._pool.requests[i],
+                "failures": self._pool.failures[i],
+                "outstanding": self._pool.outstanding[i],
+            }
+            for i, host in enumerate(self.hosts)
+        }
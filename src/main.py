@@ -1,7 +1,7 @@
 import argparse
 import sys
 from src.utils import setup_system_dependencies, pull_ollama_model, ensure_directories
-from src.config import OLLAMA_MODEL
+from src.config import OLLAMA_MODEL, INFERENCE_WORKERS, SERVE_HOST, SERVE_PORT
 
 
 def main() -> None:
@@ -9,12 +9,29 @@ def main() -> None:
 
     parser.add_argument("--setup", action="store_true", help="Install system deps and pull Ollama model")
     parser.add_argument("--ingest", action="store_true", help="Run PDF ingestion (Docling + Metadata)")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="With --ingest: discard the chunk store and re-ingest every PDF"
+    )
     parser.add_argument("--index", action="store_true", help="Build FAISS index from ingested splits")
     parser.add_argument("--run", action="store_true", help="Run the RAG inference (Submission generation)")
+    parser.add_argument(
+        "--workers", type=int, default=INFERENCE_WORKERS, help="Number of questions answered concurrently during --run"
+    )
+
+    parser.add_argument(
+        "--resume", action="store_true", help="With --run: keep the answer checkpoint and skip answered questions"
+    )
+    parser.add_argument(
+        "--retry-na", action="store_true", help="With --run: like --resume, but also re-answer 'N/A' answers"
+    )
+
+    parser.add_argument("--serve", action="store_true", help="Keep the pipeline loaded and answer questions over HTTP")
+    parser.add_argument("--host", default=SERVE_HOST, help="Interface for --serve")
+    parser.add_argument("--port", type=int, default=SERVE_PORT, help="Port for --serve")
 
     args = parser.parse_args()
 
-    if not any(vars(args).values()):
+    if not any([args.setup, args.ingest, args.index, args.run, args.serve]):
         print("No arguments provided. Defaulting to --run.")
         args.run = True
 
@@ -29,7 +46,7 @@ def main() -> None:
         print("=== Ingestion Phase ===")
         from src.ingestion import run_ingestion
 
-        run_ingestion()
+        run_ingestion(rebuild=args.rebuild)
 
     if args.index:
         print("=== Indexing Phase ===")
@@ -39,11 +56,15 @@ def main() -> None:
 
     if args.run:
         print("=== Inference Phase ===")
-        from src.generation import run_inference
+        from src.inference_runner import run_pipeline
+
+        run_pipeline(workers=args.workers, resume=args.resume, retry_na=args.retry_na)
 
-        from .inference_runner import run_pipeline
+    if args.serve:
+        print("=== Serving ===")
+        from src.server import serve
 
-        run_pipeline()
+        serve(host=args.host, port=args.port)
 
 
 if __name__ == "__main__":
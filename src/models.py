@@ -1,13 +1,135 @@
-from langchain_ollama import ChatOllama
-from langchain_huggingface import HuggingFaceEmbeddings
+import threading
+import time
+from typing import List, Optional
+
+import requests
 from langchain_core.embeddings import Embeddings
 from langchain_core.language_models.chat_models import BaseChatModel
 
-from src.config import OLLAMA_MODEL, EMBEDDING_MODEL
+from src.config import (
+    OLLAMA_MODEL,
+    OLLAMA_HOSTS,
+    OLLAMA_MAX_CONCURRENCY,
+    OLLAMA_TIMEOUT_S,
+    OLLAMA_RETRIES,
+    OLLAMA_COOLDOWN_S,
+    OLLAMA_KEEP_ALIVE,
+    LLM_BACKEND,
+    FAKE_LLM_LATENCY_MS,
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_MB,
+)
+from src.llm_cache import get_llm_cache
+from src.tracing import TokenUsageCallback, span
+
+# Model clients are imported inside the factories: langchain_huggingface pulls in torch and
+# sentence-transformers, which commands that never embed (--ingest, --setup) should not pay for.
+
+
+def get_llm(
+    model_name: str = OLLAMA_MODEL, temperature: float = 0, num_ctx: int = 16384, use_cache: Optional[bool] = None
+) -> BaseChatModel:
+    """
+    Initializes the Ollama chat model.
+
+    Deterministic calls (temperature 0) go through a persistent SQLite cache, so re-runs
+    only pay for prompts that changed. Set LLM_CACHE_ENABLED=0 or pass use_cache=False to bypass it.
+    With LLM_BACKEND=fake a deterministic offline stand-in is returned instead (never cached).
+    Every call is recorded as a tracing span with its token counts.
+    With several OLLAMA_HOSTS, calls are load-balanced over them (see llm_dispatch.OllamaDispatcher);
+    every model of the process shares one routing pool and connection set per host.
+
+    Args:
+        model_name (str): Ollama model tag.
+        temperature (float): Sampling temperature.
+        num_ctx (int): Context window size.
+        use_cache (Optional[bool]): Overrides LLM_CACHE_ENABLED when set.
+
+    Returns:
+        BaseChatModel: Configured ChatOllama (or OllamaDispatcher) instance.
+    """
+    if LLM_BACKEND == "fake":
+        from src.stand_ins import FakeChatModel
+
+        return FakeChatModel(latency_ms=FAKE_LLM_LATENCY_MS, callbacks=[TokenUsageCallback()])
+
+    from langchain_ollama import ChatOllama
+
+    if use_cache is None:
+        use_cache = LLM_CACHE_ENABLED
+
+    cache = None
+    if use_cache and temperature == 0:
+        namespace = {"model": model_name, "temperature": temperature, "num_ctx": num_ctx}
+        cache = get_llm_cache(LLM_CACHE_PATH, namespace, max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024)
 
+    settings = dict(
+        model=model_name,
+        temperature=temperature,
+        num_ctx=num_ctx,
+        num_gpu=-1,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        cache=cache,
+        callbacks=[TokenUsageCallback()],
+    )
+    if len(OLLAMA_HOSTS) > 1:
+        from src.llm_dispatch import OllamaDispatcher
 
-def get_llm(model_name: str = OLLAMA_MODEL, temperature: float = 0, num_ctx: int = 16384) -> BaseChatModel:
-    return ChatOllama(model=model_name, temperature=temperature, num_ctx=num_ctx, num_gpu=-1)
+        return OllamaDispatcher(
+            **settings,
+            hosts=OLLAMA_HOSTS,
+            max_concurrency=OLLAMA_MAX_CONCURRENCY,
+            request_timeout=OLLAMA_TIMEOUT_S,
+            retries=OLLAMA_RETRIES,
+            cooldown_s=OLLAMA_COOLDOWN_S,
+        )
+    return ChatOllama(**settings, base_url=OLLAMA_HOSTS[0], client_kwargs={"timeout": OLLAMA_TIMEOUT_S})
+
+
+def preload_llm(model_name: str = OLLAMA_MODEL, num_ctx: int = 16384) -> List[threading.Thread]:
+    """
+    Loads the Ollama model into memory on every OLLAMA_HOSTS server, in background
+    threads, so the first question does not pay the cold-load time.
+
+    An empty generate request makes Ollama load the model without generating. The
+    options must match get_llm's, otherwise Ollama reloads the runner on the first call.
+
+    Args:
+        model_name (str): Ollama model tag.
+        num_ctx (int): Context window size used by get_llm.
+
+    Returns:
+        List[threading.Thread]: The loading threads (none with a non-Ollama backend).
+    """
+    if LLM_BACKEND != "ollama":
+        return []
+
+    def load(host: str) -> None:
+        base_url = host.rstrip("/") if "://" in host else f"http://{host.rstrip('/')}"
+        start = time.perf_counter()
+        try:
+            with span("llm_preload", model=model_name, host=host):
+                response = requests.post(
+                    f"{base_url}/api/generate",
+                    json={
+                        "model": model_name,
+                        "keep_alive": OLLAMA_KEEP_ALIVE,
+                        "options": {"num_ctx": num_ctx, "num_gpu": -1},
+                    },
+                    timeout=600,
+                )
+                response.raise_for_status()
+            print(f"Ollama model {model_name} loaded on {host} in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"Warning: could not preload Ollama model {model_name} on {host}: {e}")
+
+    threads = [threading.Thread(target=load, args=(host,), name="ollama-preload", daemon=True) for host in OLLAMA_HOSTS]
+    for thread in threads:
+        thread.start()
+    return threads
 
 
 def get_embeddings() -> Embeddings:
@@ -17,7 +139,15 @@ def get_embeddings() -> Embeddings:
     Returns:
         Embeddings: Configured HuggingFaceEmbeddings instance running on CPU (usually)
                     or GPU depending on internal torch settings, configured for remote code.
+                    With EMBEDDING_BACKEND=hashing, a lexical offline stand-in.
     """
+    if EMBEDDING_BACKEND == "hashing":
+        from src.stand_ins import HashingEmbeddings
+
+        return HashingEmbeddings()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
     model_kwargs = {"device": "cpu", "trust_remote_code": True}
     encode_kwargs = {"normalize_embeddings": True, "batch_size": 32}
 
@@ -0,0 +1,218 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable
+from tqdm import tqdm
+
+from src.companies import CompanyResolver
+from src.config import PLANS_PATH
+from src.models import get_llm
+from src.schemas import QueryPlan
+from src.utils import question_hash
+from src.tracing import span
+
+
+PLANNER_VERSION = "1"
+
+planning_prompt = """You are an expert in Financial Information Retrieval.
+Analyze the user's question about company annual reports and produce a search plan.
+1. extracted_company: the company name mentioned in the question, exactly as written. Empty string if none.
+2. refined_query: rewrite the question into a targeted, keyword-rich semantic query.
+   - STRIP Company Names.
+   - REMOVE Constraints (e.g. "return 'N/A'").
+   - REMOVE Temporal Noise.
+   - EXPAND Terminology (e.g. "let go" -> "redundancy, severance").
+3. answer_kind: the expected answer format (number, name, names or boolean).
+User Input:
+"""
+
+
+@lru_cache(maxsize=1)
+def get_planner() -> Runnable:
+    """Returns the structured-output runnable used for query planning."""
+    return get_llm().with_structured_output(QueryPlan)
+
+
+_CONSTRAINT_RE = re.compile(r"[^.?!]*\bN/A\b[^.?!]*[.?!]?")
+_PERIOD_RE = re.compile(r"\([^()]*\bperiod\b[^()]*\)", re.IGNORECASE)
+
+# Deterministic stand-in for the planner's "EXPAND Terminology" step, used for questions
+# whose company is resolved without the LLM. Terms are appended to the search query.
+QUERY_EXPANSIONS: Dict[str, str] = {
+    "revenue": "sales turnover",
+    "sales": "revenue turnover",
+    "profit": "net income earnings",
+    "net income": "profit earnings",
+    "employees": "workforce headcount staff",
+    "staff": "employees workforce headcount",
+    "let go": "redundancy severance layoffs",
+    "layoffs": "redundancy severance workforce reduction",
+    "ceo": "chief executive officer",
+    "cfo": "chief financial officer",
+    "dividend": "dividend per share payout",
+    "debt": "borrowings liabilities",
+    "acquisition": "acquired merger purchase",
+    "buyback": "share repurchase",
+    "capex": "capital expenditure",
+    "r&d": "research and development",
+}
+_EXPANSION_RE = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(term) for term in sorted(QUERY_EXPANSIONS, key=len, reverse=True)) + r")(?!\w)",
+    re.IGNORECASE,
+)
+
+
+def fallback_plan(question: str, kind: str = "") -> QueryPlan:
+    """
+    Builds a plan without the LLM: no company filter, raw question as the search query.
+    """
+    answer_kind = kind if kind in ("number", "name", "boolean", "names") else "name"
+    return QueryPlan(extracted_company="", refined_query=question, answer_kind=answer_kind)
+
+
+def expand_query(query: str) -> str:
+    """Appends the QUERY_EXPANSIONS terms of the phrases found in a query (words it already has are skipped)."""
+    words = set(query.lower().split())
+    extra: List[str] = []
+    for match in _EXPANSION_RE.finditer(query):
+        for term in QUERY_EXPANSIONS[match.group(1).lower()].split():
+            if term not in words:
+                words.add(term)
+                extra.append(term)
+    return " ".join([query, *extra])
+
+
+def resolved_plan(question: str, kind: str, company: str, mention: Tuple[int, int]) -> QueryPlan:
+    """
+    Builds a plan without the LLM for a question whose company was resolved
+    deterministically, following the planning prompt: the mention (and its quotes) is
+    stripped, "return 'N/A'" constraints and "(... period)" qualifiers are dropped and
+    the terminology is expanded with QUERY_EXPANSIONS.
+    """
+    start, end = mention
+    if 0 < start and end < len(question) and question[start - 1] in "\"“'" and question[end] in "\"”'":
+        start, end = start - 1, end + 1
+    query = _PERIOD_RE.sub("", _CONSTRAINT_RE.sub("", question[:start] + question[end:]))
+    query = " ".join(query.split()).replace(" ?", "?").replace(" ,", ",")
+    plan = fallback_plan(expand_query(query) if query else question, kind)
+    plan.extracted_company = company
+    return plan
+
+
+def plan_question(question: str, kind: str = "", resolver: Optional[CompanyResolver] = None) -> QueryPlan:
+    """
+    Plans a single question, with one LLM call unless `resolver` finds its company.
+
+    Args:
+        question (str): Raw user question.
+        kind (str): Answer kind from the questions file, used if planning fails.
+        resolver (Optional[CompanyResolver]): Deterministic company resolver tried before the LLM.
+
+    Returns:
+        QueryPlan: Company, refined query and answer kind.
+    """
+    if resolver is not None:
+        company, mention = resolver.resolve(question)
+        if company is not None:
+            return resolved_plan(question, kind, company, mention)
+
+    try:
+        return get_planner().invoke(planning_prompt + "\n" + question)
+    except Exception as e:
+        print(f"Query planning failed: {e}")
+        return fallback_plan(question, kind)
+
+
+def load_plans(path: Path = PLANS_PATH) -> Dict[str, QueryPlan]:
+    """
+    Loads stored plans, ignoring files written by a different planner version.
+
+    Returns:
+        Dict[str, QueryPlan]: Plans keyed by question hash.
+    """
+    if not path.exists():
+        return {}
+
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    if data.get("version") != PLANNER_VERSION:
+        print(f"Ignoring query plans in {path}: planner version changed.")
+        return {}
+
+    return {key: QueryPlan(**plan) for key, plan in data.get("plans", {}).items()}
+
+
+def save_plans(plans: Dict[str, QueryPlan], path: Path = PLANS_PATH) -> None:
+    """Writes plans keyed by question hash to disk."""
+    data = {"version": PLANNER_VERSION, "plans": {key: plan.model_dump() for key, plan in plans.items()}}
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def plan_questions(
+    questions: List[Dict[str, Any]], max_concurrency: int = 4, resolver: Optional[CompanyResolver] = None
+) -> Dict[str, QueryPlan]:
+    """
+    Plans every question up front in one batched pass before retrieval starts.
+
+    Plans already stored on disk are reused. New questions whose company `resolver`
+    finds deterministically are planned without the LLM (these plans are cheap and
+    not stored); only the rest hit the LLM.
+
+    Args:
+        questions (List[Dict[str, Any]]): Raw question entries with 'text' and 'kind'.
+        max_concurrency (int): Number of planning requests in flight at once.
+        resolver (Optional[CompanyResolver]): Deterministic company resolver tried before the LLM.
+
+    Returns:
+        Dict[str, QueryPlan]: Plans keyed by question hash.
+    """
+    plans = load_plans()
+
+    pending: Dict[str, Dict[str, Any]] = {}
+    for item in questions:
+        key = question_hash(item.get("text", ""))
+        if key not in plans:
+            pending[key] = item
+    reused = len(questions) - len(pending)
+
+    resolved: Dict[str, QueryPlan] = {}
+    if resolver is not None and pending:
+        with span("resolve_companies", questions=len(pending)) as resolve_span:
+            for key, item in pending.items():
+                text = item.get("text", "")
+                company, mention = resolver.resolve(text)
+                if company is not None:
+                    resolved[key] = resolved_plan(text, item.get("kind", ""), company, mention)
+            resolve_span.set(resolved=len(resolved))
+        print(
+            f"Company resolver: {len(resolved)} of {len(pending)} questions planned without the LLM "
+            f"({len(resolved) / len(pending):.0%} of planning calls saved)."
+        )
+        pending = {key: item for key, item in pending.items() if key not in resolved}
+
+    print(f"Query plans: {reused} reused, {len(resolved)} resolved, {len(pending)} to plan with the LLM.")
+    if not pending:
+        return {**plans, **resolved}
+
+    prompts = [planning_prompt + "\n" + item.get("text", "") for item in pending.values()]
+    with span("plan_batch", questions=len(prompts)):
+        results = get_planner().batch(prompts, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+
+    for (key, item), result in tqdm(zip(pending.items(), results), total=len(pending), desc="Planning Queries"):
+        if isinstance(result, QueryPlan):
+            plans[key] = result
+        else:
+            print(f"Query planning failed for '{item.get('text', '')[:60]}': {result}")
+
+    save_plans(plans)
+
+    for key, item in pending.items():
+        if key not in plans:
+            plans[key] = fallback_plan(item.get("text", ""), item.get("kind", ""))
+
+    return {**plans, **resolved}
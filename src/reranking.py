@@ -0,0 +1,300 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import ConfigDict, PrivateAttr
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents import BaseDocumentCompressor
+from langchain_core.embeddings import Embeddings
+
+from src.batching import MicroBatcher
+from src.config import (
+    RERANKER_MODEL,
+    RERANKER_BACKEND,
+    RERANKER_ONNX_PATH,
+    RERANK_BATCH_SIZE,
+    RERANK_BATCH_WAIT_MS,
+    RERANK_CACHE_SIZE,
+    RERANK_MIN_CANDIDATES,
+    RERANK_MAX_CANDIDATES,
+    RERANK_CASCADE_MARGIN,
+    RERANK_KEEP_FUSED,
+)
+from src.embedding_cache import EmbeddingCache
+from src.tracing import span
+
+
+class TorchCrossEncoderScorer:
+    """
+    Scores (query, passage) pairs with the sentence-transformers cross-encoder (fp32 PyTorch).
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL) -> None:
+        from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+
+        self.model = HuggingFaceCrossEncoder(model_name=model_name, model_kwargs={"device": "cpu"})
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        return [float(s) for s in self.model.score(pairs)]
+
+
+class OnnxCrossEncoderScorer:
+    """
+    Scores (query, passage) pairs with an int8 dynamically quantized ONNX Runtime export
+    of the cross-encoder. The export is created once and cached under `export_path`.
+
+    Requires the optional `onnx` extra (optimum[onnxruntime]).
+    """
+
+    def __init__(
+        self, model_name: str = RERANKER_MODEL, export_path: Path = RERANKER_ONNX_PATH, max_length: int = 512
+    ) -> None:
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError("The onnx reranker backend needs `pip install optimum[onnxruntime]`.") from e
+
+        self.max_length = max_length
+        quantized_path = Path(export_path) / "int8"
+
+        if not (quantized_path / "model_quantized.onnx").exists():
+            print(f"Exporting {model_name} to ONNX and quantizing to int8 at {quantized_path}...")
+            model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+            model.save_pretrained(export_path)
+            quantizer = ORTQuantizer.from_pretrained(export_path)
+            quantizer.quantize(
+                save_dir=quantized_path, quantization_config=AutoQuantizationConfig.avx2(is_static=False)
+            )
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(quantized_path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(quantized_path)
+        self.model = ORTModelForSequenceClassification.from_pretrained(quantized_path, file_name="model_quantized.onnx")
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        if not pairs:
+            return []
+        features = self.tokenizer(
+            [q for q, _ in pairs],
+            [p for _, p in pairs],
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        logits = self.model(**features).logits
+        return [float(row[0]) for row in logits]
+
+
+def get_scorer(backend: str = RERANKER_BACKEND) -> Any:
+    """
+    Creates a cross-encoder scorer for a backend name ('torch', 'onnx' or the offline 'lexical' stand-in).
+    """
+    if backend == "torch":
+        return TorchCrossEncoderScorer()
+    if backend == "onnx":
+        return OnnxCrossEncoderScorer()
+    if backend == "lexical":
+        from src.stand_ins import LexicalScorer
+
+        return LexicalScorer()
+    raise ValueError(f"Unknown reranker backend '{backend}'. Use 'torch', 'onnx' or 'lexical'.")
+
+
+class ScoreCache:
+    """
+    Thread-safe LRU cache of cross-encoder scores keyed by (query hash, chunk id).
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._data.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: Tuple[str, str], score: float) -> None:
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+def chunk_key(doc: Document) -> str:
+    """Stable identifier of a chunk: its chunk id, or a hash of its text."""
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id is not None:
+        return str(chunk_id)
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class BatchedCrossEncoderReranker(BaseDocumentCompressor):
+    """
+    Cross-encoder reranker that shares forward passes between concurrent questions.
+
+    Uncached (query, chunk) pairs of all in-flight questions are merged by a
+    MicroBatcher, and every score is kept in an LRU cache so repeated pairs
+    (re-runs, overlapping candidates) are never scored twice. Returned documents
+    carry their score in metadata['relevance_score'].
+    """
+
+    scorer: Any
+    batcher: Any
+    cache: Any
+    top_n: int = 50
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def score_documents(self, documents: Sequence[Document], query: str) -> List[float]:
+        """
+        Scores documents against a query, using the cache where possible.
+        """
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        keys = [(query_hash, chunk_key(doc)) for doc in documents]
+        scores: List[Optional[float]] = [self.cache.get(key) for key in keys]
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            with span("cross_encoder", pairs=len(missing), cached=len(keys) - len(missing)):
+                fresh = self.batcher.run([(query, documents[i].page_content) for i in missing])
+            for i, score in zip(missing, fresh):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+
+        return [float(s) for s in scores]
+
+    def compress_documents(
+        self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+        scores = self.score_documents(documents, query)
+        ranked = sorted(zip(documents, scores), key=lambda x: x[1], reverse=True)[: self.top_n]
+        for doc, score in ranked:
+            doc.metadata["relevance_score"] = score
+        return [doc for doc, _ in ranked]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "forward_batches": self.batcher.batches,
+            "pairs_scored": self.batcher.items,
+            "queue_depth": self.batcher.queue_depth(),
+        }
+
+
+def get_reranker(backend: str = RERANKER_BACKEND, top_n: int = 50) -> BatchedCrossEncoderReranker:
+    """
+    Builds the reranker used by the retrieval pipeline.
+
+    Args:
+        backend (str): 'torch' (fp32 PyTorch) or 'onnx' (int8 ONNX Runtime).
+        top_n (int): Number of documents kept after reranking.
+
+    Returns:
+        BatchedCrossEncoderReranker: Reranker with cross-question batching and a score cache.
+    """
+    scorer = get_scorer(backend)
+    batcher = MicroBatcher(scorer.score, max_batch=RERANK_BATCH_SIZE, max_wait_ms=RERANK_BATCH_WAIT_MS)
+    return BatchedCrossEncoderReranker(scorer=scorer, batcher=batcher, cache=ScoreCache(RERANK_CACHE_SIZE), top_n=top_n)
+
+
+class CascadeReranker(BaseDocumentCompressor):
+    """
+    Two-stage reranker: a cheap dense pre-ranking prunes the fused candidates to an
+    adaptive budget, and only the survivors are scored by the cross-encoder.
+
+    Stage one is the cosine similarity between the query and the chunk vectors the
+    index was built from (read from the embedding cache, nothing is re-embedded).
+    With a truncated (Matryoshka) index the cached vectors are cut to the query
+    dimension. Candidates within `margin` of the best cosine score survive, clamped to
+    [min_candidates, max_candidates]: a clear winner shrinks the budget, a flat score
+    distribution grows it. The first `keep_fused` candidates of the fused (BM25 + dense)
+    order always survive, so exact keyword hits are not lost to the dense stage.
+    """
+
+    reranker: BatchedCrossEncoderReranker
+    embeddings: Embeddings
+    vector_cache: EmbeddingCache
+    min_candidates: int = RERANK_MIN_CANDIDATES
+    max_candidates: int = RERANK_MAX_CANDIDATES
+    margin: float = RERANK_CASCADE_MARGIN
+    keep_fused: int = RERANK_KEEP_FUSED
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _queries: int = PrivateAttr(default=0)
+    _candidates: int = PrivateAttr(default=0)
+    _pairs: int = PrivateAttr(default=0)
+
+    def prune(self, documents: Sequence[Document], query: str) -> List[Document]:
+        """
+        Selects the candidates that go to the cross-encoder, in fused order.
+        """
+        if len(documents) <= self.min_candidates:
+            return list(documents)
+
+        hashes = [doc.metadata.get("content_hash", "") for doc in documents]
+        vectors = self.vector_cache.get_many([h for h in hashes if h])
+        if not vectors:
+            return list(documents[: self.max_candidates])
+
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+
+        scores = np.full(len(documents), -np.inf, dtype=np.float32)
+        for i, content_hash in enumerate(hashes):
+            vector = vectors.get(content_hash)
+            if vector is not None:
+                vector = vector[: len(query_vector)]
+                scores[i] = float(vector @ query_vector) / (float(np.linalg.norm(vector)) or 1.0)
+
+        order = np.argsort(-scores, kind="stable")
+        best = scores[order[0]]
+        budget = int(np.count_nonzero(scores >= best - self.margin))
+        budget = max(self.min_candidates, min(self.max_candidates, budget))
+
+        keep = set(order[:budget].tolist()) | set(range(min(self.keep_fused, len(documents))))
+        return [doc for i, doc in enumerate(documents) if i in keep]
+
+    def compress_documents(
+        self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None
+    ) -> Sequence[Document]:
+        with span("rerank_prune", candidates=len(documents)) as prune_span:
+            survivors = self.prune(documents, query)
+            prune_span.set(kept=len(survivors))
+        with self._lock:
+            self._queries += 1
+            self._candidates += len(documents)
+            self._pairs += len(survivors)
+        print(f"Reranking {len(survivors)} of {len(documents)} candidates")
+        return self.reranker.compress_documents(survivors, query, callbacks=callbacks)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queries, candidates, pairs = self._queries, self._candidates, self._pairs
+        return {
+            "queries": queries,
+            "candidates": candidates,
+            "pairs_sent": pairs,
+            "pairs_per_query": round(pairs / queries, 1) if queries else 0.0,
+            **self.reranker.stats(),
+        }
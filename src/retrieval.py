@@ -1,52 +1,176 @@
+import json
 import pickle
-from typing import List, Tuple, Optional, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional, Any
 
-from rapidfuzz import process, fuzz
-from langchain_core.documents import Document
+import faiss
+from langchain_core.embeddings import Embeddings
 from langchain_core.vectorstores import VectorStore
-from langchain_core.retrievers import BaseRetriever
-from langchain_core.documents.compressors import BaseDocumentCompressor
+from langchain_core.documents import BaseDocumentCompressor
 from langchain_community.vectorstores import FAISS
-from langchain_community.retrievers import BM25Retriever
-from langchain_classic.retrievers.document_compressors import CrossEncoderReranker
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 
-from src.config import INDEX_PATH, SPLITS_PATH, RERANKER_MODEL
+from src.bm25 import SparseBM25
+from src.chunk_store import ChunkStore, ChunkStoreDocstore
+from src.companies import CompanyResolver
+from src.tracing import span
+from src.config import (
+    INDEX_PATH,
+    SHARDS_PATH,
+    CHUNK_STORE_PATH,
+    BM25_PATH,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    RERANKER_BACKEND,
+    RERANK_CASCADE,
+    STARTUP_WORKERS,
+)
+from src.embedding_cache import EmbeddingCache, CachedQueryEmbeddings
+from src.hybrid import HybridRetriever
+from src.index_factory import IndexSpec, load_index_spec, wrap_embeddings, apply_search_params
 from src.models import get_embeddings
+from src.reranking import CascadeReranker, get_reranker
+from src.utils import submit_timed
 
 
-def load_resources() -> Tuple[VectorStore, List[Document], List[str]]:
+class CompanyShardIndex:
     """
-    Loads the Vector Store, Document Splits, and extracts known company names.
+    Per-company FAISS sub-indexes written by indexing.build_company_shards.
+
+    Shards are loaded on first use and kept in memory, so a query only ever
+    touches the vectors of the company it is about.
+    """
+
+    def __init__(self, shards_path: Path, embeddings: Embeddings, store: ChunkStore) -> None:
+        self.shards_path = shards_path
+        self.embeddings = embeddings
+        self.store = store
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, VectorStore] = {}
+
+        with open(shards_path / "manifest.json", "r") as f:
+            self.manifest: Dict[str, Dict[str, Any]] = json.load(f)["companies"]
+
+    def __contains__(self, company_name: str) -> bool:
+        return company_name in self.manifest
+
+    def __len__(self) -> int:
+        return len(self.manifest)
+
+    def get(self, company_name: str) -> Optional[VectorStore]:
+        """
+        Returns the shard for a company, or None if the company has no shard.
+        """
+        entry = self.manifest.get(company_name)
+        if entry is None:
+            return None
+
+        with self._lock:
+            if company_name not in self._loaded:
+                with span("shard_load", company=company_name):
+                    shard = FAISS.load_local(
+                        folder_path=str(self.shards_path / entry["path"]),
+                        embeddings=self.embeddings,
+                        allow_dangerous_deserialization=True,
+                    )
+                shard.docstore = ChunkStoreDocstore(self.store)
+                self._loaded[company_name] = shard
+            return self._loaded[company_name]
+
+
+def read_faiss_index(folder: Path) -> Tuple[faiss.Index, Dict[int, str]]:
+    """
+    Reads a FAISS store written by FAISS.save_local without attaching a query encoder,
+    so the index file can be read while the embedding model is still loading. The
+    pickled docstore is dropped: texts are served by the chunk store.
 
     Returns:
-        Tuple[VectorStore, List[Document], List[str]]:
-            - Loaded FAISS vector store.
-            - List of Document objects for BM25.
-            - List of unique company names found in metadata.
+        Tuple[faiss.Index, Dict[int, str]]: The index and its position -> chunk id mapping.
     """
-    print("Loading resources...")
-    embeddings = get_embeddings()
+    index = faiss.read_index(str(folder / "index.faiss"))
+    with open(folder / "index.pkl", "rb") as f:
+        _, index_to_docstore_id = pickle.load(f)
+    return index, index_to_docstore_id
 
-    vector_db = FAISS.load_local(
-        folder_path=str(INDEX_PATH),
-        embeddings=embeddings,
-        allow_dangerous_deserialization=True,
-    )
 
-    with open(SPLITS_PATH, "rb") as f:
-        new_splits: List[Document] = pickle.load(f)
+def open_chunk_store() -> ChunkStore:
+    if not (CHUNK_STORE_PATH / "chunks.sqlite").exists():
+        raise FileNotFoundError(f"Chunk store not found at {CHUNK_STORE_PATH}")
+    return ChunkStore(CHUNK_STORE_PATH)
 
-    unique_companies = list(
-        set([str(i.metadata.get("company_name", "")) for i in new_splits if i.metadata.get("company_name")])
+
+def _assemble_resources(
+    spec: IndexSpec, base_embeddings: Embeddings, index_parts: Tuple[faiss.Index, Dict[int, str]], store: ChunkStore
+) -> Tuple[VectorStore, ChunkStore, List[str], Optional[CompanyShardIndex]]:
+    query_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, f"{EMBEDDING_MODEL}#query@{spec.dim or 'full'}")
+    embeddings = CachedQueryEmbeddings(
+        wrap_embeddings(base_embeddings, spec), query_cache, batch_size=EMBEDDING_BATCH_SIZE
+    )
+
+    index, index_to_docstore_id = index_parts
+    vector_db = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=ChunkStoreDocstore(store),
+        index_to_docstore_id=index_to_docstore_id,
     )
+    apply_search_params(vector_db.index, spec)
+    print(f"Loaded {spec.index_type} index with {vector_db.index.ntotal} vectors of dimension {vector_db.index.d}.")
+
+    unique_companies = store.companies()
+
+    shards: Optional[CompanyShardIndex] = None
+    if (SHARDS_PATH / "manifest.json").exists():
+        shards = CompanyShardIndex(SHARDS_PATH, embeddings, store)
+        print(f"Found {len(shards)} company shards.")
+    else:
+        print("No company shards found, using the global index only.")
+
+    return vector_db, store, unique_companies, shards
+
 
-    return vector_db, new_splits, unique_companies
+def load_resources(
+    workers: int = STARTUP_WORKERS,
+) -> Tuple[VectorStore, ChunkStore, List[str], Optional[CompanyShardIndex]]:
+    """
+    Loads the Vector Store, the Chunk Store, and extracts known company names.
+
+    The embedding model, the FAISS index file and the chunk store are loaded
+    concurrently; each step's duration is printed and traced.
+
+    Args:
+        workers (int): Threads used for loading.
+
+    Returns:
+        Tuple[VectorStore, ChunkStore, List[str], Optional[CompanyShardIndex]]:
+            - Loaded FAISS vector store. Its query encoder caches query vectors on disk
+              (see embedding_cache.CachedQueryEmbeddings).
+            - Chunk store with texts and metadata (read lazily).
+            - List of unique company names found in metadata.
+            - Per-company shards, or None if the index was built without them.
+    """
+    print("Loading resources...")
+    spec = load_index_spec(INDEX_PATH) or IndexSpec()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="load") as executor:
+        base_embeddings = submit_timed(executor, "embedding_model", get_embeddings)
+        index_parts = submit_timed(executor, "index_load", read_faiss_index, INDEX_PATH)
+        store = submit_timed(executor, "chunk_store", open_chunk_store)
+        return _assemble_resources(spec, base_embeddings.result(), index_parts.result(), store.result())
+
+
+@lru_cache(maxsize=4)
+def _resolver_for(known_companies: Tuple[str, ...]) -> CompanyResolver:
+    return CompanyResolver(list(known_companies))
 
 
 def get_company_match(target_company: str, known_companies: List[str]) -> Optional[str]:
     """
-    Attempts to find a matching company name in the database using exact and fuzzy matching.
+    Attempts to find a matching company name in the database using alias and fuzzy matching.
 
     Args:
         target_company (str): The company name extracted from the user's query.
@@ -56,44 +180,124 @@ def get_company_match(target_company: str, known_companies: List[str]) -> Option
         Optional[str]: The normalized company name if a match is found (score > 60),
                        otherwise None.
     """
-    if not target_company:
-        return None
+    return _resolver_for(tuple(known_companies)).match(target_company)
+
+
+def load_bm25_engine(store: ChunkStore) -> SparseBM25:
+    """
+    Loads the BM25 engine from BM25_PATH, rebuilding it when the chunk store changed.
+
+    Args:
+        store (ChunkStore): The chunks the engine must cover.
+
+    Returns:
+        SparseBM25: Engine partitioned by company name, keyed by chunk id.
+    """
+    fingerprint = store.fingerprint()
+
+    if (BM25_PATH / "meta.json").exists():
+        engine = SparseBM25.load(BM25_PATH)
+        if engine.fingerprint == fingerprint:
+            print(f"Loaded BM25 index from {BM25_PATH}")
+            return engine
+        print("BM25 index is stale, rebuilding...")
 
-    companies_lower = {c.lower(): c for c in known_companies}
-    if target_company.lower() in companies_lower:
-        print(f"Exact match: target_company='{companies_lower[target_company.lower()]}'")
-        return companies_lower[target_company.lower()]
+    chunk_ids: List[int] = []
+    texts: List[str] = []
+    companies: List[str] = []
+    for chunk_id, text, company in store.iter_texts():
+        chunk_ids.append(chunk_id)
+        texts.append(text)
+        companies.append(company)
 
-    match = process.extractOne(target_company, known_companies, scorer=fuzz.token_sort_ratio)
-    if match and match[1] > 60:
-        print(f"Fuzzy match: '{target_company}' -> '{match[0]}' (Score: {match[1]})")
-        return match[0]
+    engine = SparseBM25.fit(texts, companies, doc_ids=chunk_ids, fingerprint=fingerprint)
+    engine.save(BM25_PATH)
+    print(f"Saved BM25 index to {BM25_PATH}")
+    return engine
 
-    print(f"Company '{target_company}' not found in database.")
-    return None
+
+def _wrap_cascade(reranker: BaseDocumentCompressor, vector_db: VectorStore, cascade: bool) -> BaseDocumentCompressor:
+    if cascade and EMBEDDING_CACHE_PATH.exists():
+        return CascadeReranker(
+            reranker=reranker,
+            embeddings=vector_db.embeddings,
+            vector_cache=EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL),
+        )
+    if cascade:
+        print(f"No embedding cache at {EMBEDDING_CACHE_PATH}, reranking without the cascade.")
+    return reranker
 
 
 def create_retriever_pipeline(
-    vector_db: VectorStore, documents: List[Document]
-) -> Tuple[BaseRetriever, VectorStore, BaseDocumentCompressor]:
+    vector_db: VectorStore,
+    store: ChunkStore,
+    shards: Optional[CompanyShardIndex] = None,
+    reranker_backend: str = RERANKER_BACKEND,
+    cascade: bool = RERANK_CASCADE,
+) -> Tuple[HybridRetriever, BaseDocumentCompressor]:
     """
     Initializes components for the retrieval pipeline.
 
     Args:
         vector_db (VectorStore): The loaded FAISS index.
-        documents (List[Document]): The raw documents for BM25 initialization.
+        store (ChunkStore): The chunk store for BM25 initialization.
+        shards (Optional[CompanyShardIndex]): Per-company sub-indexes used for dense search.
+        reranker_backend (str): Cross-encoder backend, 'torch' or 'onnx' (int8).
+        cascade (bool): Prune candidates with a dense first stage before the cross-encoder.
 
     Returns:
-        Tuple[BaseRetriever, VectorStore, BaseDocumentCompressor]:
-            - BM25 Retriever instance.
-            - Vector Store instance (to be instantiated as retriever later with filters).
-            - CrossEncoder Reranker compressor.
+        Tuple[HybridRetriever, BaseDocumentCompressor]:
+            - Hybrid BM25 + dense retriever, shared by all questions (company and k are set per call).
+            - Batched CrossEncoder Reranker compressor (wrapped in the cascade if enabled).
     """
 
-    bm25_retriever = BM25Retriever.from_documents(documents)
-    bm25_retriever.k = 50
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="load") as executor:
+        bm25 = submit_timed(executor, "bm25_load", load_bm25_engine, store)
+        reranker = submit_timed(executor, "reranker_load", get_reranker, backend=reranker_backend, top_n=50)
+        retriever = HybridRetriever(vector_db=vector_db, bm25=bm25.result(), store=store, shards=shards, k=50)
+        compressor = _wrap_cascade(reranker.result(), vector_db, cascade)
+
+    return retriever, compressor
+
+
+def load_pipeline(
+    reranker_backend: str = RERANKER_BACKEND, cascade: bool = RERANK_CASCADE, workers: int = STARTUP_WORKERS
+) -> Tuple[HybridRetriever, BaseDocumentCompressor, List[str]]:
+    """
+    Warm start of the whole retrieval side: load_resources and create_retriever_pipeline
+    in one go, with every independent resource loaded concurrently.
+
+    The embedding model, the FAISS index file, the chunk store (then the BM25 engine,
+    which is checked against it) and the cross-encoder load on a shared thread pool,
+    so startup takes about as long as the slowest of them instead of their sum.
+
+    Args:
+        reranker_backend (str): Cross-encoder backend, 'torch' or 'onnx' (int8).
+        cascade (bool): Prune candidates with a dense first stage before the cross-encoder.
+        workers (int): Threads used for loading.
+
+    Returns:
+        Tuple[HybridRetriever, BaseDocumentCompressor, List[str]]:
+            - Hybrid retriever (its vector_db, store and shards are the loaded resources).
+            - Reranker compressor.
+            - List of unique company names.
+    """
+    print("Loading resources...")
+    start = time.perf_counter()
+    spec = load_index_spec(INDEX_PATH) or IndexSpec()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="load") as executor:
+        base_embeddings = submit_timed(executor, "embedding_model", get_embeddings)
+        reranker = submit_timed(executor, "reranker_load", get_reranker, backend=reranker_backend, top_n=50)
+        index_parts = submit_timed(executor, "index_load", read_faiss_index, INDEX_PATH)
+        store_future = submit_timed(executor, "chunk_store", open_chunk_store)
+        bm25 = submit_timed(executor, "bm25_load", lambda f=store_future: load_bm25_engine(f.result()))
 
-    reranker = HuggingFaceCrossEncoder(model_name=RERANKER_MODEL, model_kwargs={"device": "cpu"})
-    compressor = CrossEncoderReranker(model=reranker, top_n=50)
+        vector_db, store, known_companies, shards = _assemble_resources(
+            spec, base_embeddings.result(), index_parts.result(), store_future.result()
+        )
+        retriever = HybridRetriever(vector_db=vector_db, bm25=bm25.result(), store=store, shards=shards, k=50)
+        compressor = _wrap_cascade(reranker.result(), vector_db, cascade)
 
-    return bm25_retriever, vector_db, compressor
+    print(f"Resources ready in {time.perf_counter() - start:.2f}s")
+    return retriever, compressor, known_companies
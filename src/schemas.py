@@ -39,18 +39,13 @@ class AnswerSubmission(BaseModel):
     answers: List[Dict[str, Any]]
 
 
-class ReformulatedQuery(BaseModel):
+class QueryPlan(BaseModel):
     """
-    Schema for the output of the query reformulation step.
-    """
-
-    reformulated_query: str = Field(..., description="Reformulated query")
-
-
-class SearchQuery(BaseModel):
-    """
-    Schema for the output of the query analysis step (company extraction).
+    Schema for the output of the query planning step.
     """
 
     extracted_company: str = Field(description="Company name mentioned in the question. Return empty string if none.")
-    search_query: str = Field(description="Refined search query for semantic search")
+    refined_query: str = Field(description="Keyword-rich semantic search query without company names or constraints")
+    answer_kind: Literal["number", "name", "boolean", "names"] = Field(
+        description="Expected format of the answer to the question"
+    )
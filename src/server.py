@@ -0,0 +1,279 @@
+"""
+Local HTTP query server (python -m src.main --serve).
+
+Keeps the retrieval resources and the RAG chain resident between questions:
+
+    POST /answer    {"question": "...", "kind": "number"}  -> Answer JSON
+    GET  /health    readiness
+    GET  /metrics   queue depth, latency percentiles and batching stats
+
+Requests are answered on the server's threads, at most SERVE_WORKERS at a time.
+Concurrent questions share model forward passes through the existing micro-batchers
+(query embeddings in CachedQueryEmbeddings, cross-encoder pairs in the reranker), so
+the more requests are in flight the larger the batches. Up to SERVE_MAX_QUEUE more
+requests wait for a slot; beyond that, or after SERVE_QUEUE_TIMEOUT_S of waiting,
+the server answers 503 with Retry-After instead of queueing without bound.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from langchain_core.documents import BaseDocumentCompressor
+from langchain_core.runnables import Runnable
+
+from src.config import (
+    SERVE_HOST,
+    SERVE_PORT,
+    SERVE_WORKERS,
+    SERVE_MAX_QUEUE,
+    SERVE_QUEUE_TIMEOUT_S,
+    OLLAMA_PRELOAD,
+    COMPANY_RESOLVER,
+)
+from src.companies import CompanyResolver
+from src.tracing import span
+from src.utils import question_hash
+
+MAX_BODY_BYTES = 64 * 1024
+LATENCY_WINDOW = 1024
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot get a slot (queue full or waited too long)."""
+
+
+class AdmissionControl:
+    """
+    Bounded concurrency with a bounded wait queue.
+
+    `workers` requests run at once; up to `max_queue` more wait (FIFO is not
+    guaranteed) for at most `timeout` seconds. Everything beyond is rejected
+    immediately, which keeps latency bounded under overload.
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def acquire(self) -> None:
+        with self._cond:
+            if self.running >= self.workers and self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(f"queue full ({self.waiting} waiting)")
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.running < self.workers, timeout=self.timeout):
+                    self.rejected += 1
+                    raise Overloaded(f"no slot within {self.timeout:.0f}s")
+            finally:
+                self.waiting -= 1
+            self.running += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.running -= 1
+            self._cond.notify()
+
+
+class QueryService:
+    """
+    The resident pipeline: answers questions through the RAG chain under admission
+    control and keeps the numbers reported by /metrics.
+    """
+
+    def __init__(
+        self,
+        rag_chain: Runnable,
+        compressor: BaseDocumentCompressor,
+        query_embeddings: Any,
+        admission: AdmissionControl,
+        resolver: Optional[CompanyResolver] = None,
+    ) -> None:
+        self.rag_chain = rag_chain
+        self.resolver = resolver
+        self.compressor = compressor
+        self.query_embeddings = query_embeddings
+        self.admission = admission
+        self.started = time.time()
+
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._queue_waits: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.served = 0
+        self.errors = 0
+
+    def answer(self, question: str, kind: str) -> Dict[str, Any]:
+        """
+        Answers one question.
+
+        Raises:
+            Overloaded: If no worker slot is available.
+        """
+        arrived = time.perf_counter()
+        self.admission.acquire()
+        admitted = time.perf_counter()
+        try:
+            with span("question", trace=question_hash(question)[:12], kind=kind, served=True):
+                result = self.rag_chain.invoke({"question": question, "kind": kind})
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            self.admission.release()
+
+        finished = time.perf_counter()
+        with self._lock:
+            self.served += 1
+            self._latencies.append(finished - arrived)
+            self._queue_waits.append(admitted - arrived)
+
+        answer = result.model_dump()
+        answer.update(question_text=question, kind=kind, latency_ms=round((finished - arrived) * 1000, 1))
+        return answer
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            waits = sorted(self._queue_waits)
+            served, errors = self.served, self.errors
+
+        def percentiles(values: list) -> Dict[str, float]:
+            if not values:
+                return {"p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+            return {
+                "p50_ms": round(values[len(values) // 2] * 1000, 1),
+                "p95_ms": round(values[min(len(values) - 1, int(0.95 * len(values)))] * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+
+        metrics: Dict[str, Any] = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "in_flight": self.admission.running,
+            "queue_depth": self.admission.waiting,
+            "max_queue": self.admission.max_queue,
+            "workers": self.admission.workers,
+            "served": served,
+            "errors": errors,
+            "rejected": self.admission.rejected,
+            "latency": percentiles(latencies),
+            "queue_wait": percentiles(waits),
+            "reranker": self.compressor.stats() if hasattr(self.compressor, "stats") else {},
+        }
+        if self.resolver is not None:
+            metrics["company_resolver"] = {
+                "resolved": self.resolver.resolved,
+                "unresolved": self.resolver.unresolved,
+                "hit_rate": round(self.resolver.hit_rate(), 4),
+            }
+        if hasattr(self.query_embeddings, "stats"):
+            metrics["query_embeddings"] = self.query_embeddings.stats()
+        return metrics
+
+
+def make_handler(service: QueryService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+            payload = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _read_json(self) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                return None, "request body too large"
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError as e:
+                return None, f"invalid JSON: {e}"
+            if not isinstance(body, dict) or not isinstance(body.get("question"), str) or not body["question"].strip():
+                return None, "expected a JSON object with a non-empty 'question'"
+            return body, None
+
+        def do_GET(self) -> None:
+            if self.path == "/health":
+                self._send(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                self._send(200, service.metrics())
+            else:
+                self._send(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self) -> None:
+            if self.path != "/answer":
+                self._send(404, {"error": f"unknown path {self.path}"})
+                return
+            body, error = self._read_json()
+            if error:
+                self._send(413 if "too large" in error else 400, {"error": error})
+                return
+            try:
+                self._send(200, service.answer(body["question"], str(body.get("kind", ""))))
+            except Overloaded as e:
+                self._send(503, {"error": f"overloaded: {e}"}, headers={"Retry-After": "1"})
+            except Exception as e:
+                print(f"Error answering {body['question']!r}: {e}")
+                self._send(500, {"error": str(e)})
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def serve(
+    host: str = SERVE_HOST,
+    port: int = SERVE_PORT,
+    workers: int = SERVE_WORKERS,
+    max_queue: int = SERVE_MAX_QUEUE,
+) -> None:
+    """
+    Loads the pipeline once and serves questions until interrupted.
+
+    Args:
+        host (str): Interface to bind (local only by default).
+        port (int): TCP port.
+        workers (int): Questions answered concurrently.
+        max_queue (int): Requests allowed to wait for a slot before new ones are rejected.
+    """
+    from src.generation import build_retrieve_fn, create_rag_chain
+    from src.models import preload_llm
+    from src.retrieval import load_pipeline
+
+    if OLLAMA_PRELOAD:
+        preload_llm()
+    retriever, compressor, known_companies = load_pipeline()
+    resolver = CompanyResolver(known_companies) if COMPANY_RESOLVER else None
+    rag_chain = create_rag_chain(build_retrieve_fn(retriever, compressor, known_companies, resolver=resolver))
+
+    service = QueryService(
+        rag_chain,
+        compressor,
+        retriever.vector_db.embeddings,
+        AdmissionControl(workers, max_queue, SERVE_QUEUE_TIMEOUT_S),
+        resolver,
+    )
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    print(f"Serving on http://{host}:{server.server_port} ({workers} workers, queue limit {max_queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down.")
+    finally:
+        server.server_close()
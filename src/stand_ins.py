@@ -0,0 +1,164 @@
+"""
+Deterministic, dependency-free stand-ins for the models, used by the offline benchmarks
+and selected with LLM_BACKEND=fake, EMBEDDING_BACKEND=hashing and RERANKER_BACKEND=lexical.
+
+They exercise the same code paths as the real models (structured output, batching,
+caching) with a configurable latency, so pipeline overheads can be measured on a
+CPU-only box without Ollama or downloaded HF weights.
+"""
+
+import hashlib
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+from pydantic import BaseModel
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from src.companies import guess_company_from_cover
+
+_WORD_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+_QUOTED_RE = re.compile(r"[\"“']([^\"”']+)[\"”']")
+_HEADER_RE = re.compile(r"\[pdf_sha1: (\S+) \| page_index: (\d+)\]")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _answer_kind(question: str) -> str:
+    first = question.strip().split(" ", 1)[0].lower()
+    if first in ("did", "does", "is", "was", "were", "has", "have"):
+        return "boolean"
+    if first == "who" or question.lower().startswith("which"):
+        return "name"
+    return "number"
+
+
+def _plan(prompt: str) -> Dict[str, Any]:
+    question = prompt.rsplit("User Input:", 1)[-1].strip()
+    quoted = _QUOTED_RE.search(question)
+    company = quoted.group(1) if quoted else ""
+    refined = question.replace(quoted.group(0), "") if quoted else question
+    return {
+        "extracted_company": company,
+        "refined_query": " ".join(refined.split()),
+        "answer_kind": _answer_kind(question),
+    }
+
+
+def _file_metadata(prompt: str) -> Dict[str, Any]:
+    return {"company_name": guess_company_from_cover(prompt.split("TEXT:", 1)[-1], min_mentions=1) or "Unknown"}
+
+
+def _answer(prompt: str) -> Dict[str, Any]:
+    question = prompt.split("Question:", 1)[-1].split("\n", 1)[0]
+    context = prompt.split("CONTEXT:", 1)[-1]
+    header = _HEADER_RE.search(context)
+    if header is None:
+        return {"value": "N/A", "references": []}
+
+    references = [{"pdf_sha1": header.group(1), "page_index": int(header.group(2))}]
+    kind = "number" if "Output Kind: number" in prompt else _answer_kind(question)
+    block = context[header.end() :].split("\n", 1)[-1].split("\n[pdf_sha1:", 1)[0]
+    if kind == "boolean":
+        return {"value": True, "references": references}
+    number = _NUMBER_RE.search(block)
+    if kind == "number" and number:
+        return {"value": float(number.group(0).replace(",", "")), "references": references}
+    return {"value": block.strip().split("\n", 1)[0][:80] or "N/A", "references": references}
+
+
+_RESPONDERS = {
+    "QueryPlan": _plan,
+    "FileMetaData": _file_metadata,
+    "Answer": _answer,
+}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers structured-output calls with rule-based, deterministic
+    JSON after sleeping `latency_ms` (plus `ms_per_1k_prompt_chars` to mimic prefill).
+    Token usage is reported like ChatOllama does, estimated from text length.
+    """
+
+    latency_ms: float = 200.0
+    ms_per_1k_prompt_chars: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        schema: Optional[Type[BaseModel]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        time.sleep((self.latency_ms + self.ms_per_1k_prompt_chars * len(prompt) / 1000) / 1000)
+
+        responder = _RESPONDERS.get(schema.__name__) if schema is not None else None
+        content = json.dumps(responder(prompt)) if responder else "OK"
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4,
+            },
+            response_metadata={"model_name": "fake-chat"},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Runnable:
+        if not (isinstance(schema, type) and issubclass(schema, BaseModel) and schema.__name__ in _RESPONDERS):
+            raise ValueError(f"FakeChatModel has no responder for {schema!r}.")
+        return self.bind(schema=schema) | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Bag-of-words feature-hashing embeddings: lexical but stable across processes and
+    runs, normalized like the real model.
+    """
+
+    def __init__(self, size: int = 256) -> None:
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in _words(text):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class LexicalScorer:
+    """Cross-encoder stand-in: fraction of query words present in the passage."""
+
+    def score(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        scores = []
+        for query, passage in pairs:
+            query_words = set(_words(query))
+            scores.append(len(query_words & set(_words(passage))) / max(len(query_words), 1))
+        return scores
@@ -0,0 +1,207 @@
+"""
+Lightweight span tracing for the pipeline stages.
+
+    with span("rerank", candidates=len(docs)) as s:
+        docs = compressor.compress_documents(docs, query)
+        s.set(kept=len(docs))
+
+Spans nest through a context variable (so they follow LangChain's executor threads),
+carry the id of the question (trace) they belong to, and are appended to a JSONL file
+as they finish. LLM calls are recorded by TokenUsageCallback as "llm:<stage>" spans
+with the prompt/completion token counts reported by Ollama. stage_summary() gives
+p50/p95 per stage for the end-of-run table. In memory only per-stage totals and the
+latest TRACE_WINDOW durations are kept, so a long-running server does not grow; the
+JSONL file holds the full history.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from src.config import TRACE_ENABLED, TRACE_PATH, TRACE_WINDOW
+
+RUN_ID = uuid.uuid4().hex[:12]
+
+
+class Span:
+    """A running stage. Attributes added with set() end up in the JSONL record."""
+
+    __slots__ = ("name", "trace", "parent", "attrs")
+
+    def __init__(self, name: str, trace: Optional[str], parent: Optional[str], attrs: Dict[str, Any]) -> None:
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.attrs = attrs
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class StageStats:
+    """Running totals of one stage, plus its latest durations for percentiles."""
+
+    __slots__ = ("count", "total_ms", "tokens", "recent_ms")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.tokens: Dict[str, int] = {}
+        self.recent_ms: Deque[float] = deque(maxlen=TRACE_WINDOW)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.count += 1
+        self.total_ms += record["ms"]
+        self.recent_ms.append(record["ms"])
+        for key in ("prompt_tokens", "completion_tokens"):
+            if isinstance(record.get(key), (int, float)):
+                self.tokens[key] = self.tokens.get(key, 0) + int(record[key])
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_stages: Dict[str, StageStats] = {}
+_file = None
+
+
+def _write(record: Dict[str, Any]) -> None:
+    global _file
+    with _lock:
+        _stages.setdefault(record["name"], StageStats()).add(record)
+        if _file is None:
+            TRACE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            _file = open(TRACE_PATH, "a", encoding="utf-8")
+        _file.write(json.dumps(record, default=str) + "\n")
+        _file.flush()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def record_span(name: str, seconds: float, trace: Optional[str], parent: Optional[str], **attrs: Any) -> None:
+    """Records a span measured elsewhere (e.g. by a callback)."""
+    if not TRACE_ENABLED:
+        return
+    _write(
+        {
+            "run": RUN_ID,
+            "trace": trace,
+            "name": name,
+            "parent": parent,
+            "end": round(time.time(), 3),
+            "ms": round(seconds * 1000, 3),
+            **attrs,
+        }
+    )
+
+
+@contextmanager
+def span(name: str, trace: Optional[str] = None, **attrs: Any) -> Iterator[Span]:
+    """
+    Times a stage. Nested spans inherit the trace id of their parent unless `trace` is given.
+    """
+    parent = _current.get()
+    current = Span(name, trace or (parent.trace if parent else None), parent.name if parent else None, dict(attrs))
+    if not TRACE_ENABLED:
+        yield current
+        return
+
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        record_span(current.name, time.perf_counter() - start, current.trace, current.parent, **current.attrs)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Records every chat model call as an "llm:<enclosing stage>" span with the token
+    counts and Ollama timings from the response metadata.
+    """
+
+    def __init__(self) -> None:
+        self._started: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = (time.perf_counter(), _current.get())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        start, parent = self._started.pop(run_id, (None, None))
+        if start is None:
+            return
+        attrs: Dict[str, Any] = {}
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        usage = getattr(message, "usage_metadata", None) or {}
+        metadata = getattr(message, "response_metadata", None) or {}
+        attrs["prompt_tokens"] = usage.get("input_tokens", metadata.get("prompt_eval_count"))
+        attrs["completion_tokens"] = usage.get("output_tokens", metadata.get("eval_count"))
+        for key in ("load_duration", "prompt_eval_duration", "eval_duration"):
+            if metadata.get(key) is not None:
+                attrs[f"{key}_ms"] = round(metadata[key] / 1e6, 3)
+
+        stage = parent.name if parent else "none"
+        record_span(f"llm:{stage}", time.perf_counter() - start, parent.trace if parent else None, stage, **attrs)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        start, parent = self._started.pop(run_id, (None, None))
+        if start is not None:
+            stage = parent.name if parent else "none"
+            record_span(
+                f"llm:{stage}",
+                time.perf_counter() - start,
+                parent.trace if parent else None,
+                stage,
+                error=type(error).__name__,
+            )
+
+
+def stage_summary() -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregates the spans of this run per stage name.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Stage -> count, mean/p50/p95 milliseconds and token totals.
+            Percentiles cover the latest TRACE_WINDOW spans of the stage.
+    """
+    summary: Dict[str, Dict[str, Any]] = {}
+    with _lock:
+        for name, stats in _stages.items():
+            ms = sorted(stats.recent_ms)
+            summary[name] = {
+                "count": stats.count,
+                "mean_ms": round(stats.total_ms / stats.count, 2),
+                "p50_ms": round(ms[len(ms) // 2], 2),
+                "p95_ms": round(ms[min(len(ms) - 1, int(0.95 * len(ms)))], 2),
+                **stats.tokens,
+            }
+    return summary
+
+
+def print_trace_summary() -> None:
+    """Prints the per-stage latency table of this run."""
+    summary = stage_summary()
+    if not summary:
+        return
+    print(f"\nStage latency (run {RUN_ID}, spans in {TRACE_PATH}):")
+    print(f"{'stage':<24}{'count':>7}{'mean ms':>11}{'p50 ms':>11}{'p95 ms':>11}{'prompt tok':>12}{'compl tok':>11}")
+    for name, entry in sorted(summary.items(), key=lambda item: -item[1]["mean_ms"] * item[1]["count"]):
+        print(
+            f"{name:<24}{entry['count']:>7}{entry['mean_ms']:>11}{entry['p50_ms']:>11}{entry['p95_ms']:>11}"
+            f"{entry.get('prompt_tokens', ''):>12}{entry.get('completion_tokens', ''):>11}"
+        )
@@ -1,8 +1,12 @@
 import gc
-import torch
+import hashlib
 import subprocess
 import os
+import time
+from concurrent.futures import Executor, Future
+from contextvars import copy_context
 from pathlib import Path
+from typing import Any, Callable
 
 
 def setup_system_dependencies() -> None:
@@ -29,6 +33,8 @@ def cleanup_memory() -> None:
     """
     Aggressively cleans up GPU memory and garbage collection.
     """
+    import torch
+
     gc.collect()
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
@@ -43,3 +49,25 @@ def ensure_directories() -> None:
     os.makedirs(DATA_DIR, exist_ok=True)
     os.makedirs(PDF_DIR, exist_ok=True)
     os.makedirs(INDEX_PATH, exist_ok=True)
+
+
+def question_hash(question: str) -> str:
+    """Returns a stable key for a question text."""
+    return hashlib.sha1(question.strip().encode("utf-8")).hexdigest()
+
+
+def submit_timed(executor: Executor, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """
+    Submits a loading step to `executor`, printing how long it took and recording it
+    as a tracing span named `name`.
+    """
+    from src.tracing import span
+
+    def run() -> Any:
+        start = time.perf_counter()
+        with span(name):
+            result = fn(*args, **kwargs)
+        print(f"Startup step {name!r} took {time.perf_counter() - start:.2f}s")
+        return result
+
+    return executor.submit(copy_context().run, run)
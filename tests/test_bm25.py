@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from src.bm25 import SparseBM25, tokenize
+
+TEXTS = [
+    "Revenue grew strongly in Europe",
+    "Operating costs fell while revenue was flat",
+    "The board approved a dividend",
+    "Revenue revenue revenue guidance for next year",
+]
+COMPANIES = ["Acme", "Acme", "Borealis", "Borealis"]
+IDS = [10, 11, 20, 21]
+
+
+def reference_scores(query: str, k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """Textbook Okapi BM25 over TEXTS, as the oracle for the sparse implementation."""
+    docs = [tokenize(text) for text in TEXTS]
+    avgdl = sum(len(d) for d in docs) / len(docs)
+    scores = np.zeros(len(docs))
+    for term in tokenize(query):
+        df = sum(term in d for d in docs)
+        idf = np.log1p((len(docs) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(docs):
+            tf = doc.count(term)
+            scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avgdl))
+    return scores
+
+
+@pytest.fixture
+def engine() -> SparseBM25:
+    return SparseBM25.fit(TEXTS, COMPANIES, doc_ids=IDS)
+
+
+def test_scores_match_okapi_bm25(engine):
+    expected = reference_scores("revenue guidance")
+
+    hits = engine.search("revenue guidance", k=10)
+
+    assert [doc_id for doc_id, _ in hits] == [IDS[i] for i in np.argsort(-expected) if expected[i] > 0]
+    for doc_id, score in hits:
+        assert score == pytest.approx(expected[IDS.index(doc_id)], rel=1e-5)
+
+
+def test_search_respects_k_and_skips_non_matching(engine):
+    assert len(engine.search("revenue", k=2)) == 2
+    assert 20 not in [doc_id for doc_id, _ in engine.search("revenue", k=10)]
+    assert engine.search("unknown words", k=5) == []
+
+
+def test_partition_restricts_results(engine):
+    hits = engine.search("revenue", k=10, partition="Borealis")
+
+    assert [doc_id for doc_id, _ in hits] == [21]
+    assert hits[0][1] == pytest.approx(dict(engine.search("revenue", k=10))[21])
+
+
+def test_unknown_partition_finds_nothing(engine):
+    assert engine.search("revenue", k=10, partition="Nobody") == []
+    assert engine.search("revenue", k=10, partition="") == engine.search("revenue", k=10)
+
+
+def test_save_and_load_round_trip(engine, tmp_path):
+    engine.save(tmp_path / "bm25")
+
+    loaded = SparseBM25.load(tmp_path / "bm25")
+
+    assert loaded.search("revenue dividend", k=10, partition="Acme") == engine.search(
+        "revenue dividend", k=10, partition="Acme"
+    )
+    assert loaded.search("dividend", k=10) == engine.search("dividend", k=10)
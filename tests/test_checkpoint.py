@@ -0,0 +1,78 @@
+import json
+
+from src.checkpoint import ERROR, NA, OK, AnswerCheckpoint, answer_status
+
+QUESTIONS = [{"text": f"Question {i}?", "kind": "number"} for i in range(4)]
+
+
+def answer(i: int, value) -> dict:
+    return {"question_text": QUESTIONS[i]["text"], "kind": "number", "value": value, "references": []}
+
+
+def test_answer_status():
+    assert answer_status({"value": 1.0}) == OK
+    assert answer_status({"value": "N/A"}) == NA
+    assert answer_status({"value": "N/A"}, RuntimeError("boom")) == ERROR
+
+
+def test_records_survive_reopen_and_last_record_wins(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    checkpoint = AnswerCheckpoint(path)
+    checkpoint.record(QUESTIONS[0]["text"], answer(0, "N/A"), ERROR, error="RuntimeError('boom')")
+    checkpoint.record(QUESTIONS[1]["text"], answer(1, 2.0), OK)
+    checkpoint.record(QUESTIONS[0]["text"], answer(0, 1.0), OK)
+
+    reopened = AnswerCheckpoint(path)
+
+    assert len(reopened) == 2
+    assert reopened.get(QUESTIONS[0]["text"])["answer"]["value"] == 1.0
+    assert reopened.counts() == {OK: 2, ERROR: 0, NA: 0}
+
+
+def test_pending_retries_errors_and_optionally_na(tmp_path):
+    checkpoint = AnswerCheckpoint(tmp_path / "answers.jsonl")
+    checkpoint.record(QUESTIONS[0]["text"], answer(0, 1.0), OK)
+    checkpoint.record(QUESTIONS[1]["text"], answer(1, "N/A"), ERROR)
+    checkpoint.record(QUESTIONS[2]["text"], answer(2, "N/A"), NA)
+
+    assert checkpoint.pending(QUESTIONS) == [1, 3]
+    assert checkpoint.pending(QUESTIONS, retry=(ERROR, NA)) == [1, 2, 3]
+
+
+def test_answers_in_question_order_with_placeholders(tmp_path):
+    checkpoint = AnswerCheckpoint(tmp_path / "answers.jsonl")
+    checkpoint.record(QUESTIONS[2]["text"], answer(2, 3.0), OK)
+    checkpoint.record(QUESTIONS[0]["text"], answer(0, 1.0), OK)
+
+    answers = checkpoint.answers(QUESTIONS)
+
+    assert [a["value"] for a in answers] == [1.0, "N/A", 3.0, "N/A"]
+    assert [a["question_text"] for a in answers] == [q["text"] for q in QUESTIONS]
+
+
+def test_torn_last_line_is_cut_before_appending(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    AnswerCheckpoint(path).record(QUESTIONS[0]["text"], answer(0, 1.0), OK)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "torn')
+
+    checkpoint = AnswerCheckpoint(path)
+    checkpoint.record(QUESTIONS[1]["text"], answer(1, 2.0), OK)
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert all(json.loads(line) for line in lines)
+    assert len(AnswerCheckpoint(path)) == 2
+
+
+def test_archive_moves_the_file_aside(tmp_path):
+    path = tmp_path / "answers.jsonl"
+    checkpoint = AnswerCheckpoint(path)
+    checkpoint.record(QUESTIONS[0]["text"], answer(0, 1.0), OK)
+
+    archived = checkpoint.archive()
+
+    assert not path.exists()
+    assert len(checkpoint) == 0
+    assert len(AnswerCheckpoint(archived)) == 1
+    assert AnswerCheckpoint(tmp_path / "missing.jsonl").archive() is None
@@ -0,0 +1,82 @@
+import pickle
+import shutil
+
+import pytest
+
+from src import retrieval
+from src.chunk_store import ChunkStore, ChunkStoreDocstore
+
+
+@pytest.fixture
+def store(tmp_path) -> ChunkStore:
+    store = ChunkStore.create(tmp_path / "chunks")
+    store.add("Revenue grew to 1,200 million.", "a.pdf", 1, "Acme")
+    store.add("The board declared a dividend.", "a.pdf", 2, "Acme")
+    store.add("Borealis hired 300 engineers.", "b.pdf", 1, "Borealis")
+    store.commit()
+    yield store
+    store.close()
+
+
+def test_fingerprint_tracks_rows_not_sizes(store):
+    original = store.fingerprint()
+    assert store.fingerprint() == original
+
+    store._conn.execute("UPDATE chunks SET company_name = 'Borealis' WHERE id = 2")
+    relabelled = store.fingerprint()
+    assert relabelled != original
+
+    store.delete_source("b.pdf")
+    store.add("Borealis fired 300 engineers.", "b.pdf", 1, "Borealis")  # same id, same length
+    store.commit()
+    assert store.fingerprint() not in (original, relabelled)
+
+
+def test_bm25_engine_is_rebuilt_after_relabelling(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "BM25_PATH", tmp_path / "bm25")
+    engine = retrieval.load_bm25_engine(store)
+    assert [chunk_id for chunk_id, _ in engine.search("dividend", k=5, partition="Acme")] == [2]
+
+    store._conn.execute("UPDATE chunks SET company_name = 'Borealis' WHERE id = 2")
+    engine = retrieval.load_bm25_engine(store)
+
+    assert engine.search("dividend", k=5, partition="Acme") == []
+    assert [chunk_id for chunk_id, _ in engine.search("dividend", k=5, partition="Borealis")] == [2]
+
+
+def test_growing_blob_remaps_and_closes_the_old_map(store):
+    assert store.get(1).page_content == "Revenue grew to 1,200 million."
+    old_map = store._mm
+
+    chunk_id = store.add("A new chunk.", "c.pdf", 1, "Acme")
+    store.commit()
+
+    assert store.get(chunk_id).page_content == "A new chunk."
+    assert old_map.closed and store._mm is not old_map
+
+
+def test_documents_list_every_location(store):
+    store.add_duplicate(2, "c.pdf", 7)
+    store.commit()
+
+    assert store.get(2).metadata["provenance"] == [("a.pdf", 2), ("c.pdf", 7)]
+    store.delete_source("a.pdf")
+    assert store.get(2).metadata["provenance"] == [("c.pdf", 7)]
+    assert [doc.metadata["chunk_id"] for doc in store.get_many([1, 2, 3])] == [2, 3]
+
+
+def test_docstore_pickles_to_a_path(store, tmp_path):
+    docstore = pickle.loads(pickle.dumps(ChunkStoreDocstore(store)))
+
+    assert docstore.search("3").page_content == "Borealis hired 300 engineers."
+    assert docstore.search("99") == "ID 99 not found."
+
+    gone = ChunkStore(tmp_path / "gone")
+    data = pickle.dumps(ChunkStoreDocstore(gone))
+    gone.close()
+    shutil.rmtree(tmp_path / "gone")
+
+    missing = pickle.loads(data)
+    assert not (tmp_path / "gone").exists()
+    with pytest.raises(FileNotFoundError):
+        missing.search("1")
@@ -0,0 +1,72 @@
+import numpy as np
+
+from src.dedup import ChunkDeduplicator, MinHasher, NearDuplicateIndex, dedup_scope, numbers, shingles
+
+DISCLAIMER = (
+    "This report contains forward-looking statements that are subject to risks and uncertainties. Actual "
+    "results may differ materially from those expressed or implied, and the company undertakes no obligation "
+    "to update any forward-looking statement except as required by law. Strategic report."
+)
+TABLE = (
+    "Revenue by segment in millions for the year: energy 1,200 mining 3,400 capital 560 foods 780 systems 910 "
+    "logistics 120 pharma 450 retail 330 telecom 290 motors 610 total revenue for the group as reported"
+)
+
+
+def jaccard(a: str, b: str, size: int = 5) -> float:
+    sa, sb = set(shingles(a, size)), set(shingles(b, size))
+    return len(sa & sb) / len(sa | sb)
+
+
+def test_shingles_and_numbers():
+    assert shingles("One two three", 5) == ["one two three"]
+    assert shingles("a b c d e f", 5) == ["a b c d e", "b c d e f"]
+    assert numbers("Revenue 1,200.5 up from 900") == ("1200.5", "900")
+
+
+def test_signature_is_deterministic_and_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    variant = DISCLAIMER.replace("Strategic report", "Governance report")
+
+    assert np.array_equal(hasher.signature(DISCLAIMER), MinHasher(num_perm=256).signature(DISCLAIMER))
+    estimate = float(np.mean(hasher.signature(DISCLAIMER) == hasher.signature(variant)))
+    assert abs(estimate - jaccard(DISCLAIMER, variant)) < 0.1
+
+
+def test_index_finds_near_duplicates_only():
+    dedup = ChunkDeduplicator()
+    index = NearDuplicateIndex(threshold=0.8, bands=16)
+    index.add(1, dedup.fingerprint(DISCLAIMER))
+
+    assert index.find(dedup.fingerprint(DISCLAIMER.replace("Strategic report", "Strategic report."))) == 1
+    assert index.find(dedup.fingerprint(TABLE)) is None
+
+
+def test_index_requires_equal_numbers():
+    dedup = ChunkDeduplicator()
+    index = NearDuplicateIndex(threshold=0.8, bands=16)
+    index.add(1, dedup.fingerprint(TABLE))
+
+    assert index.find(dedup.fingerprint(TABLE + ".")) == 1
+    assert index.find(dedup.fingerprint(TABLE.replace("3,400", "3,500"))) is None
+
+
+def test_deduplicator_scopes_seed_and_stats():
+    stored = {"Acme": [(7, DISCLAIMER)]}
+    dedup = ChunkDeduplicator(threshold=0.9, seed=lambda scope: stored.get(scope, []))
+
+    canonical, _ = dedup.check("Acme", DISCLAIMER)
+    assert canonical == 7
+
+    canonical, fingerprint = dedup.check("Borealis", DISCLAIMER)
+    assert canonical is None
+    dedup.add("Borealis", 8, fingerprint)
+    assert dedup.check("Borealis", DISCLAIMER)[0] == 8
+
+    stats = dedup.stats()
+    assert (stats["chunks"], stats["duplicates"], stats["stored"]) == (3, 2, 1)
+
+
+def test_unknown_company_scopes_by_file():
+    assert dedup_scope("Acme plc", "a.pdf") == "Acme plc"
+    assert dedup_scope("Unknown", "a.pdf") == "a.pdf"
@@ -0,0 +1,31 @@
+import pytest
+
+from src.hybrid import reciprocal_rank_fusion
+
+
+def test_rrf_scores_and_order():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], weights=(1.0, 1.0), c=60)
+
+    scores = dict(fused)
+    assert [doc_id for doc_id, _ in fused] == [1, 3, 2]
+    assert scores[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores[3] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores[2] == pytest.approx(1 / 62)
+
+
+def test_rrf_weights_favour_one_list():
+    fused = reciprocal_rank_fusion([[1, 2], [2, 1]], weights=(0.3, 0.7))
+
+    assert [doc_id for doc_id, _ in fused] == [2, 1]
+
+
+def test_rrf_ties_keep_first_appearance():
+    fused = reciprocal_rank_fusion([[5, 9], [9, 5]], weights=(1.0, 1.0))
+
+    assert [doc_id for doc_id, _ in fused] == [5, 9]
+    assert fused[0][1] == pytest.approx(fused[1][1])
+
+
+def test_rrf_skips_empty_lists():
+    assert reciprocal_rank_fusion([[], []], weights=(1.0, 1.0)) == []
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([[], [4, 7]], weights=(1.0, 1.0))] == [4, 7]
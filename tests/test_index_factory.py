@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from src.index_factory import IndexSpec, build_faiss_index, factory_string, truncate_vectors
+
+
+def vectors(n: int, dim: int = 32) -> np.ndarray:
+    return truncate_vectors(np.random.default_rng(0).standard_normal((n, dim)), 0)
+
+
+def test_factory_string_clamps_to_the_training_set():
+    assert factory_string(IndexSpec(index_type="ivf_flat", nlist=256), 64, 100) == "IVF100,Flat"
+    assert factory_string(IndexSpec(index_type="ivf_pq", pq_m=8), 64, 10_000, n_train=198) == "IVF198,PQ8x7"
+    assert factory_string(IndexSpec(index_type="ivf_pq", pq_m=8), 64, 1_000_000) == "IVF4000,PQ8x8"
+    assert factory_string(IndexSpec(index_type="ivf_pq", pq_m=8), 64, 10) == "Flat"
+
+
+def test_factory_string_rejects_pq_m_not_dividing_dim():
+    with pytest.raises(ValueError):
+        factory_string(IndexSpec(index_type="ivf_pq", pq_m=7), 64, 1000)
+
+
+@pytest.mark.parametrize("n", [10, 198])
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat", "ivf_pq", "sq8"])
+def test_every_index_type_builds_on_small_corpora(index_type, n):
+    matrix = vectors(n)
+    index = build_faiss_index(matrix, IndexSpec(index_type=index_type, pq_m=4, nprobe=256))
+
+    assert index.ntotal == n
+    _, ids = index.search(matrix[:5], 1)
+    if index_type != "ivf_pq":
+        assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List
+
+import pytest
+from ollama import ResponseError
+
+from src.llm_dispatch import BackendPool, NoBackendAvailable, OllamaDispatcher
+
+
+def start_stub(hits: Dict[str, int], name: str, status: int = 200) -> ThreadingHTTPServer:
+    """Minimal Ollama /api/chat endpoint: answers "hi", or fails with `status`."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            hits[name] = hits.get(name, 0) + 1
+            if status != 200:
+                payload = b'{"error": "stub failure"}'
+            else:
+                payload = (
+                    json.dumps(
+                        {
+                            "model": body["model"],
+                            "created_at": "2024-01-01T00:00:00Z",
+                            "message": {"role": "assistant", "content": "hi"},
+                            "done": True,
+                            "done_reason": "stop",
+                        }
+                    )
+                    + "\n"
+                ).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def stubs() -> Iterator[tuple]:
+    hits: Dict[str, int] = {}
+    servers: List[ThreadingHTTPServer] = [start_stub(hits, "broken", status=500), start_stub(hits, "healthy")]
+    yield hits, [f"http://127.0.0.1:{s.server_port}" for s in servers]
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_dispatcher(hosts: List[str], retries: int = 1) -> OllamaDispatcher:
+    return OllamaDispatcher(model="stub", hosts=hosts, retries=retries, cooldown_s=60, request_timeout=5)
+
+
+def test_dispatcher_fails_over_to_healthy_backend(stubs):
+    hits, (broken, healthy) = stubs
+    llm = make_dispatcher([broken, healthy])
+
+    answers = [llm.invoke(f"question {i}").content for i in range(4)]
+
+    assert answers == ["hi"] * 4
+    # The first call lands on the broken backend (tie), fails over, then the broken one cools down.
+    assert hits == {"broken": 1, "healthy": 4}
+    assert llm.stats() == {
+        broken: {"requests": 1, "failures": 1, "outstanding": 0},
+        healthy: {"requests": 4, "failures": 0, "outstanding": 0},
+    }
+
+
+def test_dispatcher_raises_when_every_attempt_fails(stubs):
+    hits, (broken, _) = stubs
+    llm = make_dispatcher([broken], retries=2)
+
+    with pytest.raises(ResponseError):
+        llm.invoke("question")
+
+    assert hits == {"broken": 3}
+    assert llm.stats()[broken] == {"requests": 3, "failures": 3, "outstanding": 0}
+
+
+def test_async_calls_are_dispatched(stubs):
+    hits, (broken, healthy) = stubs
+    llm = make_dispatcher([broken, healthy])
+
+    async def ask() -> List[str]:
+        return [(await llm.ainvoke(f"question {i}")).content for i in range(3)]
+
+    assert asyncio.run(ask()) == ["hi"] * 3
+    assert hits == {"broken": 1, "healthy": 3}
+    assert llm.stats()[broken]["failures"] == 1
+
+
+def test_client_errors_do_not_cool_the_backend_down():
+    hits: Dict[str, int] = {}
+    server = start_stub(hits, "rejecting", status=400)
+    host = f"http://127.0.0.1:{server.server_port}"
+    try:
+        llm = make_dispatcher([host], retries=2)
+        with pytest.raises(ResponseError):
+            llm.invoke("question")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert hits == {"rejecting": 1}
+    assert llm.stats()[host] == {"requests": 1, "failures": 0, "outstanding": 0}
+
+
+def test_dispatchers_over_the_same_hosts_share_the_pool(stubs):
+    _, hosts = stubs
+    first, second = make_dispatcher(hosts), make_dispatcher(hosts)
+
+    first.invoke("question")
+
+    assert second._pool is first._pool
+    assert second.stats() == first.stats()
+    assert second._backends[1]._client is first._backends[1]._client
+
+
+def test_pool_routes_to_least_outstanding():
+    pool = BackendPool(size=3, max_concurrency=2, cooldown_s=60)
+
+    picks = [pool.acquire(set(), timeout=1) for _ in range(6)]
+
+    assert sorted(picks[:3]) == [0, 1, 2]
+    assert sorted(picks[3:]) == [0, 1, 2]
+    assert pool.outstanding == [2, 2, 2]
+
+
+def test_pool_waits_for_busy_healthy_backend_instead_of_cooled_one():
+    pool = BackendPool(size=2, max_concurrency=1, cooldown_s=60)
+    pool.release(pool.acquire({1}, timeout=1), failed=True)  # backend 0 cools down
+    busy = pool.acquire(set(), timeout=1)
+    assert busy == 1
+
+    threading.Timer(0.1, pool.release, args=(busy,)).start()
+    start = time.monotonic()
+    assert pool.acquire(set(), timeout=2) == 1
+    assert time.monotonic() - start >= 0.05
+
+
+def test_pool_uses_cooled_backend_when_all_are_cooling():
+    pool = BackendPool(size=2, max_concurrency=1, cooldown_s=60)
+    for index in (0, 1):
+        pool.release(pool.acquire({1 - index}, timeout=1), failed=True)
+
+    assert pool.acquire(set(), timeout=1) in (0, 1)
+    assert pool.failures == [1, 1]
+
+
+def test_pool_times_out_without_free_slot():
+    pool = BackendPool(size=1, max_concurrency=1, cooldown_s=60)
+    pool.acquire(set(), timeout=1)
+
+    with pytest.raises(NoBackendAvailable):
+        pool.acquire(set(), timeout=0.05)
@@ -0,0 +1,57 @@
+import pytest
+
+from src import planning
+from src.companies import CompanyResolver
+from src.schemas import QueryPlan
+
+QUESTION = (
+    'According to the annual report, how many employees did "Acme Mining plc" have '
+    "(within the last period or at the end of the last period)? If data is not available, return 'N/A'."
+)
+
+
+class StubPlanner:
+    def __init__(self) -> None:
+        self.prompts = []
+
+    def invoke(self, prompt: str) -> QueryPlan:
+        self.prompts.append(prompt)
+        return QueryPlan(extracted_company="Borealis", refined_query="llm query", answer_kind="number")
+
+
+@pytest.fixture
+def planner(monkeypatch) -> StubPlanner:
+    stub = StubPlanner()
+    monkeypatch.setattr(planning, "get_planner", lambda: stub)
+    return stub
+
+
+def test_resolved_question_skips_the_llm_and_keeps_a_search_query(planner):
+    resolver = CompanyResolver(["Acme Mining plc", "Borealis Energy AG"])
+
+    plan = planning.plan_question(QUESTION, "number", resolver=resolver)
+
+    assert planner.prompts == []
+    assert plan.extracted_company == "Acme Mining plc"
+    assert plan.answer_kind == "number"
+    assert plan.refined_query == (
+        "According to the annual report, how many employees did have? workforce headcount staff"
+    )
+
+
+def test_unresolved_question_is_planned_by_the_llm(planner):
+    resolver = CompanyResolver(["Acme Mining plc"])
+
+    plan = planning.plan_question("What was the revenue of Borealis?", "number", resolver=resolver)
+
+    assert len(planner.prompts) == 1
+    assert plan.refined_query == "llm query"
+
+
+def test_expand_query_appends_new_terms_once():
+    assert planning.expand_query("Who is the CEO?") == "Who is the CEO? chief executive officer"
+    assert planning.expand_query("revenue and sales") == "revenue and sales turnover"
+    assert planning.expand_query("Were staff let go?") == (
+        "Were staff let go? employees workforce headcount redundancy severance layoffs"
+    )
+    assert planning.expand_query("cash position") == "cash position"
@@ -0,0 +1,36 @@
+import json
+from collections import deque
+
+import pytest
+
+from src import tracing
+
+
+@pytest.fixture
+def fresh_tracing(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_PATH", tmp_path / "traces.jsonl")
+    monkeypatch.setattr(tracing, "_stages", {})
+    monkeypatch.setattr(tracing, "_file", None)
+    yield tmp_path / "traces.jsonl"
+    if tracing._file is not None:
+        tracing._file.close()
+
+
+def test_summary_keeps_totals_and_a_bounded_window(fresh_tracing, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_WINDOW", 10)
+    for ms in range(1, 101):
+        tracing.record_span("rerank", ms / 1000, trace="q", parent=None, prompt_tokens=2)
+    with tracing.span("plan"):
+        pass
+
+    summary = tracing.stage_summary()
+
+    assert summary["rerank"]["count"] == 100
+    assert summary["rerank"]["mean_ms"] == 50.5
+    assert summary["rerank"]["prompt_tokens"] == 200
+    assert summary["rerank"]["p50_ms"] == 96.0  # percentiles over the latest 10 spans only
+    assert tracing._stages["rerank"].recent_ms == deque(range(91, 101), maxlen=10)
+    assert summary["plan"]["count"] == 1
+    with open(fresh_tracing) as f:
+        assert len([json.loads(line) for line in f]) == 101